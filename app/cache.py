@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache with optional per-entry TTL.
+    Holds at most max_entries items; the least recently used item is
+    evicted first, and expired items are treated as misses.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, or default on a miss.
+        """
+        with self._lock:
+            if key in self._data:
+                expires = self._expires.get(key)
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+                self._pop(key)
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value, evicting least recently used entries beyond capacity.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if ttl is not None:
+                self._expires[key] = time.monotonic() + ttl
+            else:
+                self._expires.pop(key, None)
+            while len(self._data) > self.max_entries:
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove and return the value for key.
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._pop(key)
+
+    def _pop(self, key: Hashable) -> Any:
+        self._expires.pop(key, None)
+        return self._data.pop(key)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        Return a snapshot of the live (unexpired) entries.
+        Does not count as a lookup or change recency.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value)
+                for key, value in self._data.items()
+                if self._expires.get(key, now + 1) > now
+            ]
+
+    def clear(self) -> None:
+        """
+        Remove every entry. Counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return size, capacity and hit/miss counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,403 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Mapping, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+from .keyword_index import tokenize
+from .langchain_compat import Document
+
+CHUNK_STORE_FILE = "chunks.sqlite3"
+# Bytes of the store SQLite may memory-map (capped by SQLite's own limit)
+CHUNK_STORE_MMAP_BYTES = int(os.getenv("CHUNK_STORE_MMAP_BYTES", 1 << 30))
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Docstore for the FAISS vector store, backed by a SQLite file.
+    A LangChain Docstore/AddableMixin, so FAISS can add chunks to it.
+    Chunks are keyed by chunk ID and indexed by knowledge base file and
+    file type; the table of FAISS positions maps search hits back to chunk
+    IDs. Text is only read for the chunks a query actually returns.
+    The BM25 postings of the chunks are kept in the same file, up to date
+    with every add and delete, so keyword search reads only the posting
+    lists of the query terms.
+
+    A read-only store opens the file immutable and memory-mapped, so the
+    chunk texts live in the OS page cache (shared by every worker process)
+    and nothing is deserialized up front. Saved stores are never modified
+    in place: writers work on a private copy that replaces the file.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.RLock()
+        # One connection, opened now: a reader keeps seeing the file it
+        # opened even after a writer replaces it on disk
+        if readonly:
+            self._db = sqlite3.connect(
+                f"file:{os.path.abspath(path)}?mode=ro&immutable=1",
+                uri=True,
+                check_same_thread=False,
+            )
+            self._db.execute(f"PRAGMA mmap_size={CHUNK_STORE_MMAP_BYTES}")
+        else:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    kb_file_id INTEGER,
+                    file_type TEXT,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_kb_file_id ON chunks (kb_file_id);
+                CREATE INDEX IF NOT EXISTS idx_chunks_file_type ON chunks (file_type);
+                CREATE TABLE IF NOT EXISTS positions (
+                    position INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                -- Chunk length is repeated per posting so scoring needs no join
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_postings_chunk_id ON postings (chunk_id);
+                CREATE TABLE IF NOT EXISTS terms (
+                    term TEXT PRIMARY KEY,
+                    df INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                """
+            )
+            self._db.commit()
+            if not self.has_keyword_index():
+                self._index_existing_chunks()
+
+    @classmethod
+    def create(cls, directory: str) -> "ChunkStore":
+        """
+        Create an empty writable store in a new temporary file in directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, prefix=".chunks-", suffix=".tmp")
+        os.close(fd)
+        return cls(path)
+
+    @classmethod
+    def copy_of(cls, path: str, directory: str) -> "ChunkStore":
+        """
+        Open a writable private copy of a saved store.
+        """
+        store = cls.create(directory)
+        store.close()
+        shutil.copyfile(path, store.path)
+        return cls(store.path)
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Return the Document for a chunk ID, or a "not found" string
+        (the same contract as LangChain's InMemoryDocstore).
+        """
+        rows = self._query("SELECT text, metadata FROM chunks WHERE chunk_id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        return Document(page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, Document]:
+        """
+        Fetch several chunks in one query. Missing IDs are left out.
+        """
+        found: Dict[str, Document] = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for chunk_id, text, metadata in self._query(
+                f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({placeholders})",
+                tuple(batch),
+            ):
+                found[chunk_id] = Document(page_content=text, metadata=json.loads(metadata))
+        return found
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return bool(self._query("SELECT 1 FROM chunks WHERE chunk_id = ?", (chunk_id,)))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Insert or replace chunks keyed by chunk ID, with their postings.
+        """
+        rows = [
+            (
+                chunk_id,
+                doc.metadata.get("kb_file_id"),
+                doc.metadata.get("file_type"),
+                doc.page_content,
+                json.dumps(doc.metadata, default=str),
+            )
+            for chunk_id, doc in texts.items()
+        ]
+        with self._lock:
+            self._remove_postings(list(texts))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, kb_file_id, file_type, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._add_postings((chunk_id, doc.page_content) for chunk_id, doc in texts.items())
+            self._db.commit()
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._remove_postings(list(ids))
+            self._db.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def _add_postings(self, items: Iterable[Tuple[str, str]]) -> None:
+        # Callers hold the lock and commit
+        rows = []
+        dfs: Dict[str, int] = {}
+        docs = 0
+        total_length = 0
+        for chunk_id, text in items:
+            tokens = tokenize(text)
+            terms: Dict[str, int] = {}
+            for token in tokens:
+                terms[token] = terms.get(token, 0) + 1
+            rows.extend((term, chunk_id, tf, len(tokens)) for term, tf in terms.items())
+            for term in terms:
+                dfs[term] = dfs.get(term, 0) + 1
+            docs += 1
+            total_length += len(tokens)
+        self._db.executemany(
+            "INSERT INTO postings (term, chunk_id, tf, length) VALUES (?, ?, ?, ?)", rows
+        )
+        self._db.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) "
+            "ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+            dfs.items(),
+        )
+        self._add_keyword_totals(docs, total_length)
+
+    def _remove_postings(self, chunk_ids: List[str]) -> None:
+        # Callers hold the lock and commit
+        dfs: Dict[str, int] = {}
+        docs = 0
+        total_length = 0
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            lengths: Dict[str, int] = {}
+            for term, chunk_id, length in self._db.execute(
+                f"SELECT term, chunk_id, length FROM postings WHERE chunk_id IN ({placeholders})",
+                tuple(batch),
+            ):
+                dfs[term] = dfs.get(term, 0) + 1
+                lengths[chunk_id] = length
+            docs += len(lengths)
+            total_length += sum(lengths.values())
+            self._db.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", tuple(batch))
+        if not dfs:
+            return
+        self._db.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, t) for t, n in dfs.items()])
+        self._db.execute("DELETE FROM terms WHERE df <= 0")
+        self._add_keyword_totals(-docs, -total_length)
+
+    def _add_keyword_totals(self, docs: int, total_length: int) -> None:
+        current_docs, current_length = self.keyword_totals()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("keyword_docs", str(current_docs + docs)), ("keyword_length", str(current_length + total_length))],
+        )
+
+    def _index_existing_chunks(self) -> None:
+        # Stores saved before postings were kept here: index them once
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM terms")
+            self._db.execute("DELETE FROM meta WHERE key IN ('keyword_docs', 'keyword_length')")
+            cursor = self._db.cursor()
+            cursor.execute("SELECT chunk_id, text FROM chunks")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                self._add_postings(rows)
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('keyword_index', '1')")
+            self._db.commit()
+
+    def has_keyword_index(self) -> bool:
+        """
+        Whether the store holds BM25 postings (stores saved before they were
+        added here do not).
+        """
+        try:
+            return bool(self._query("SELECT 1 FROM meta WHERE key = 'keyword_index'"))
+        except sqlite3.OperationalError:
+            return False
+
+    def keyword_totals(self) -> Tuple[int, int]:
+        """
+        Return (number of chunks, total length in tokens) for BM25.
+        """
+        values = dict(self._query(
+            "SELECT key, value FROM meta WHERE key IN ('keyword_docs', 'keyword_length')"
+        ))
+        return int(values.get("keyword_docs", 0)), int(values.get("keyword_length", 0))
+
+    def term_dfs(self, terms: List[str]) -> Dict[str, int]:
+        """
+        Return the document frequency of each of the terms that occurs.
+        """
+        if not terms:
+            return {}
+        placeholders = ",".join("?" * len(terms))
+        return dict(self._query(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", tuple(terms)))
+
+    def postings(self, term: str) -> List[Tuple[str, int, int]]:
+        """
+        Return (chunk_id, term frequency, chunk length) for a term.
+        """
+        return self._query("SELECT chunk_id, tf, length FROM postings WHERE term = ?", (term,))
+
+    def iter_texts(self) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (chunk_id, text) for every chunk.
+        """
+        # A separate cursor, so other lookups can run while this is consumed
+        cursor = self._db.cursor()
+        cursor.execute("SELECT chunk_id, text FROM chunks")
+        yield from cursor
+
+    def chunk_ids_for_file(self, file_id: int) -> List[str]:
+        return [
+            row[0] for row in self._query(
+                "SELECT chunk_id FROM chunks WHERE kb_file_id = ? ORDER BY rowid", (file_id,)
+            )
+        ]
+
+    def file_chunks(self) -> Dict[int, List[str]]:
+        """
+        Return the chunk IDs of every knowledge base file.
+        """
+        result: Dict[int, List[str]] = {}
+        for file_id, chunk_id in self._query(
+            "SELECT kb_file_id, chunk_id FROM chunks WHERE kb_file_id IS NOT NULL ORDER BY rowid"
+        ):
+            result.setdefault(file_id, []).append(chunk_id)
+        return result
+
+    def untracked_count(self) -> int:
+        """
+        Return the number of chunks that belong to no knowledge base file.
+        """
+        return self._query("SELECT COUNT(*) FROM chunks WHERE kb_file_id IS NULL")[0][0]
+
+    def count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM chunks")[0][0]
+
+    def validate(self, ntotal: int) -> List[str]:
+        """
+        Check the store against an index holding ntotal vectors.
+        Returns:
+            List[str]: Descriptions of the problems found (empty if valid)
+        """
+        problems = []
+        chunks = self.count()
+        positions = self._query("SELECT COUNT(*), MIN(position), MAX(position) FROM positions")[0]
+        if positions[0] != ntotal:
+            problems.append(f"{positions[0]} positions for {ntotal} vectors")
+        elif ntotal and (positions[1] != 0 or positions[2] != ntotal - 1):
+            problems.append(f"positions span {positions[1]}..{positions[2]}, expected 0..{ntotal - 1}")
+        if chunks != ntotal:
+            problems.append(f"{chunks} chunks for {ntotal} vectors")
+        dangling = self._query(
+            "SELECT COUNT(*) FROM positions p LEFT JOIN chunks c ON c.chunk_id = p.chunk_id "
+            "WHERE c.chunk_id IS NULL"
+        )[0][0]
+        if dangling:
+            problems.append(f"{dangling} positions point to missing chunks")
+        return problems
+
+    def write_positions(self, index_to_docstore_id: Mapping[int, str]) -> None:
+        """
+        Record which chunk each FAISS position holds.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM positions")
+            self._db.executemany(
+                "INSERT INTO positions (position, chunk_id) VALUES (?, ?)",
+                index_to_docstore_id.items(),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('count', ?)",
+                (str(len(index_to_docstore_id)),),
+            )
+            self._db.commit()
+
+    def positions(self) -> Dict[int, str]:
+        """
+        Return the full position -> chunk ID mapping as a dict (for writers).
+        """
+        return dict(self._query("SELECT position, chunk_id FROM positions"))
+
+    def position_map(self) -> "PositionMap":
+        """
+        Return a lazy, read-only position -> chunk ID mapping.
+        """
+        return PositionMap(self)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def discard(self) -> None:
+        """
+        Close and delete a writable store that will not be saved.
+        """
+        self.close()
+        if not self.readonly and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class PositionMap(Mapping):
+    """
+    index_to_docstore_id for a read-only ChunkStore: looks positions up in
+    SQLite on demand instead of holding every chunk ID in memory.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+        rows = store._query("SELECT value FROM meta WHERE key = 'count'")
+        self._len = int(rows[0][0]) if rows else 0
+
+    def __getitem__(self, position: int) -> str:
+        rows = self._store._query(
+            "SELECT chunk_id FROM positions WHERE position = ?", (int(position),)
+        )
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (position,) in self._store._query("SELECT position FROM positions ORDER BY position"):
+            yield position
+
+    def __len__(self) -> int:
+        return self._len
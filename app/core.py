@@ -1,35 +1,83 @@
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from .langchain_compat import (
     ChatPromptTemplate,
     create_stuff_documents_chain,
     create_retrieval_chain,
 )
-from .models import load_llm, load_embedding_model
-from .vector_store import load_vector_store, hybrid_retrieve
+from .models import load_llm, load_embedding_model, query_embedding_cache
+from .vector_store import load_vector_store, hybrid_retrieve, get_index_version, rerank_cache
+from .cache import TTLCache
+from .metrics import ERRORS, RESPONSE_SECONDS, CallbackMetric
+from .tracing import annotate, log_event
+from .session_store import SessionStore, chunk_id_of
 import os
 import traceback
 import re
 import threading
-from app.models import KnowledgeBaseFile, db
-from app.vector_store import create_vector_store
-from langchain_community.document_loaders import PyMuPDFLoader
+import time
+from app.models import KnowledgeBaseFile, db, normalize_query
+from app.file_utils import hash_file, file_fingerprint
+from app.vector_store import load_file_chunks
+from app.loaders import load_files_parallel
 from .langchain_compat import Document, RecursiveCharacterTextSplitter
-import pandas as pd  # type: ignore
-import hashlib
 
 # Store user sessions to track new users
-user_sessions: Dict[str, bool] = {}
+user_sessions = TTLCache(
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", 10000)),
+    ttl=float(os.getenv("SESSION_TTL", 3600)),
+)
 
-# Track last context for each user for clarification
-last_context: Dict[str, Tuple[List[Document], str]] = {}
+# Track last context (chunk IDs) for each user for clarification
+last_context = SessionStore(
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", 10000)),
+    ttl=float(os.getenv("SESSION_TTL", 3600)),
+)
 
-embedding_progress: Dict[str, Any] = {
-    "status": "idle",
-    "progress": 0,
-    "total": 0,
-    "current": 0,
-    "message": "",
+# Finished RAG answers keyed by (normalized query, knowledge base version)
+answer_cache = TTLCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 512)),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", 1800)),
+)
+
+# Cache effectiveness, read from the caches' own counters at scrape time
+_CACHES = {"answer": answer_cache, "query_embedding": query_embedding_cache, "rerank": rerank_cache}
+CallbackMetric(
+    "chatbot_cache_hits_total", "Cache hits by cache.", "counter", ("cache",),
+    lambda: {(name,): cache.hits for name, cache in _CACHES.items()},
+)
+CallbackMetric(
+    "chatbot_cache_misses_total", "Cache misses by cache.", "counter", ("cache",),
+    lambda: {(name,): cache.misses for name, cache in _CACHES.items()},
+)
+CallbackMetric(
+    "chatbot_cache_entries", "Entries held by each cache.", "gauge", ("cache",),
+    lambda: {(name,): len(cache) for name, cache in _CACHES.items()},
+)
+
+# Conversation session stores, as reported at /api/admin/sessions
+_SESSION_STATS = {
+    "contexts": lambda: last_context.stats(approx_size=False),
+    "known_users": user_sessions.stats,
 }
+CallbackMetric(
+    "chatbot_session_entries", "Sessions held by each session store.", "gauge", ("store",),
+    lambda: {(name,): stats()["entries"] for name, stats in _SESSION_STATS.items()},
+)
+CallbackMetric(
+    "chatbot_session_max_entries", "Capacity of each session store.", "gauge", ("store",),
+    lambda: {(name,): stats()["max_entries"] for name, stats in _SESSION_STATS.items()},
+)
+CallbackMetric(
+    "chatbot_session_evictions_total", "Sessions evicted to stay within capacity.", "counter", ("store",),
+    lambda: {(name,): stats()["evictions"] for name, stats in _SESSION_STATS.items()},
+)
+CallbackMetric(
+    "chatbot_session_context_bytes", "Approximate memory held by conversation contexts.", "gauge", (),
+    lambda: {(): last_context.stats()["approx_bytes"]},
+)
+
+# Hashes of files known to differ from the DB: file id -> (fingerprint, hash)
+_changed_hash_cache: Dict[int, Tuple[Tuple[int, int, int], str]] = {}
 
 def create_rag_chain():
     """
@@ -90,6 +138,144 @@ def create_rag_chain():
     return rag_chain, vector_store, embeddings, document_chain
 
 
+class RAGPipeline:
+    """
+    Long-lived bundle of the RAG chain components.
+    Built once per process and shared read-only by all requests; a rebuilt
+    pipeline replaces it as a whole, so a request holding a reference keeps
+    using a consistent snapshot.
+    """
+
+    def __init__(self):
+        # Read the version first so a concurrent rewrite can only make it stale
+        self.version = get_index_version()
+        (
+            self.rag_chain,
+            self.vector_store,
+            self.embeddings,
+            self.document_chain,
+        ) = create_rag_chain()
+        # The version actually loaded, if the index was republished meanwhile
+        self.version = getattr(self.vector_store, "index_version", self.version)
+        self.loaded_at = time.time()
+
+
+_pipeline: Optional[RAGPipeline] = None
+_pipeline_lock = threading.Lock()
+# Seconds between checks for a newly published index version
+INDEX_CHECK_INTERVAL = float(os.getenv("INDEX_CHECK_INTERVAL", 2))
+_last_index_check = 0.0
+_refresh_lock = threading.Lock()
+_failed_version: Optional[str] = None
+
+
+def get_pipeline() -> RAGPipeline:
+    """
+    Return the shared RAG pipeline, building it on first use.
+    If another process has published a new index version, it is loaded in
+    the background while requests keep using the current pipeline.
+    Raises:
+        ValueError: If the knowledge base has not been embedded yet
+    """
+    global _pipeline
+    pipeline = _pipeline
+    if pipeline is not None:
+        _check_index_version(pipeline)
+        return pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = RAGPipeline()
+            print("[PIPELINE] RAG pipeline loaded.")
+        return _pipeline
+
+
+def reload_pipeline() -> Optional[RAGPipeline]:
+    """
+    Build a fresh pipeline from the current index and swap it in atomically.
+    In-flight requests keep the pipeline they already hold. If the index can
+    no longer be loaded, the shared pipeline is cleared instead.
+    """
+    global _pipeline
+    try:
+        pipeline: Optional[RAGPipeline] = RAGPipeline()
+    except Exception as e:
+        print(f"[PIPELINE] Reload failed, clearing pipeline: {e}")
+        pipeline = None
+    with _pipeline_lock:
+        _pipeline = pipeline
+    # Old answers are unreachable under the new version key; free them now
+    answer_cache.clear()
+    if pipeline is not None:
+        print("[PIPELINE] RAG pipeline reloaded.")
+    return pipeline
+
+
+def _check_index_version(pipeline: RAGPipeline) -> None:
+    global _last_index_check
+    now = time.monotonic()
+    if now - _last_index_check < INDEX_CHECK_INTERVAL:
+        return
+    _last_index_check = now
+    version = get_index_version()
+    if version == pipeline.version or version == _failed_version:
+        return
+    if _refresh_lock.acquire(blocking=False):
+        threading.Thread(
+            target=_refresh_pipeline, args=(version,), name="pipeline-refresh", daemon=True
+        ).start()
+
+
+def _refresh_pipeline(version: str) -> None:
+    """
+    Background reload after a new index version was published elsewhere.
+    """
+    global _pipeline, _failed_version
+    try:
+        if version == "none":
+            with _pipeline_lock:
+                _pipeline = None
+            answer_cache.clear()
+            print("[PIPELINE] Index was removed; pipeline cleared.")
+            return
+        try:
+            pipeline = RAGPipeline()
+        except Exception as e:
+            # Keep serving the current version rather than failing requests
+            print(f"[PIPELINE] Loading index version {version} failed: {e}")
+            _failed_version = version
+            return
+        with _pipeline_lock:
+            _pipeline = pipeline
+        answer_cache.clear()
+        print(f"[PIPELINE] Switched to index version {pipeline.version}.")
+    finally:
+        _refresh_lock.release()
+
+
+def get_answer_cache_stats() -> Dict[str, Any]:
+    """
+    Return answer cache statistics for the admin API.
+    """
+    return answer_cache.stats()
+
+
+def get_session_stats() -> Dict[str, Any]:
+    """
+    Return conversation session store statistics, including approximate memory use.
+    """
+    return {
+        "contexts": last_context.stats(),
+        "known_users": user_sessions.stats(),
+    }
+
+
+def flush_answer_cache() -> None:
+    """
+    Drop every cached answer.
+    """
+    answer_cache.clear()
+
+
 def is_new_user(user_id: str) -> bool:
     """
     Check if user is new based on their ID.
@@ -100,7 +286,7 @@ def is_new_user(user_id: str) -> bool:
     Returns:
         bool: True if user is new, False otherwise
     """
-    return user_id not in user_sessions
+    return user_sessions.get(user_id) is None
 
 
 def mark_user_as_known(user_id: str) -> None:
@@ -110,7 +296,7 @@ def mark_user_as_known(user_id: str) -> None:
     Args:
         user_id (str): User identifier
     """
-    user_sessions[user_id] = True
+    user_sessions.set(user_id, True)
 
 
 def format_bot_response(answer: str) -> str:
@@ -131,40 +317,152 @@ def format_bot_response(answer: str) -> str:
     return answer
 
 
-def get_response(query: str, user_id: Optional[str] = None, conversation_has_started: bool = False, is_initial_greeting_sent: bool = False) -> str:
+class StreamingResponseFormatter:
     """
-    Get a response from the RAG chain for a given query, with robust follow-up logic for elaboration requests.
-    Args:
-        query (str): The user's question
-        user_id (Optional[str]): User identifier for session tracking
+    Incremental version of format_bot_response for streamed answers.
+    Feed raw LLM chunks in order; the concatenated output of feed() and
+    finish() equals format_bot_response() applied to the whole answer.
+    Text that might still turn out to be part of a <context> block, or
+    trailing whitespace, is held back until it can be decided.
+    """
+
+    OPEN_TAG = "<context>"
+    CLOSE_TAG = "</context>"
+    CLOSING = " Apakah ada yang bisa saya bantu lebih lanjut?"
+
+    def __init__(self):
+        self._pending = ""
+        self._in_context = False
+        self._carriage_return = False
+        self._started = False
+        self._whitespace = ""
+        self._length = 0
+        self._last_char = ""
+        self._raw_content = False
+
+    @property
+    def has_content(self) -> bool:
+        """True once the LLM has produced any non-whitespace text."""
+        return self._raw_content
+
+    def feed(self, text: str) -> str:
+        """
+        Add a raw chunk and return the cleaned text that is safe to emit.
+        """
+        if not self._raw_content and text.strip():
+            self._raw_content = True
+        if self._carriage_return:
+            text = "\r" + text
+        self._carriage_return = text.endswith("\r")
+        if self._carriage_return:
+            text = text[:-1]
+        self._pending += text.replace("\r\n", "\n").replace("\r", "\n")
+        return self._drain(final=False)
+
+    def finish(self) -> str:
+        """
+        Flush held-back text and append the closing question if needed.
+        """
+        if self._carriage_return:
+            self._pending += "\n"
+            self._carriage_return = False
+        out = self._drain(final=True)
+        if self._length < 50 and self._last_char not in ("?", "!"):
+            out += self.CLOSING
+        return out
+
+    def _drain(self, final: bool) -> str:
+        out: List[str] = []
+        while self._pending:
+            if self._in_context:
+                end = self._pending.lower().find(self.CLOSE_TAG)
+                if end == -1:
+                    if not final:
+                        break
+                    # Unclosed block is not removed by format_bot_response either
+                    self._in_context = False
+                    self._emit(self._pending, out)
+                    self._pending = ""
+                    break
+                self._pending = self._pending[end + len(self.CLOSE_TAG):]
+                self._in_context = False
+                continue
+            start = self._pending.find("<")
+            if start == -1:
+                self._emit(self._pending, out)
+                self._pending = ""
+                break
+            self._emit(self._pending[:start], out)
+            rest = self._pending[start:]
+            if rest.lower().startswith(self.OPEN_TAG):
+                self._in_context = True
+                self._pending = rest
+            elif not final and self.OPEN_TAG.startswith(rest.lower()):
+                # Could still become an opening tag; wait for more text
+                self._pending = rest
+                break
+            else:
+                self._emit("<", out)
+                self._pending = rest[1:]
+        if final and self._whitespace:
+            # Trailing whitespace is stripped from the final answer
+            self._whitespace = ""
+        return "".join(out)
+
+    def _emit(self, text: str, out: List[str]) -> None:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        stripped = text.rstrip()
+        if not stripped:
+            self._whitespace += text
+            return
+        piece = self._whitespace + stripped
+        out.append(piece)
+        self._length += len(piece)
+        self._last_char = stripped[-1]
+        self._whitespace = text[len(stripped):]
+
+
+NO_INFO_MESSAGE = "Maaf, informasi mengenai hal tersebut tidak ditemukan dalam basis pengetahuan saya."
+
+
+def _plan_response(query: str, user_id: Optional[str]) -> Any:
+    """
+    Resolve everything about a response that does not need the LLM.
     Returns:
-        str: The AI's response in Indonesian
+        Either the final answer (str), or a dict describing the LLM call still
+        to be made: pipeline, input, documents, fallback message, and the answer
+        cache key/chunk IDs to store the result under (None for follow-ups).
     """
-    try:
-        # Handle empty or greeting queries
-        query_lower = query.lower().strip()
-        if not query or query_lower in [
-            "hi",
-            "hello",
-            "halo",
-            "hai",
-            "selamat pagi",
-            "selamat siang",
-            "selamat malam",
-        ]:
-            return format_bot_response(
-                "Halo! 👋 \n\nSelamat datang di Asisten Virtual Pusat Pengembangan Bahasa (PPB) UIN Syarif Hidayatullah Jakarta. \n\n"
-                "UIN Syarif Hidayatullah Jakarta. \n\n"
-                "Saya siap membantu Anda dengan informasi seputar Pusat Pengembangan Bahasa (PPB). \n\n"
-                "Silakan ajukan pertanyaan spesifik tentang informasi yang "
-                "Anda butuhkan! 😊"
-            )
+    annotate(query_chars=len(query))
+    # Handle empty or greeting queries
+    query_lower = query.lower().strip()
+    if not query or query_lower in [
+        "hi",
+        "hello",
+        "halo",
+        "hai",
+        "selamat pagi",
+        "selamat siang",
+        "selamat malam",
+    ]:
+        annotate(outcome="greeting")
+        return format_bot_response(
+            "Halo! 👋 \n\nSelamat datang di Asisten Virtual Pusat Pengembangan Bahasa (PPB) UIN Syarif Hidayatullah Jakarta. \n\n"
+            "UIN Syarif Hidayatullah Jakarta. \n\n"
+            "Saya siap membantu Anda dengan informasi seputar Pusat Pengembangan Bahasa (PPB). \n\n"
+            "Silakan ajukan pertanyaan spesifik tentang informasi yang "
+            "Anda butuhkan! 😊"
+        )
 
-        # Check if this is a new user
-#         if user_id and is_new_user(user_id):
-#             mark_user_as_known(user_id)
-#             return format_bot_response(
-#                 """Selamat datang di Asisten Virtual Pusat Pengembangan Bahasa (PPB) UIN Syarif Hidayatullah Jakarta! 🎓
+    # Check if this is a new user
+#     if user_id and is_new_user(user_id):
+#         mark_user_as_known(user_id)
+#         return format_bot_response(
+#             """Selamat datang di Asisten Virtual Pusat Pengembangan Bahasa (PPB) UIN Syarif Hidayatullah Jakarta! 🎓
 
 # Saya adalah asisten AI yang siap membantu Anda dengan informasi seputar layanan di Pusat Pengembangan Bahasa (PPB) UIN Syarif Hidayatullah Jakarta.
 
@@ -178,90 +476,186 @@ def get_response(query: str, user_id: Optional[str] = None, conversation_has_sta
 # *Catatan:* Saya akan memberikan jawaban berdasarkan dokumen resmi PPB UIN Jakarta. Untuk informasi yang lebih spesifik, silakan hubungi langsung administrasi PPB.
 
 # Silakan ajukan pertanyaan Anda! 😊"""
-#             )
-        
-        # Robust follow-up trigger detection
-        followup_triggers = [
-            "jelaskan lebih lanjut",
-            "jelaskan lebih detail",
-            "jelaskan lebih jelas",
-            "jelaskan lebih rinci",
-            "jelaskan lebih lengkap",
-            "saya ingin penjelasan lebih lanjut",
-            "explain more",
-            "can you elaborate",
-            "give me more details",
-            "be more specific",
-            "tell me more about that",
-            "in more detail, please",
-            "elaborate on that",
-        ]
-        if user_id and any(query_lower.startswith(trigger) for trigger in followup_triggers):
-            if user_id in last_context:
-                context_docs, last_question = last_context[user_id]
-                valid_context = (
-                    isinstance(context_docs, list)
-                    and context_docs
-                    and hasattr(context_docs[0], "page_content")
-                )
-                if not valid_context:
-                    return format_bot_response(
-                        "Maaf, tidak ada topik sebelumnya yang dapat dijelaskan lebih lanjut. Silakan ajukan pertanyaan baru."
-                    )
-                # Formulate a detail-enhancing query
-                detail_query = (
-                    f"Terkait pertanyaan saya sebelumnya, '{last_question}', "
-                    "mohon berikan penjelasan yang jauh lebih rinci dan komprehensif. "
-                    "Jabarkan semua poin penting, sertakan langkah-langkah atau contoh lebih spesifik jika tersedia dari konteks, dan pastikan jawabannya selengkap mungkin."
-                )
-                # Use the same context_docs, do NOT re-retrieve
-                rag_chain, vector_store, embeddings, document_chain = create_rag_chain()
-                answer = document_chain.invoke({"input": detail_query, "documents": context_docs[:5]})
-                if not answer or answer.strip() == "":
-                    return format_bot_response(
-                        "Maaf, saya tidak dapat memberikan penjelasan lebih lanjut. Silakan ajukan pertanyaan lain."
-                    )
-                # Do NOT update last_context here (keep the original question for further follow-ups)
-                return format_bot_response(answer)
-            else:
+#         )
+    
+    # Robust follow-up trigger detection
+    followup_triggers = [
+        "jelaskan lebih lanjut",
+        "jelaskan lebih detail",
+        "jelaskan lebih jelas",
+        "jelaskan lebih rinci",
+        "jelaskan lebih lengkap",
+        "saya ingin penjelasan lebih lanjut",
+        "explain more",
+        "can you elaborate",
+        "give me more details",
+        "be more specific",
+        "tell me more about that",
+        "in more detail, please",
+        "elaborate on that",
+    ]
+    if user_id and any(query_lower.startswith(trigger) for trigger in followup_triggers):
+        session_context = None
+        if last_context.has_context(user_id):
+            pipeline = get_pipeline()
+            session_context = last_context.get_context(user_id, pipeline.vector_store)
+        if session_context is not None:
+            context_docs, last_question = session_context
+            valid_context = (
+                isinstance(context_docs, list)
+                and context_docs
+                and hasattr(context_docs[0], "page_content")
+            )
+            if not valid_context:
+                annotate(outcome="no_previous_topic")
                 return format_bot_response(
                     "Maaf, tidak ada topik sebelumnya yang dapat dijelaskan lebih lanjut. Silakan ajukan pertanyaan baru."
                 )
-        
-        # Create RAG chain
-        rag_chain, vector_store, embeddings, document_chain = create_rag_chain()
-        
-        # Hybrid retrieval
-        hybrid_docs = hybrid_retrieve(query, vector_store, embeddings, top_k=6)
-        context_docs = [
-            doc
-            for doc in hybrid_docs
-            if hasattr(doc, "page_content") and isinstance(doc.page_content, str)
-        ]
-        if user_id:
-            last_context[user_id] = (context_docs, query)
-        if not context_docs:
+            # Formulate a detail-enhancing query
+            detail_query = (
+                f"Terkait pertanyaan saya sebelumnya, '{last_question}', "
+                "mohon berikan penjelasan yang jauh lebih rinci dan komprehensif. "
+                "Jabarkan semua poin penting, sertakan langkah-langkah atau contoh lebih spesifik jika tersedia dari konteks, dan pastikan jawabannya selengkap mungkin."
+            )
+            # Use the same context_docs, do NOT re-retrieve
+            # Do NOT update last_context here (keep the original question for further follow-ups)
+            annotate(outcome="followup")
+            return {
+                "pipeline": pipeline,
+                "input": detail_query,
+                "documents": context_docs[:5],
+                "fallback": "Maaf, saya tidak dapat memberikan penjelasan lebih lanjut. Silakan ajukan pertanyaan lain.",
+                "cache_key": None,
+                "chunk_ids": None,
+            }
+        else:
+            annotate(outcome="no_previous_topic")
             return format_bot_response(
-                "Maaf, informasi mengenai hal tersebut tidak ditemukan dalam basis pengetahuan saya."
+                "Maaf, tidak ada topik sebelumnya yang dapat dijelaskan lebih lanjut. Silakan ajukan pertanyaan baru."
             )
+    
+    # Shared RAG pipeline
+    pipeline = get_pipeline()
+
+    # Repeated questions are answered from the cache, skipping rerank and LLM
+    cache_key = (normalize_query(query), pipeline.version)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        cached_answer, chunk_ids = cached
+        if user_id:
+            last_context.set_chunk_ids(user_id, chunk_ids, query)
+        annotate(outcome="answer_cache", chunk_ids=list(chunk_ids))
+        return cached_answer
+    
+    # Hybrid retrieval
+    hybrid_docs = hybrid_retrieve(query, pipeline.vector_store, pipeline.embeddings, top_k=6)
+    context_docs = [
+        doc
+        for doc in hybrid_docs
+        if hasattr(doc, "page_content") and isinstance(doc.page_content, str)
+    ]
+    if user_id:
+        last_context.set_context(user_id, context_docs, query)
+    if not context_docs:
+        annotate(outcome="no_context")
+        return format_bot_response(NO_INFO_MESSAGE)
+
+    # Use the main RAG chain and authoritative prompt
+    annotate(outcome="llm")
+    return {
+        "pipeline": pipeline,
+        "input": query,
+        "documents": context_docs[:5],
+        "fallback": NO_INFO_MESSAGE,
+        "cache_key": cache_key,
+        "chunk_ids": tuple(
+            chunk_id for chunk_id in (chunk_id_of(doc) for doc in context_docs) if chunk_id
+        ),
+    }
+
+
+def _format_error(e: Exception) -> str:
+    ERRORS.inc("response")
+    annotate(outcome="error", error=repr(e))
+    log_event("response_error", error=repr(e), traceback=traceback.format_exc())
+    error_msg = (
+        f"Maaf, saya mengalami kesalahan dalam memproses "
+        f"pertanyaan Anda: {str(e)}"
+    )
+    return format_bot_response(error_msg)
+
+
+def get_response(query: str, user_id: Optional[str] = None, conversation_has_started: bool = False, is_initial_greeting_sent: bool = False) -> str:
+    """
+    Get a response from the RAG chain for a given query, with robust follow-up logic for elaboration requests.
+    Args:
+        query (str): The user's question
+        user_id (Optional[str]): User identifier for session tracking
+    Returns:
+        str: The AI's response in Indonesian
+    """
+    with RESPONSE_SECONDS.time("full"):
+        return _get_response(query, user_id)
+
 
-        # Use the main RAG chain and authoritative prompt
-        answer = document_chain.invoke({"input": query, "documents": context_docs[:5]})
+def _get_response(query: str, user_id: Optional[str]) -> str:
+    try:
+        plan = _plan_response(query, user_id)
+        if isinstance(plan, str):
+            return plan
+        answer = plan["pipeline"].document_chain.invoke(
+            {"input": plan["input"], "documents": plan["documents"]}
+        )
         if not answer or answer.strip() == "":
-            return format_bot_response(
-                "Maaf, informasi mengenai hal tersebut tidak ditemukan dalam basis pengetahuan saya."
-            )
-        return format_bot_response(answer)
+            return format_bot_response(plan["fallback"])
+        formatted_answer = format_bot_response(answer)
+        if plan["cache_key"] is not None:
+            answer_cache.set(plan["cache_key"], (formatted_answer, plan["chunk_ids"]))
+        return formatted_answer
     
     except Exception as e:
-        print("=== FULL TRACEBACK ===")
-        traceback.print_exc()
-        print("=== END TRACEBACK ===")
-        error_msg = (
-            f"Maaf, saya mengalami kesalahan dalam memproses "
-            f"pertanyaan Anda: {str(e)}"
-        )
-        return format_bot_response(error_msg)
+        return _format_error(e)
+
+
+def stream_response(query: str, user_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Streaming variant of get_response.
+    Yields pieces of the answer as the LLM produces them, already cleaned up
+    incrementally the same way format_bot_response cleans a full answer.
+    Answers that need no LLM call (greetings, cache hits, no context) are
+    yielded in one piece.
+    """
+    # Timed until the last chunk (or until the client goes away)
+    with RESPONSE_SECONDS.time("stream"):
+        yield from _stream_response(query, user_id)
+
+
+def _stream_response(query: str, user_id: Optional[str]) -> Iterator[str]:
+    try:
+        plan = _plan_response(query, user_id)
+        if isinstance(plan, str):
+            yield plan
+            return
+        formatter = StreamingResponseFormatter()
+        parts: List[str] = []
+        for chunk in plan["pipeline"].document_chain.stream(
+            {"input": plan["input"], "documents": plan["documents"]}
+        ):
+            text = formatter.feed(chunk if isinstance(chunk, str) else str(chunk))
+            if text:
+                parts.append(text)
+                yield text
+        if not formatter.has_content:
+            yield format_bot_response(plan["fallback"])
+            return
+        text = formatter.finish()
+        if text:
+            parts.append(text)
+            yield text
+        if plan["cache_key"] is not None:
+            answer_cache.set(plan["cache_key"], ("".join(parts), plan["chunk_ids"]))
+    except Exception as e:
+        yield _format_error(e)
 
 
 def get_system_info() -> str:
@@ -272,8 +666,10 @@ def get_system_info() -> str:
         str: System information in Indonesian
     """
     try:
-        embeddings = load_embedding_model()
-        vector_store = load_vector_store(embeddings)
+        try:
+            vector_store = get_pipeline().vector_store
+        except ValueError:
+            vector_store = None
         
         if not vector_store:
             return (
@@ -319,41 +715,11 @@ def load_kb_files() -> List[Document]:
     """
     documents: List[Document] = []
     files = KnowledgeBaseFile.query.all()
-    for kb_file in files:
-        try:
-            if kb_file.filetype == "pdf":
-                loader = PyMuPDFLoader(kb_file.filepath)
-                docs = loader.load()
-                for d in docs:
-                    d.metadata["file_type"] = "pdf"
-                documents.extend(docs)
-            elif kb_file.filetype == "txt":
-                with open(kb_file.filepath, "r", encoding="utf-8") as f:
-                    text = f.read()
-                    documents.append(
-                        Document(
-                            page_content=text,
-                            metadata={"source": kb_file.filename, "file_type": "txt"},
-                        )
-                    )
-            elif kb_file.filetype == "csv":
-                df = pd.read_csv(kb_file.filepath)
-                for index, row in df.iterrows():
-                    row_text = ""
-                    for column, value in row.items():
-                        if pd.notna(value):
-                            row_text += f"{column}: {value}\n"
-                    if row_text.strip():
-                        metadata = {
-                            "source": kb_file.filename,
-                            "row": int(str(index)) + 1,
-                            "file_type": "csv",
-                        }
-                        documents.append(
-                            Document(page_content=row_text.strip(), metadata=metadata)
-                        )
-        except Exception as e:
-            print(f"Error loading {kb_file.filename}: {e}")
+    specs = [(f.filepath, f.filetype, f.filename) for f in files]
+    for index, docs, error in load_files_parallel(specs):
+        if error is not None:
+            print(f"Error loading {files[index].filename}: {error}")
+        documents.extend(docs)
     return documents
 
 
@@ -395,124 +761,98 @@ def get_changed_files() -> List[KnowledgeBaseFile]:
     """
     Return a list of KnowledgeBaseFile objects whose file hash does not match
     the current file content.
+    Files are only re-hashed (in streamed blocks) when their (size, mtime_ns,
+    inode) fingerprint differs from the one stored with the hash.
     """
     changed: List[KnowledgeBaseFile] = []
     files = KnowledgeBaseFile.query.all()
+    dirty = False
     for kb_file in files:
         try:
-            with open(kb_file.filepath, "rb") as f:
-                filehash = hashlib.sha256(f.read()).hexdigest()
+            fingerprint = file_fingerprint(kb_file.filepath)
+            if fingerprint == kb_file.fingerprint:
+                continue
+            cached = _changed_hash_cache.get(kb_file.id)
+            if cached and cached[0] == fingerprint:
+                filehash = cached[1]
+            else:
+                filehash = hash_file(kb_file.filepath)
             if filehash != kb_file.filehash:
+                # Remember the hash so polling doesn't re-read it until it changes again
+                _changed_hash_cache[kb_file.id] = (fingerprint, filehash)
                 changed.append(kb_file)
+            else:
+                # Touched but identical content: adopt the new fingerprint
+                kb_file.set_fingerprint(fingerprint)
+                _changed_hash_cache.pop(kb_file.id, None)
+                dirty = True
         except Exception:
             # If file missing or unreadable, treat as changed
             changed.append(kb_file)
+    if dirty:
+        db.session.commit()
     return changed
 
 
-def run_embedding_background(app: Any, force_all: bool = False) -> None:
-    global embedding_progress
-    with app.app_context():
-        embedding_progress["status"] = "running"
-        embedding_progress["progress"] = 0
-        embedding_progress["message"] = "Loading documents..."
-        if force_all:
-            files = KnowledgeBaseFile.query.all()
-        else:
-            files = get_changed_files()
-        total = len(files)
-        embedding_progress["total"] = total
-        embedding_progress["current"] = 0
-        if total == 0:
-            embedding_progress["status"] = "done"
-            embedding_progress["progress"] = 100
-            embedding_progress["message"] = "No files need re-embedding."
-            return
-        # Load and split only the selected files
-        documents: List[Document] = []
-        for kb_file in files:
-            try:
-                if kb_file.filetype == "pdf":
-                    loader = PyMuPDFLoader(kb_file.filepath)
-                    docs = loader.load()
-                    for d in docs:
-                        d.metadata["file_type"] = "pdf"
-                    documents.extend(docs)
-                elif kb_file.filetype == "txt":
-                    with open(kb_file.filepath, "r", encoding="utf-8") as f:
-                        text = f.read()
-                        documents.append(
-                            Document(
-                                page_content=text,
-                                metadata={
-                                    "source": kb_file.filename,
-                                    "file_type": "txt",
-                                },
-                            )
-                        )
-                elif kb_file.filetype == "csv":
-                    df = pd.read_csv(kb_file.filepath)
-                    for index, row in df.iterrows():
-                        row_text = ""
-                        for column, value in row.items():
-                            if pd.notna(value):
-                                row_text += f"{column}: {value}\n"
-                        if row_text.strip():
-                            metadata = {
-                                "source": kb_file.filename,
-                                "row": int(str(index)) + 1,
-                                "file_type": "csv",
-                            }
-                            documents.append(
-                                Document(
-                                    page_content=row_text.strip(), metadata=metadata
-                                )
-                            )
-            except Exception as e:
-                print(f"Error loading {kb_file.filename}: {e}")
-            embedding_progress["current"] += 1
-            embedding_progress["progress"] = int(
-                (embedding_progress["current"]) / total * 100
-            )
-        embedding_progress["message"] = "Splitting documents..."
-        chunks = split_documents_by_type(documents, chunk_size=2000, chunk_overlap=400)
-        embedding_progress["message"] = "Creating vector store..."
-        create_vector_store(chunks)
-        # Update hashes and embedded_at timestamp in DB for embedded files
-        from datetime import datetime
-        now = datetime.utcnow()
-        for kb_file in files:
-            try:
-                with open(kb_file.filepath, "rb") as f:
-                    kb_file.filehash = hashlib.sha256(f.read()).hexdigest()
-                kb_file.embedded_at = now  # Mark file as embedded
-                db.session.commit()
-            except Exception:
-                pass
-        embedding_progress["progress"] = 100
-        embedding_progress["status"] = "done"
-        embedding_progress["message"] = "Embedding complete!"
+def get_files_to_embed() -> List[KnowledgeBaseFile]:
+    """
+    Return the KnowledgeBaseFile objects whose vectors are missing or stale:
+    files whose content changed, files never embedded, and files that have
+    no chunks in the current index.
+    """
+    indexed_ids = set(load_file_chunks())
+    changed_ids = {f.id for f in get_changed_files()}
+    return [
+        kb_file
+        for kb_file in KnowledgeBaseFile.query.all()
+        if kb_file.id in changed_ids
+        or kb_file.embedded_at is None
+        or kb_file.id not in indexed_ids
+    ]
 
 
-def start_embedding(app: Any, force_all: bool = False) -> bool:
+def mark_files_embedded(files: List[KnowledgeBaseFile]) -> None:
     """
-    Start the embedding process in a background thread.
+    Record the current content hash, fingerprint and embedded_at timestamp
+    of files whose vectors have just been published.
     """
-    global embedding_progress
-    if embedding_progress["status"] == "running":
-        return False  # Already running
-    embedding_progress["status"] = "starting"
-    thread = threading.Thread(target=run_embedding_background, args=(app, force_all))
-    thread.start()
-    return True
+    from datetime import datetime
+    now = datetime.utcnow()
+    for kb_file in files:
+        try:
+            fingerprint = file_fingerprint(kb_file.filepath)
+            kb_file.filehash = hash_file(kb_file.filepath)
+            kb_file.set_fingerprint(fingerprint)
+            _changed_hash_cache.pop(kb_file.id, None)
+            kb_file.embedded_at = now  # Mark file as embedded
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
 
 
-def get_embedding_progress() -> Dict[str, Any]:
+def get_kb_status() -> str:
     """
-    Return the current embedding progress as a dict.
+    Return the knowledge base status shown on the dashboard, from a single
+    aggregate query:
+    - 'no_files' if no file has been uploaded
+    - 'requires_embedding' if there is no index, a file was never embedded,
+      or files were uploaded after the last embedding
+    - 'active' otherwise
     """
-    global embedding_progress
-    return embedding_progress
+    from sqlalchemy import func
+    files, embedded, last_embedded, last_uploaded = db.session.query(
+        func.count(KnowledgeBaseFile.id),
+        func.count(KnowledgeBaseFile.embedded_at),
+        func.max(KnowledgeBaseFile.embedded_at),
+        func.max(KnowledgeBaseFile.uploaded_at),
+    ).one()
+    if not files:
+        return "no_files"
+    if get_index_version() == "none" or embedded < files:
+        return "requires_embedding"
+    if last_embedded and last_uploaded and last_uploaded > last_embedded:
+        return "requires_embedding"
+    return "active"
 
 
 def get_file_status() -> List[Dict[str, Any]]:
@@ -543,11 +883,11 @@ def get_response_for_evaluation(query: str, user_id: str = "evaluation_user") ->
         Dict[str, Any]: A dictionary containing the query, answer, and context documents.
     """
     try:
-        # Create RAG chain components
-        rag_chain, vector_store, embeddings, document_chain = create_rag_chain()
+        # Shared RAG pipeline
+        pipeline = get_pipeline()
 
         # Hybrid retrieval
-        hybrid_docs = hybrid_retrieve(query, vector_store, embeddings, top_k=5)
+        hybrid_docs = hybrid_retrieve(query, pipeline.vector_store, pipeline.embeddings, top_k=5)
         context_docs = [
             doc
             for doc in hybrid_docs
@@ -562,7 +902,7 @@ def get_response_for_evaluation(query: str, user_id: str = "evaluation_user") ->
             }
 
         # Invoke the document chain to get the answer
-        answer = document_chain.invoke({"input": query, "documents": context_docs})
+        answer = pipeline.document_chain.invoke({"input": query, "documents": context_docs})
 
         # Format the response and return all components
         formatted_answer = format_bot_response(answer)
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = "cache/embeddings.sqlite3"
+DEFAULT_MAX_ENTRIES = 200000
+# Cache hits whose last_used update is held back, to be written in one batch
+TOUCH_BATCH_SIZE = 1000
+
+
+def text_hash(text: str) -> str:
+    """
+    Content hash used as the cache key for a text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+    Entries are keyed by (model, sha256(text)) and stored as float32 blobs.
+    When the cache grows past max_entries, the least recently used entries
+    are evicted. The file may be shared by several processes (web workers
+    and the embedding worker), so the size is always counted in SQLite.
+    Lookups do not write: last_used of hits is updated in batches, with the
+    next insert or every TOUCH_BATCH_SIZE hits.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (model, text_hash) -> last use not yet written to the database
+        self._touched: Dict[Tuple[str, str], float] = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """
+        Look up embeddings for a list of texts.
+        Returns:
+            Dict[int, List[float]]: Cached vectors keyed by position in texts
+        """
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            now = time.time()
+            for key in found:
+                self._touched[(model, key)] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE:
+                self._write_touches()
+                self._conn.commit()
+            result = {i: found[key] for i, key in enumerate(hashes) if key in found}
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store embeddings for texts, evicting least recently used entries if needed.
+        """
+        now = time.time()
+        rows = [
+            (model, text_hash(text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            # Recency must be current before choosing what to evict
+            self._write_touches()
+            # Counted inside this write transaction, so entries added by
+            # other processes are included
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if size > self.max_entries:
+                excess = size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def _write_touches(self) -> None:
+        # Callers hold the lock and commit
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE model = ? AND text_hash = ?",
+            [(used, model, key) for (model, key), used in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def clear(self) -> None:
+        """
+        Remove every cached embedding.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return hit/miss counters and current size.
+        """
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, or None if disabled via
+    EMBEDDING_CACHE_PATH="".
+    """
+    global _embedding_cache
+    path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+            _embedding_cache = EmbeddingCache(path, max_entries=max_entries)
+        return _embedding_cache
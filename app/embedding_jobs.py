@@ -0,0 +1,588 @@
+"""
+Durable embedding jobs.
+The admin dashboard queues a job in the database; a separate worker process
+(`flask --app main embed-worker`) claims it, embeds the selected files and
+publishes the index. Progress and per-file status live in the job tables,
+so every web worker reports the same state and nothing is lost when a
+process restarts.
+
+Incremental jobs publish the index every EMBED_CHECKPOINT_FILES files. A job
+whose worker dies is taken over by the next worker and resumes after the
+last completed file; a cancelled job stops before its next file.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from .core import get_files_to_embed, mark_files_embedded, split_documents_by_type
+from .events import notify_change
+from .langchain_compat import Document
+from .loaders import load_files_parallel
+from .models import EmbeddingJob, EmbeddingJobFile, KnowledgeBaseFile, db
+from .vector_store import (
+    INDEX_ROOT,
+    assign_chunk_ids,
+    create_vector_store,
+    delete_file_chunks,
+    delete_index,
+    has_untracked_chunks,
+    load_file_chunks,
+    upsert_file_chunks,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Files embedded between two published checkpoints of an incremental job
+EMBED_CHECKPOINT_FILES = max(1, int(os.getenv("EMBED_CHECKPOINT_FILES", 20)))
+# Seconds between progress/heartbeat writes of a running job
+EMBED_HEARTBEAT_INTERVAL = float(os.getenv("EMBED_HEARTBEAT_INTERVAL", 2))
+# A running job without a heartbeat for this long is taken over by another worker
+EMBED_JOB_STALE_SECONDS = float(os.getenv("EMBED_JOB_STALE_SECONDS", 60))
+# Seconds an idle worker waits before looking for queued jobs again
+EMBED_WORKER_POLL_INTERVAL = float(os.getenv("EMBED_WORKER_POLL_INTERVAL", 2))
+# Let the web app start a worker process when a job is queued and none runs
+EMBED_WORKER_AUTOSTART = os.getenv("EMBED_WORKER_AUTOSTART", "true").lower() == "true"
+# Held by the worker process running on this host
+WORKER_LOCK_FILE = os.path.join(INDEX_ROOT, ".embed-worker.lock")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job once cancellation has been requested.
+    """
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_gone(worker: Optional[str]) -> bool:
+    """
+    True if worker names a process on this host that no longer exists.
+    """
+    if not worker or os.name == "nt":
+        return False
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def _is_stalled(job: EmbeddingJob) -> bool:
+    if job.status != "running":
+        return False
+    stale_before = datetime.utcnow() - timedelta(seconds=EMBED_JOB_STALE_SECONDS)
+    return job.heartbeat_at is None or job.heartbeat_at < stale_before or _worker_gone(job.worker)
+
+
+def _active_job() -> Optional[EmbeddingJob]:
+    return (
+        EmbeddingJob.query.filter(EmbeddingJob.status.in_(ACTIVE_STATUSES))
+        .order_by(EmbeddingJob.id)
+        .first()
+    )
+
+
+def start_embedding(force_all: bool = False) -> bool:
+    """
+    Queue an embedding job and make sure a worker will run it.
+    Args:
+        force_all: Rebuild the index from every file instead of updating
+            only new and changed files
+    Returns:
+        bool: False if a job is already queued or running
+    """
+    started = False
+    if _active_job() is None:
+        db.session.add(EmbeddingJob(force_all=force_all, message="Waiting for the embedding worker..."))
+        db.session.commit()
+        notify_change()
+        started = True
+    # Also (re)starts a worker for an active job whose worker has died
+    if EMBED_WORKER_AUTOSTART:
+        ensure_worker()
+    return started
+
+
+def cancel_embedding() -> bool:
+    """
+    Cancel the active job: a queued job is cancelled at once, a running one
+    stops before its next file (files already published stay embedded).
+    Returns:
+        bool: False if no job is queued or running
+    """
+    job = _active_job()
+    if job is None:
+        return False
+    now = datetime.utcnow()
+    cancelled = db.session.execute(
+        update(EmbeddingJob)
+        .where(EmbeddingJob.id == job.id, EmbeddingJob.status == "queued")
+        .values(status="cancelled", cancel_requested=True, message="Cancelled.", finished_at=now)
+    ).rowcount
+    if not cancelled:
+        db.session.execute(
+            update(EmbeddingJob).where(EmbeddingJob.id == job.id).values(cancel_requested=True)
+        )
+    db.session.commit()
+    notify_change()
+    return True
+
+
+def get_embedding_progress() -> Dict[str, Any]:
+    """
+    Return the state of the latest embedding job as a dict, including the
+    status of each of its files.
+    """
+    job = EmbeddingJob.query.order_by(EmbeddingJob.id.desc()).first()
+    if job is None:
+        return {"status": "idle", "progress": 0, "total": 0, "current": 0, "message": ""}
+    stalled = _is_stalled(job)
+    message = job.message or ""
+    if job.status == "running" and job.cancel_requested:
+        message = "Cancelling..."
+    elif stalled:
+        message = "Embedding worker stopped responding; the job resumes when a worker is running."
+    if job.total:
+        progress = int(job.current / job.total * 100)
+    else:
+        progress = 100 if job.status == "done" else 0
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "force_all": job.force_all,
+        "progress": progress,
+        "total": job.total,
+        "current": job.current,
+        "message": message,
+        "error": job.error,
+        "stalled": stalled,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "files": [
+            {
+                "id": f.kb_file_id,
+                "filename": f.filename,
+                "status": f.status,
+                "chunks": f.chunks,
+                "error": f.error,
+            }
+            for f in job.files
+        ],
+    }
+
+
+def _lock_worker_slot():
+    """
+    Take this host's worker lock without blocking. Returns the open lock
+    file (the lock lasts while it stays open), or None if another worker
+    holds it.
+    """
+    os.makedirs(INDEX_ROOT, exist_ok=True)
+    lock_file = open(WORKER_LOCK_FILE, "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def ensure_worker() -> None:
+    """
+    Start a worker process for the queued jobs unless one is already running
+    on this host. It exits once the queue is empty.
+    """
+    if fcntl is None:
+        # Without file locks there is no way to tell; run `flask embed-worker`
+        return
+    lock_file = _lock_worker_slot()
+    if lock_file is None:
+        return
+    lock_file.close()
+    subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "main", "embed-worker", "--once"],
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    print("[EMBED] Started embedding worker process")
+
+
+def claim_next_job() -> Optional[int]:
+    """
+    Atomically take the oldest queued job, or a running job whose worker
+    has died, for this process.
+    Returns:
+        Optional[int]: The claimed job's ID, or None if there is nothing to run
+    """
+    for job in EmbeddingJob.query.filter(EmbeddingJob.status.in_(ACTIVE_STATUSES)).order_by(EmbeddingJob.id).all():
+        if job.status == "running" and not _is_stalled(job):
+            continue
+        previous_worker = job.worker
+        now = datetime.utcnow()
+        # attempts works as a version number: only one worker can bump it
+        claimed = db.session.execute(
+            update(EmbeddingJob)
+            .where(EmbeddingJob.id == job.id, EmbeddingJob.attempts == job.attempts)
+            .values(
+                status="running",
+                worker=_worker_id(),
+                heartbeat_at=now,
+                started_at=job.started_at or now,
+                attempts=job.attempts + 1,
+            )
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            notify_change()
+            if previous_worker:
+                print(f"[EMBED] Resuming job {job.id} abandoned by {previous_worker}")
+            return job.id
+    return None
+
+
+class _JobReporter:
+    """
+    Writes a running job's progress and heartbeat from a background thread
+    and picks up cancellation requests. Ingestion stages report from their
+    own threads, so they only update this object, never the DB session.
+    """
+
+    def __init__(self, app: Any, job_id: int):
+        self.app = app
+        self.job_id = job_id
+        self.worker = _worker_id()
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._current = 0
+        self._total = 0
+        self._embedded = 0
+        self._embedded_before = 0
+        self._message = "Loading documents..."
+        self._written: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="embed-heartbeat", daemon=True)
+        self._thread.start()
+
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def set_counts(self, current: int, total: int) -> None:
+        with self._lock:
+            self._current = current
+            self._total = total
+
+    def file_loaded(self) -> None:
+        with self._lock:
+            self._current += 1
+
+    def batch_embedded(self, completed: int, embedded: int) -> None:
+        # Progress hook for the ingestion stages: counts restart per checkpoint
+        with self._lock:
+            self._embedded = self._embedded_before + embedded
+            self._message = f"Embedded {self._embedded} chunks, {self._current}/{self._total} files loaded..."
+
+    def checkpoint(self, message: str) -> None:
+        with self._lock:
+            self._embedded_before = self._embedded
+            self._message = message
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._flush()
+
+    def _run(self) -> None:
+        while True:
+            self._flush()
+            if self._stop.wait(EMBED_HEARTBEAT_INTERVAL):
+                return
+
+    def _flush(self) -> None:
+        with self._lock:
+            values = {"current": self._current, "total": self._total, "message": self._message[:255]}
+        changed = values != self._written
+        values["heartbeat_at"] = datetime.utcnow()
+        try:
+            with self.app.app_context():
+                owned = db.session.execute(
+                    update(EmbeddingJob)
+                    .where(
+                        EmbeddingJob.id == self.job_id,
+                        EmbeddingJob.worker == self.worker,
+                        EmbeddingJob.status == "running",
+                    )
+                    .values(**values)
+                ).rowcount
+                cancel = db.session.execute(
+                    select(EmbeddingJob.cancel_requested).where(EmbeddingJob.id == self.job_id)
+                ).scalar()
+                db.session.commit()
+        except Exception as e:
+            print(f"[EMBED] Could not record progress of job {self.job_id}: {e}")
+            return
+        if changed:
+            self._written = {key: values[key] for key in ("current", "total", "message")}
+            notify_change()
+        if not owned and not self._stop.is_set():
+            print(f"[EMBED] Job {self.job_id} is no longer owned by this worker; stopping")
+        if cancel or not owned:
+            self.cancelled.set()
+
+
+def _plan_job(job: EmbeddingJob) -> None:
+    """
+    Select the files a new job embeds and record them, in order, with the job.
+    An update of an index holding untracked chunks becomes a rebuild, since
+    those chunks would otherwise stay next to the re-embedded files.
+    """
+    if not job.force_all and has_untracked_chunks():
+        print(f"[EMBED] Index has chunks without a file; job {job.id} rebuilds it from all files")
+        job.force_all = True
+    if job.force_all:
+        files = KnowledgeBaseFile.query.order_by(KnowledgeBaseFile.id).all()
+    else:
+        files = get_files_to_embed()
+        _drop_deleted_files()
+    for position, kb_file in enumerate(files):
+        job.files.append(
+            EmbeddingJobFile(kb_file_id=kb_file.id, filename=kb_file.filename, position=position)
+        )
+    job.total = len(files)
+    db.session.commit()
+
+
+def _drop_deleted_files() -> None:
+    """
+    Drop the vectors of files that no longer exist in the knowledge base,
+    and the whole index once no file is left.
+    """
+    known_ids = {f.id for f in KnowledgeBaseFile.query.all()}
+    if not known_ids:
+        delete_index()
+        return
+    orphan_ids = [file_id for file_id in load_file_chunks() if file_id not in known_ids]
+    if orphan_ids:
+        print(f"[EMBED] Removing {len(orphan_ids)} deleted file(s) from the index")
+        delete_file_chunks(orphan_ids)
+
+
+def _file_chunk_stream(
+    specs: List[Tuple[str, str, str]],
+    file_ids: List[int],
+    reporter: _JobReporter,
+    outcomes: Dict[int, Tuple[int, Optional[Exception]]],
+) -> Iterator[Tuple[int, List[Document]]]:
+    """
+    Load and split files in order, yielding (kb_file_id, chunks). Runs in
+    an ingestion thread, so per-file results are collected in outcomes.
+    Files that fail to load are not yielded, so an update leaves their
+    indexed chunks in place.
+    Raises:
+        JobCancelled: Before the next file once cancellation is requested
+    """
+    for index, documents, error in load_files_parallel(specs):
+        reporter.check()
+        if error is not None:
+            print(f"Error loading {specs[index][2]}: {error}")
+            outcomes[file_ids[index]] = (0, error)
+            reporter.file_loaded()
+            continue
+        chunks = split_documents_by_type(documents, chunk_size=2000, chunk_overlap=400)
+        outcomes[file_ids[index]] = (len(chunks), error)
+        reporter.file_loaded()
+        yield file_ids[index], chunks
+
+
+def _split_present(files: List[EmbeddingJobFile], reporter: _JobReporter) -> Tuple[List[EmbeddingJobFile], Dict[int, KnowledgeBaseFile]]:
+    """
+    Look up the knowledge base files of job files; files deleted since the
+    job was planned are marked skipped.
+    """
+    ids = [f.kb_file_id for f in files]
+    kb_files = {f.id: f for f in KnowledgeBaseFile.query.filter(KnowledgeBaseFile.id.in_(ids)).all()}
+    present = []
+    for job_file in files:
+        if job_file.kb_file_id in kb_files:
+            present.append(job_file)
+        else:
+            job_file.status = "skipped"
+            job_file.finished_at = datetime.utcnow()
+            reporter.file_loaded()
+    db.session.commit()
+    if len(present) < len(files):
+        notify_change()
+    return present, kb_files
+
+
+def _embed_files(
+    files: List[EmbeddingJobFile],
+    kb_files: Dict[int, KnowledgeBaseFile],
+    reporter: _JobReporter,
+    rebuild: bool,
+) -> None:
+    """
+    Embed files and publish the index: a full rebuild from these files, or
+    an update replacing only their chunks. Their statuses are recorded once
+    the index is published; files that failed to load are not marked
+    embedded, so they still need embedding afterwards.
+    """
+    # Plain values only: the stream runs in another thread than the session
+    specs = [
+        (kb_files[f.kb_file_id].filepath, kb_files[f.kb_file_id].filetype, kb_files[f.kb_file_id].filename)
+        for f in files
+    ]
+    file_ids = [f.kb_file_id for f in files]
+    outcomes: Dict[int, Tuple[int, Optional[Exception]]] = {}
+    stream = _file_chunk_stream(specs, file_ids, reporter, outcomes)
+    if rebuild:
+        def all_chunks():
+            for file_id, chunks in stream:
+                assign_chunk_ids(file_id, chunks)
+                yield from chunks
+
+        create_vector_store(all_chunks(), progress_callback=reporter.batch_embedded)
+        # The rebuild does not hold the index lock while embedding: drop the
+        # chunks of files deleted meanwhile, which it may have re-published
+        db.session.commit()
+        existing = {
+            row[0] for row in db.session.execute(
+                select(KnowledgeBaseFile.id).where(KnowledgeBaseFile.id.in_(file_ids))
+            )
+        }
+        deleted = [file_id for file_id in file_ids if file_id not in existing]
+        if deleted:
+            delete_file_chunks(deleted)
+    else:
+        upsert_file_chunks(stream, progress_callback=reporter.batch_embedded)
+    mark_files_embedded([
+        kb_files[f.kb_file_id] for f in files
+        if f.kb_file_id in outcomes and outcomes[f.kb_file_id][1] is None
+    ])
+    now = datetime.utcnow()
+    for job_file in files:
+        chunks, error = outcomes.get(job_file.kb_file_id, (0, None))
+        job_file.chunks = chunks
+        job_file.status = "failed" if error is not None else "done"
+        job_file.error = str(error) if error is not None else None
+        job_file.finished_at = now
+    db.session.commit()
+    notify_change()
+
+
+def _finish(job_id: int, status: str, message: str, error: Optional[str] = None) -> None:
+    db.session.rollback()
+    values: Dict[str, Any] = {
+        "status": status,
+        "message": message,
+        "error": error,
+        "finished_at": datetime.utcnow(),
+    }
+    if status == "done":
+        values["current"] = EmbeddingJob.total
+    # A worker that lost the job to another one must not overwrite its state
+    db.session.execute(
+        update(EmbeddingJob)
+        .where(EmbeddingJob.id == job_id, EmbeddingJob.worker == _worker_id())
+        .values(**values)
+    )
+    db.session.commit()
+    notify_change()
+    print(f"[EMBED] Job {job_id} {status}: {message}")
+
+
+def run_job(app: Any, job_id: int) -> None:
+    """
+    Run (or resume) a claimed job until it is done, fails or is cancelled.
+    Must run inside an application context.
+
+    A full rebuild publishes once at the end, so a resumed rebuild starts
+    over (the embedding cache makes already-embedded chunks cheap). An
+    update publishes after every EMBED_CHECKPOINT_FILES files and resumes
+    with the first file not yet done.
+    """
+    job = db.session.get(EmbeddingJob, job_id)
+    reporter = _JobReporter(app, job_id)
+    try:
+        reporter.check()
+        if not job.files:
+            _plan_job(job)
+        pending = [f for f in job.files if f.status == "pending"]
+        reporter.set_counts(current=len(job.files) - len(pending), total=len(job.files))
+        if not job.files:
+            message = "No files need re-embedding."
+        elif job.force_all:
+            reporter.checkpoint("Creating vector store...")
+            present, kb_files = _split_present(pending, reporter)
+            _embed_files(present, kb_files, reporter, rebuild=True)
+            message = "Embedding complete!"
+        else:
+            for start in range(0, len(pending), EMBED_CHECKPOINT_FILES):
+                reporter.check()
+                present, kb_files = _split_present(pending[start:start + EMBED_CHECKPOINT_FILES], reporter)
+                if present:
+                    _embed_files(present, kb_files, reporter, rebuild=False)
+                reporter.checkpoint("Updating vector store...")
+            message = "Embedding complete!"
+        # Files deleted while the job ran
+        _drop_deleted_files()
+        reporter.stop()
+        _finish(job_id, "done", message)
+    except JobCancelled:
+        reporter.stop()
+        _finish(job_id, "cancelled", "Cancelled.")
+    except Exception as e:
+        traceback.print_exc()
+        reporter.stop()
+        _finish(job_id, "failed", "Embedding failed.", error=str(e))
+
+
+def run_worker(app: Any, once: bool = False) -> None:
+    """
+    Run embedding jobs as they are queued, one at a time, until interrupted
+    (or, with once, until no job is left). Only one worker runs per host
+    where file locking is available.
+    """
+    lock_file = _lock_worker_slot()
+    if lock_file is None:
+        print("[EMBED] Another embedding worker is already running on this host")
+        return
+    print(f"[EMBED] Worker {_worker_id()} waiting for jobs")
+    try:
+        while True:
+            with app.app_context():
+                job_id = claim_next_job()
+                if job_id is not None:
+                    print(f"[EMBED] Running job {job_id}")
+                    run_job(app, job_id)
+                    continue
+            if once:
+                return
+            time.sleep(EMBED_WORKER_POLL_INTERVAL)
+    finally:
+        lock_file.close()
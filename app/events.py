@@ -0,0 +1,120 @@
+"""
+Change notifications for the admin dashboard.
+Whatever changes the knowledge base or an embedding job calls
+notify_change(), which touches a stamp file shared by every process
+(the embedding worker included). A ChangeFeed watches the stamp and the
+published index version with a stat() and only recomputes the dashboard
+state when one of them moved, pushing it to the connected server-sent
+event streams. Nothing runs while no dashboard is connected.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .vector_store import INDEX_ROOT, get_index_version
+
+CHANGES_FILE = os.path.join(INDEX_ROOT, ".changes")
+# Seconds between stat() checks while a dashboard is connected
+EVENTS_CHECK_INTERVAL = float(os.getenv("EVENTS_CHECK_INTERVAL", 0.5))
+# Seconds between keep-alive comments (the state is also recomputed then)
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", 15))
+# A stream is closed after this long; EventSource reconnects by itself
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", 300))
+
+
+def notify_change() -> None:
+    """
+    Mark the dashboard state as changed. Cheap, and safe to call from any
+    process or thread.
+    """
+    try:
+        os.makedirs(INDEX_ROOT, exist_ok=True)
+        with open(CHANGES_FILE, "a"):
+            pass
+        os.utime(CHANGES_FILE, None)
+    except OSError as e:
+        print(f"[EVENTS] Could not record change: {e}")
+
+
+def _change_stamp() -> Tuple[Optional[Tuple[int, int]], str]:
+    try:
+        st = os.stat(CHANGES_FILE)
+        changes = (st.st_ino, st.st_mtime_ns)
+    except OSError:
+        changes = None
+    return changes, get_index_version()
+
+
+class ChangeFeed:
+    """
+    Pushes a state dict to any number of event streams. snapshot() is
+    called in an application context, from a single watcher thread per
+    process that only runs while streams are connected; each key of the
+    dict becomes an SSE event type, sent when its value changes.
+    """
+
+    def __init__(self, app: Any, snapshot: Callable[[], Dict[str, Any]]):
+        self.app = app
+        self._snapshot = snapshot
+        self._cond = threading.Condition()
+        self._listeners = 0
+        self._state: Optional[Dict[str, Any]] = None
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def _watch(self) -> None:
+        stamp = None
+        refreshed = 0.0
+        while True:
+            with self._cond:
+                if not self._listeners:
+                    self._thread = None
+                    return
+            current = _change_stamp()
+            now = time.monotonic()
+            if current != stamp or now - refreshed >= EVENTS_KEEPALIVE_SECONDS:
+                stamp, refreshed = current, now
+                try:
+                    with self.app.app_context():
+                        state = self._snapshot()
+                except Exception as e:
+                    print(f"[EVENTS] Could not compute dashboard state: {e}")
+                else:
+                    with self._cond:
+                        if state != self._state:
+                            self._state = state
+                            self._seq += 1
+                            self._cond.notify_all()
+            time.sleep(EVENTS_CHECK_INTERVAL)
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yield server-sent events: the current state first, then every change,
+        with keep-alive comments in between.
+        """
+        with self._cond:
+            self._listeners += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name="dashboard-events", daemon=True)
+                self._thread.start()
+        try:
+            seq = 0
+            sent: Dict[str, Any] = {}
+            deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != seq, timeout=EVENTS_KEEPALIVE_SECONDS)
+                    seq, state = self._seq, self._state or {}
+                changed = [key for key, value in state.items() if sent.get(key) != value]
+                if not changed:
+                    yield ": keep-alive\n\n"
+                    continue
+                for key in changed:
+                    sent[key] = state[key]
+                    yield f"event: {key}\ndata: {json.dumps(state[key], default=str)}\n\n"
+        finally:
+            with self._cond:
+                self._listeners -= 1
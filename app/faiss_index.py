@@ -0,0 +1,210 @@
+"""
+FAISS index construction for the vector store.
+The index type and its parameters come from configuration (FAISS_INDEX_TYPE
+and friends), are trained on a sample of the vectors during the build, and
+are saved next to the index so a loaded index gets the same search settings.
+
+Supported types:
+    flat      exact L2 search (LangChain's default)
+    ivf_flat  inverted lists over full vectors; nprobe trades recall for speed
+    hnsw      graph index; ef_search trades recall for speed
+    ivf_pq    inverted lists over product-quantized vectors (compressed)
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Sequence
+
+import faiss  # type: ignore
+import numpy as np
+
+INDEX_CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# FAISS warns when k-means gets fewer points than this per centroid
+MIN_POINTS_PER_CENTROID = 39
+RECONSTRUCT_BATCH_SIZE = 65536
+
+FLAT_CONFIG: Dict[str, Any] = {"type": "flat"}
+
+
+def index_config_from_env() -> Dict[str, Any]:
+    """
+    Return the index configuration selected by environment variables.
+    Raises:
+        ValueError: For an unknown FAISS_INDEX_TYPE
+    """
+    index_type = os.getenv("FAISS_INDEX_TYPE", "flat").strip().lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE: {index_type}")
+    config: Dict[str, Any] = {"type": index_type}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        config["nlist"] = int(os.getenv("FAISS_NLIST", 1024))
+        config["nprobe"] = int(os.getenv("FAISS_NPROBE", 16))
+    if index_type == "ivf_pq":
+        config["pq_m"] = int(os.getenv("FAISS_PQ_M", 48))
+        config["pq_nbits"] = int(os.getenv("FAISS_PQ_NBITS", 8))
+    if index_type == "hnsw":
+        config["hnsw_m"] = int(os.getenv("FAISS_HNSW_M", 32))
+        config["ef_construction"] = int(os.getenv("FAISS_EF_CONSTRUCTION", 200))
+        config["ef_search"] = int(os.getenv("FAISS_EF_SEARCH", 64))
+    if index_type in ("ivf_flat", "ivf_pq"):
+        config["train_size"] = int(os.getenv("FAISS_TRAIN_SIZE", 50000))
+    return config
+
+
+def train_size(config: Dict[str, Any]) -> int:
+    """
+    Number of vectors to collect before the index can be created.
+    """
+    return config.get("train_size", 1)
+
+
+def _pq_subquantizers(dim: int, pq_m: int) -> int:
+    # The vector dimension must split evenly into pq_m sub-vectors
+    for m in range(min(pq_m, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def create_index(config: Dict[str, Any], sample: np.ndarray) -> Any:
+    """
+    Create (and, if needed, train) an empty index for the sample's dimension.
+    Parameters are scaled down when the sample is too small to train them;
+    ivf_pq falls back to ivf_flat below 2**pq_nbits vectors. The settings
+    actually used are stored back into config.
+
+    Args:
+        config: Index configuration (see index_config_from_env)
+        sample: float32 array of shape (n, dim) to train on
+
+    Returns:
+        faiss.Index: Empty, trained index
+    """
+    n, dim = sample.shape
+    index_type = config["type"]
+    if index_type == "ivf_pq" and n < 2 ** config["pq_nbits"]:
+        print(f"[FAISS] {n} vectors are too few to train PQ; using ivf_flat")
+        index_type = config["type"] = "ivf_flat"
+        config.pop("pq_m", None)
+        config.pop("pq_nbits", None)
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config["hnsw_m"])
+        index.hnsw.efConstruction = config["ef_construction"]
+    else:
+        config["nlist"] = max(1, min(config["nlist"], n // MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, config["nlist"])
+        else:
+            config["pq_m"] = _pq_subquantizers(dim, config["pq_m"])
+            index = faiss.IndexIVFPQ(quantizer, dim, config["nlist"], config["pq_m"], config["pq_nbits"])
+        index.train(sample)
+        print(f"[FAISS] Trained {index_type} index (nlist={config['nlist']}) on {n} vectors")
+    apply_search_params(index, config)
+    return index
+
+
+def apply_search_params(index: Any, config: Dict[str, Any]) -> None:
+    """
+    Set query-time parameters (nprobe, efSearch) on an index. FAISS_NPROBE
+    and FAISS_EF_SEARCH, when set, override the values saved with the index.
+    """
+    if "nprobe" in config:
+        nprobe = int(os.getenv("FAISS_NPROBE", config["nprobe"]))
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    if "ef_search" in config:
+        index.hnsw.efSearch = int(os.getenv("FAISS_EF_SEARCH", config["ef_search"]))
+
+
+def reconstruct_vectors(index: Any, positions: Sequence[int]) -> np.ndarray:
+    """
+    Read back stored vectors by position. Exact for flat, ivf_flat and hnsw;
+    ivf_pq returns the decoded (approximate) vectors.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    out = np.empty((len(positions), index.d), dtype=np.float32)
+    for start in range(0, len(positions), RECONSTRUCT_BATCH_SIZE):
+        keys = np.asarray(positions[start:start + RECONSTRUCT_BATCH_SIZE], dtype=np.int64)
+        out[start:start + len(keys)] = index.reconstruct_batch(keys)
+    return out
+
+
+def remove_positions(index: Any, keep: List[int]) -> None:
+    """
+    Keep only the vectors at the given (sorted) positions, renumbered
+    0..len(keep)-1. Used for index types whose remove_ids does not compact
+    positions (IVF) or is unsupported (HNSW); training is preserved.
+
+    Nothing is re-encoded, so the remaining vectors are stored exactly as
+    before: IVF entries are removed from their lists and their IDs
+    renumbered in place (for ivf_pq, decoding and re-encoding would lose
+    recall on every delete), and HNSW is rebuilt from its full vectors.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        _remove_ivf_positions(index, np.asarray(keep, dtype=np.int64))
+        return
+    vectors = reconstruct_vectors(index, keep)
+    index.reset()
+    if len(vectors):
+        index.add(vectors)
+
+
+def _remove_ivf_positions(index: Any, keep: np.ndarray) -> None:
+    index.set_direct_map_type(faiss.DirectMap.NoMap)
+    drop = np.setdiff1d(np.arange(index.ntotal, dtype=np.int64), keep)
+    if len(drop):
+        index.remove_ids(faiss.IDSelectorBatch(drop))
+    invlists = index.invlists
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        new_ids = np.searchsorted(keep, ids).astype(np.int64)
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes))
+
+
+def read_index(path: str, mmap: bool = False) -> Any:
+    """
+    Read an index file. With mmap, the vectors (flat codes, IVF lists) are
+    memory-mapped read-only where this FAISS build supports it, so processes
+    serving the same file share its pages; otherwise it is read into memory.
+    """
+    if mmap:
+        flags = (
+            faiss.IO_FLAG_MMAP
+            | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+            | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+        )
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            print(f"[FAISS] Memory-mapped read failed ({e}); reading into memory")
+    return faiss.read_index(path)
+
+
+def save_index_config(folder: str, config: Dict[str, Any]) -> None:
+    with open(os.path.join(folder, INDEX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def load_index_config(folder: str) -> Dict[str, Any]:
+    """
+    Return the configuration saved with an index; indexes built before it
+    was recorded are flat.
+    """
+    path = os.path.join(folder, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return dict(FLAT_CONFIG)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading index config: {e}")
+        return dict(FLAT_CONFIG)
+
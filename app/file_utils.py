@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Tuple
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path: str, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """
+    SHA-256 of a file, read in fixed-size blocks so memory use stays constant.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def file_fingerprint(path: str) -> Tuple[int, int, int]:
+    """
+    Cheap change indicator for a file: (size, mtime_ns, inode) from a single stat().
+    Raises:
+        OSError: If the file cannot be stat'ed
+    """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def stream_to_temp_file(stream: BinaryIO, directory: str, block_size: int = HASH_BLOCK_SIZE) -> Tuple[str, str]:
+    """
+    Copy a binary stream to a hidden temporary file in directory, hashing it
+    in the same pass. The temp file lives on the same filesystem as its final
+    destination so it can be moved into place with an atomic rename.
+    Returns:
+        Tuple[str, str]: (temp file path, SHA-256 hex digest)
+    """
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: stream.read(block_size), b""):
+                sha.update(block)
+                out.write(block)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, sha.hexdigest()
+
+
+def move_into_place(tmp_path: str, path: str) -> bool:
+    """
+    Move a finished temp file to path unless path already exists, as one
+    atomic step, so two uploads with the same name cannot both succeed.
+    The temp file is removed either way.
+    Returns:
+        bool: False if path already existed
+    """
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        os.unlink(tmp_path)
+        return False
+    except OSError:
+        # No hard links on this filesystem: claim the name first, then
+        # replace the empty placeholder
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            os.unlink(tmp_path)
+            return False
+        os.close(fd)
+        os.replace(tmp_path, path)
+        return True
+    os.unlink(tmp_path)
+    return True
@@ -0,0 +1,153 @@
+"""
+Streaming ingestion stages: chunks -> fixed-size batches -> embeddings.
+Each stage is a generator and stages are connected through small bounded
+queues, so a stage runs ahead of the next by at most a few batches and
+memory use does not grow with the size of the corpus.
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .langchain_compat import Document
+
+# Chunks embedded and added to the index per batch
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+# Batches buffered between two stages before the producer blocks
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", 2))
+# Batches being embedded at the same time, so the embedding pool does not
+# drain while the last requests of one batch finish
+INGEST_EMBED_WINDOW = int(os.getenv("INGEST_EMBED_WINDOW", 2))
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(items: Iterable[Any], depth: int = INGEST_QUEUE_DEPTH) -> Iterator[Any]:
+    """
+    Run an iterator in a background thread, at most depth items ahead of
+    the consumer. Exceptions raised by the producer are re-raised to the
+    consumer; closing the consumer stops the producer.
+    """
+    buffer: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name="ingest-stage", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(chunks: Iterable[Document], batch_size: int = INGEST_BATCH_SIZE) -> Iterator[List[Document]]:
+    """
+    Group a stream of chunks into lists of at most batch_size.
+    """
+    batch: List[Document] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(
+    batches: Iterable[List[Document]],
+    embeddings: Any,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    window: int = INGEST_EMBED_WINDOW,
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Embed each batch of chunks, yielding (chunks, vectors) pairs in input
+    order. Up to window batches are embedded concurrently, so the next
+    batch's requests start while the previous one is still finishing.
+    progress_callback is called as (completed_batches, embedded_chunks).
+    """
+    window = max(1, window)
+    executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="ingest-embed")
+    pending: "deque[Tuple[List[Document], Any]]" = deque()
+    completed = 0
+    embedded = 0
+
+    def embed(batch: List[Document]) -> List[List[float]]:
+        return embeddings.embed_documents([chunk.page_content for chunk in batch])
+
+    def next_result() -> Tuple[List[Document], List[List[float]]]:
+        nonlocal completed, embedded
+        batch, future = pending.popleft()
+        vectors = future.result()
+        completed += 1
+        embedded += len(batch)
+        if progress_callback:
+            progress_callback(completed, embedded)
+        return batch, vectors
+
+    try:
+        for batch in batches:
+            pending.append((batch, executor.submit(embed, batch)))
+            if len(pending) >= window:
+                yield next_result()
+        while pending:
+            yield next_result()
+    finally:
+        # On failure or when the consumer stops, don't start queued batches
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def stream_embedded_chunks(
+    chunks: Iterable[Document],
+    embeddings: Any,
+    batch_size: int = INGEST_BATCH_SIZE,
+    depth: int = INGEST_QUEUE_DEPTH,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Turn a stream of chunks into a stream of embedded batches.
+    Loading and splitting run ahead of embedding, and embedding runs ahead
+    of the consumer (adding to the index), each by at most depth batches;
+    INGEST_EMBED_WINDOW batches are embedded at a time.
+    """
+    loaded = prefetch(batched(chunks, batch_size), depth)
+    return prefetch(embed_batches(loaded, embeddings, progress_callback), depth)
@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import re
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Query terms that carry no meaning for keyword matching (Indonesian and
+# English); they occur in nearly every chunk and are not scored
+STOPWORDS = frozenset("""
+    ada adalah agar akan apa apakah atau bagaimana bagi bahwa beberapa
+    berapa bisa dalam dan dari dengan di dimana hal harus ini itu jika
+    juga kami kapan karena ke kepada mana mau oleh pada para saat saja
+    sebagai secara sedang sudah tentang tersebut untuk yaitu yang
+    a an and are as at be by can do does for from how i in is it of on
+    or the this to what when where which who with you
+""".split())
+# Terms found in more than this fraction of chunks are skipped when the
+# query has rarer terms: their IDF is near zero but their postings are long
+KEYWORD_MAX_DF = float(os.getenv("KEYWORD_MAX_DF", 0.5))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens (same word rule as the old keyword search).
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def query_terms(query: str, dfs: Dict[str, int], n_docs: int) -> List[str]:
+    """
+    Pick the query terms worth scoring, given the document frequency of
+    every indexed term in dfs: stopwords are ignored, and terms in more than
+    KEYWORD_MAX_DF of the documents only count when the query has no rarer
+    term.
+    """
+    terms = [term for term in set(tokenize(query)) if term not in STOPWORDS and term in dfs]
+    max_df = max(1, int(KEYWORD_MAX_DF * n_docs))
+    selected = [term for term in terms if dfs[term] <= max_df]
+    if not selected and terms:
+        selected = [min(terms, key=lambda term: dfs[term])]
+    return selected
+
+
+def bm25_term_scores(
+    postings: Iterable[Tuple[str, int, int]],
+    df: int,
+    n_docs: int,
+    avg_length: float,
+    scores: Dict[str, float],
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> None:
+    """
+    Add one term's BM25 contribution to scores, from its (doc_id, term
+    frequency, document length) postings.
+    """
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    for doc_id, tf, length in postings:
+        norm = k1 * (1 - b + b * length / avg_length)
+        scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+
+class BM25Index:
+    """
+    Inverted index with term frequencies and Okapi BM25 scoring.
+    Documents are keyed by their docstore ID so results can be resolved
+    against the FAISS docstore. Supports incremental add/remove.
+    Term frequencies are only kept in the postings.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        """
+        Index a document, replacing any previous version with the same ID.
+        """
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        terms: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            terms[token] = terms.get(token, 0) + 1
+        self._add_terms(doc_id, terms, len(tokens))
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int], length: int) -> None:
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        """
+        Remove a document from the index. Unknown IDs are ignored.
+        """
+        self.remove_many([doc_id])
+
+    def remove_many(self, doc_ids: Iterable[str]) -> None:
+        """
+        Remove documents from the index in a single pass over the postings.
+        Unknown IDs are ignored.
+        """
+        drop = {doc_id for doc_id in doc_ids if doc_id in self.doc_lengths}
+        if not drop:
+            return
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for doc_id in posting.keys() & drop:
+                del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+        for doc_id in drop:
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Score documents against the query with BM25.
+        Only the posting lists of the query terms are visited; stopwords
+        are ignored, and terms in more than KEYWORD_MAX_DF of the documents
+        are only scored when the query has no rarer term.
+        Returns:
+            List[Tuple[str, float]]: (doc_id, score) pairs, best first
+        """
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        dfs = {
+            term: len(self.postings[term])
+            for term in set(tokenize(query)) if term in self.postings
+        }
+        avg_length = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in query_terms(query, dfs, n_docs):
+            postings = (
+                (doc_id, tf, self.doc_lengths[doc_id])
+                for doc_id, tf in self.postings[term].items()
+            )
+            bm25_term_scores(postings, dfs[term], n_docs, avg_length, scores, self.k1, self.b)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    @classmethod
+    def from_documents(cls, items: Iterable[Tuple[str, str]]) -> "BM25Index":
+        """
+        Build an index from (doc_id, text) pairs.
+        """
+        index = cls()
+        for doc_id, text in items:
+            index.add(doc_id, text)
+        return index
+
+    def save(self, path: str) -> None:
+        """
+        Persist the index as JSON.
+        """
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Load an index saved with save(), or in the older per-document
+        format. Returns None if missing or unreadable.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+            if "postings" in data:
+                index.postings = data["postings"]
+                index.doc_lengths = data["lengths"]
+                index.total_length = sum(index.doc_lengths.values())
+                return index
+            for doc_id, (length, terms) in data["docs"].items():
+                index._add_terms(doc_id, terms, length)
+            return index
+        except Exception as e:
+            print(f"[BM25] Error loading keyword index: {e}")
+            return None
+
+
+class StoredBM25Index:
+    """
+    Read-only BM25 search over the postings kept in a ChunkStore. Nothing
+    is loaded up front: each query reads the document frequencies of its
+    terms and the posting lists of the ones it scores, so load time and
+    memory do not grow with the corpus.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self) -> int:
+        return self.store.keyword_totals()[0]
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Score documents against the query with BM25, like BM25Index.search.
+        Returns:
+            List[Tuple[str, float]]: (doc_id, score) pairs, best first
+        """
+        n_docs, total_length = self.store.keyword_totals()
+        if n_docs == 0:
+            return []
+        dfs = self.store.term_dfs(sorted(set(tokenize(query)) - STOPWORDS))
+        avg_length = total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in query_terms(query, dfs, n_docs):
+            bm25_term_scores(self.store.postings(term), dfs[term], n_docs, avg_length, scores)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -3,7 +3,12 @@ LangChain compatibility layer for imports across different versions.
 Handles differences between LangChain 0.1.x and 0.2+ / 1.0+
 """
 
-from typing import Callable, Any
+import time
+from typing import Callable, Any, Dict, Set
+from uuid import UUID
+
+from .metrics import ERRORS, observe_stage
+from .tracing import annotate, span, start_span
 
 # Document import (moved to langchain_core in newer versions)
 try:
@@ -42,6 +47,91 @@ except ImportError:
             "Cannot import ChatPromptTemplate. Install: pip install langchain-core"
         ) from e
 
+# Callback handler base class (moved to langchain_core in newer versions)
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:
+    try:
+        from langchain.callbacks.base import BaseCallbackHandler
+    except ImportError as e:
+        raise ImportError(
+            "Cannot import BaseCallbackHandler. Install: pip install langchain-core"
+        ) from e
+
+
+def _usage_attrs(response: Any) -> Dict[str, Any]:
+    # Output size and token usage of an LLMResult, where the model reports it
+    attrs: Dict[str, Any] = {}
+    try:
+        generation = response.generations[0][0]
+        attrs["output_chars"] = len(generation.text)
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            attrs["input_tokens"] = usage.get("input_tokens")
+            attrs["output_tokens"] = usage.get("output_tokens")
+    except (AttributeError, IndexError, TypeError):
+        pass
+    return attrs
+
+
+class LLMTimingHandler(BaseCallbackHandler):
+    """
+    Records the latency of LLM calls (and the time to the first token when
+    streaming) in app.metrics, and as an "llm" span of the current trace.
+    One instance serves concurrent calls: state is keyed by run ID.
+    """
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+        self._streaming: Set[UUID] = set()
+        self._spans: Dict[UUID, Any] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+        self._spans[run_id] = start_span("llm", prompt_chars=sum(len(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+        prompt_chars = sum(
+            len(message.content) if isinstance(message.content, str) else 0
+            for batch in messages for message in batch
+        )
+        self._spans[run_id] = start_span("llm", prompt_chars=prompt_chars)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._streaming:
+            return
+        start = self._started.get(run_id)
+        if start is not None:
+            self._streaming.add(run_id)
+            first_token = time.perf_counter() - start
+            observe_stage("llm_first_token", first_token)
+            llm_span = self._spans.get(run_id)
+            if llm_span is not None:
+                llm_span.set(first_token_ms=round(first_token * 1000, 2))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+        if start is not None:
+            observe_stage("llm", time.perf_counter() - start)
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.set(**_usage_attrs(response))
+            llm_span.finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        self._streaming.discard(run_id)
+        ERRORS.inc("llm")
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.set(error=repr(error))
+            llm_span.finish()
+
+
+llm_timing_handler = LLMTimingHandler()
+
 # Chains imports (restructured in newer versions)
 # In LangChain 1.0+, chains are built via composition using Runnable
 def create_stuff_documents_chain(
@@ -50,13 +140,21 @@ def create_stuff_documents_chain(
     """
     Create a chain that stuff documents into a prompt and call the LLM.
     Works with LangChain 1.0+ using Runnable composition.
+    The chain returns the answer text from invoke() and yields answer text
+    chunks from stream() as the LLM produces them.
     Note: Modern LangChain uses direct composition instead of legacy chains.
     """
     # Use manual chain composition (standard approach in LangChain 1.0+)
     from langchain_core.runnables import RunnableLambda
+    from langchain_core.output_parsers import StrOutputParser
     
-    def format_and_invoke(input_data):
-        """Format documents and invoke LLM through prompt."""
+    def format_prompt(input_data):
+        """Format documents into the prompt."""
+        with span("prompt_assembly"):
+            return _format_prompt(input_data)
+
+    def _format_prompt(input_data):
+        start = time.perf_counter()
         # Extract documents from input
         docs = input_data.get(document_variable_name, [])
         query = input_data.get("input", "")
@@ -79,17 +177,15 @@ def create_stuff_documents_chain(
             "input": query
         }
         
-        # Format and invoke
-        prompt_msg = prompt.format_prompt(**prompt_input)
-        response = llm.invoke(prompt_msg)
-        
-        # Extract text from response
-        if hasattr(response, 'content'):
-            return response.content
-        return str(response)
+        formatted = prompt.format_prompt(**prompt_input)
+        observe_stage("prompt_assembly", time.perf_counter() - start)
+        annotate(documents=len(docs), prompt_chars=len(formatted.to_string()))
+        return formatted
     
-    # Build and return the chain
-    chain = RunnableLambda(format_and_invoke)
+    # Build and return the chain: prompt -> LLM -> answer text; the LLM
+    # call is timed through a callback so streamed calls are measured too
+    timed_llm = llm.with_config(callbacks=[llm_timing_handler])
+    chain = RunnableLambda(format_prompt) | timed_llm | StrOutputParser()
     return chain
 
 def create_retrieval_chain(
@@ -0,0 +1,221 @@
+"""
+Document loading for knowledge base files (PDF, TXT, CSV).
+Shared by the embedding job, ingest.py and the chunking preview so every
+entry point produces the same Documents for the same file.
+"""
+
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd  # type: ignore
+from langchain_community.document_loaders import PyMuPDFLoader
+from .langchain_compat import Document
+
+SUPPORTED_FILE_TYPES = ("pdf", "txt", "csv")
+# Parser processes for bulk loading; 0 means one per CPU core
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+
+
+def load_pdf(path: str) -> List[Document]:
+    """
+    Load a PDF as one Document per page.
+    """
+    docs = PyMuPDFLoader(path).load()
+    for d in docs:
+        d.metadata["file_type"] = "pdf"
+    return docs
+
+
+def txt_document(text: str, source: str) -> Document:
+    """
+    Wrap plain text as a single TXT Document.
+    """
+    return Document(page_content=text, metadata={"source": source, "file_type": "txt"})
+
+
+def load_txt(path: str, source: str) -> List[Document]:
+    """
+    Load a UTF-8 text file as a single Document.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [txt_document(f.read(), source)]
+
+
+def csv_rows_to_documents(df: pd.DataFrame, source: str) -> List[Document]:
+    """
+    Convert DataFrame rows to "column: value" Documents, one per non-empty row.
+    Works column by column instead of row by row. Values are rendered from
+    the same interleaved array df.iterrows() walks, so the text is identical
+    to joining f"{column}: {value}\\n" over each row's non-null values.
+    """
+    if df.empty:
+        return []
+    values = df.to_numpy()
+    if values.dtype != object:
+        values = values.astype(object)
+    texts: Optional[pd.Series] = None
+    for j, column in enumerate(df.columns):
+        col = pd.Series(values[:, j], dtype=object)
+        mask = col.notna()
+        piece = pd.Series("", index=col.index, dtype=object)
+        piece[mask] = f"{column}: " + col[mask].map(str) + "\n"
+        texts = piece if texts is None else texts + piece
+    texts = texts.str.strip()
+    documents = []
+    for index, text in zip(df.index, texts):
+        if text:
+            metadata = {
+                "source": source,
+                "row": int(str(index)) + 1,
+                "file_type": "csv",
+            }
+            documents.append(Document(page_content=text, metadata=metadata))
+    return documents
+
+
+def _is_line_quoted(df: pd.DataFrame) -> bool:
+    # Files where every line is wrapped in quotes parse as a single column
+    # whose name still contains the field separators
+    return len(df.columns) == 1 and "," in str(df.columns[0])
+
+
+def _read_line_quoted_csv(source: Union[str, Any]) -> pd.DataFrame:
+    """
+    Read a CSV whose lines are each wrapped in an extra pair of quotes
+    (e.g. "a,b,c"), streaming it line by line through the csv module.
+    """
+    if isinstance(source, str):
+        f = open(source, "r", encoding="utf-8")
+    else:
+        buffer = getattr(source, "stream", source)
+        buffer.seek(0)
+        f = io.TextIOWrapper(buffer, encoding="utf-8")
+    try:
+        def unwrap(lines):
+            for line in lines:
+                line = line.strip()
+                if line.startswith('"') and line.endswith('"'):
+                    line = line[1:-1]
+                yield line
+        rows = [row for row in csv.reader(unwrap(f)) if row]
+    finally:
+        if isinstance(source, str):
+            f.close()
+        else:
+            f.detach()
+    if not rows:
+        return pd.DataFrame()
+    headers = [h.strip() for h in rows[0]]
+    records = [
+        [value.strip().strip('"') or None for value in row[:len(headers)]]
+        + [None] * (len(headers) - len(row))
+        for row in rows[1:]
+    ]
+    return pd.DataFrame(records, columns=headers, dtype=object)
+
+
+def load_csv(path_or_buffer: Union[str, Any], source: str, nrows: Optional[int] = None) -> List[Document]:
+    """
+    Load a CSV file (path or binary file object) as one Document per row.
+    """
+    df = pd.read_csv(path_or_buffer, nrows=nrows)
+    if _is_line_quoted(df):
+        df = _read_line_quoted_csv(path_or_buffer)
+        if nrows is not None:
+            df = df.head(nrows)
+    return csv_rows_to_documents(df, source)
+
+
+def load_file(path: str, filetype: str, source: str) -> List[Document]:
+    """
+    Load a knowledge base file of the given type ("pdf", "txt" or "csv").
+    Raises:
+        ValueError: For unsupported file types
+    """
+    if filetype == "pdf":
+        return load_pdf(path)
+    if filetype == "txt":
+        return load_txt(path, source)
+    if filetype == "csv":
+        return load_csv(path, source)
+    raise ValueError(f"Unsupported file type: {filetype}")
+
+
+def load_kb_file(kb_file: Any) -> List[Document]:
+    """
+    Load a KnowledgeBaseFile record's file.
+    """
+    return load_file(kb_file.filepath, kb_file.filetype, kb_file.filename)
+
+
+def _load_file_task(spec: Tuple[str, str, str]) -> List[Document]:
+    path, filetype, source = spec
+    return load_file(path, filetype, source)
+
+
+def load_files_parallel(
+    specs: Sequence[Tuple[str, str, str]], max_workers: Optional[int] = None
+) -> Iterator[Tuple[int, List[Document], Optional[BaseException]]]:
+    """
+    Load many files across a process pool, so PDF text extraction uses
+    every core instead of one.
+    Args:
+        specs: (path, filetype, source) per file, as taken by load_file
+        max_workers: Parser processes (default: INGEST_WORKERS)
+    Yields:
+        (index into specs, documents, error) in input order. A file that
+        fails to load, or crashes its worker process, yields no documents
+        and the error; the remaining files are unaffected.
+    """
+    specs = list(specs)
+    workers = min(max_workers or INGEST_WORKERS, len(specs))
+    if workers <= 1:
+        for index, spec in enumerate(specs):
+            try:
+                yield index, _load_file_task(spec), None
+            except Exception as e:
+                yield index, [], e
+        return
+    # Keep a bounded number of files in flight so parsed documents never
+    # pile up far ahead of the consumer
+    window = workers * 2
+    todo: Deque[int] = deque(range(len(specs)))
+    pending: Deque[Tuple[int, Future]] = deque()
+    # Files that were in flight when a worker died; each is retried alone
+    # so the one that kills the pool can be identified
+    suspects: Set[int] = set()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while todo or pending:
+            while todo and len(pending) < window:
+                if pending and (todo[0] in suspects or pending[-1][0] in suspects):
+                    break
+                index = todo.popleft()
+                pending.append((index, executor.submit(_load_file_task, specs[index])))
+            index, future = pending.popleft()
+            try:
+                documents = future.result()
+            except BrokenProcessPool as e:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                if index in suspects:
+                    suspects.discard(index)
+                    yield index, [], e
+                    continue
+                retry = [index] + [i for i, _ in pending]
+                pending.clear()
+                suspects.update(retry)
+                todo.extendleft(reversed(retry))
+                continue
+            except Exception as e:
+                yield index, [], e
+                continue
+            suspects.discard(index)
+            yield index, documents, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,8 @@
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 from flask_sqlalchemy import SQLAlchemy
@@ -7,12 +11,27 @@ from datetime import datetime
 from flask_login import UserMixin
 from nomic import embed
 from langchain_core.embeddings import Embeddings
+from .cache import TTLCache
+from .metrics import ERRORS, observe_stage
+from .tracing import span
 
 # Load environment variables
 load_dotenv()
 
 db = SQLAlchemy()
 
+# Recent query embeddings, keyed by (model, normalized query text)
+query_embedding_cache = TTLCache(
+    max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048)),
+    ttl=float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 3600)),
+)
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a user query for cache lookups: lowercase, collapsed whitespace.
+    """
+    return " ".join(text.lower().split())
+
 class AdminUser(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -32,34 +51,231 @@ class KnowledgeBaseFile(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     embedded_at = db.Column(db.DateTime, nullable=True)  # Tracks when file was last embedded
     filehash = db.Column(db.String(64), nullable=False)
+    # Stat fingerprint of the content that filehash was computed from;
+    # the file is only re-hashed when this changes
+    file_size = db.Column(db.BigInteger, nullable=True)
+    file_mtime_ns = db.Column(db.BigInteger, nullable=True)
+    file_inode = db.Column(db.BigInteger, nullable=True)
+
+    @property
+    def fingerprint(self):
+        return (self.file_size, self.file_mtime_ns, self.file_inode)
+
+    def set_fingerprint(self, fingerprint):
+        self.file_size, self.file_mtime_ns, self.file_inode = fingerprint
+
+class EmbeddingJob(db.Model):
+    """
+    An embedding run, queued by the admin dashboard and executed by the
+    embedding worker process (see app.embedding_jobs).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # queued -> running -> done | failed | cancelled
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    force_all = db.Column(db.Boolean, nullable=False, default=False)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Written every few seconds by the worker running the job; a running job
+    # whose heartbeat stops is picked up again by the next worker
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    worker = db.Column(db.String(255), nullable=True)  # "hostname:pid"
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    current = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    files = db.relationship(
+        "EmbeddingJobFile",
+        backref="job",
+        order_by="EmbeddingJobFile.position",
+        cascade="all, delete-orphan",
+    )
+
+class EmbeddingJobFile(db.Model):
+    """
+    A knowledge base file selected for an embedding job, with its own status
+    so an interrupted job resumes after the last completed file.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey("embedding_job.id"), nullable=False, index=True)
+    # Not a foreign key: the file may be deleted while the job is queued
+    kb_file_id = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    # pending -> done | failed | skipped
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    chunks = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+def ensure_schema():
+    """
+    Create tables and add columns introduced after a database was created
+    (SQLite-friendly, nullable columns only). Must run inside an
+    application context.
+    """
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    for model in (EmbeddingJob, EmbeddingJobFile):
+        if not inspector.has_table(model.__table__.name):
+            model.__table__.create(db.engine)
+            print(f"[DB] Created table {model.__table__.name}")
+    for model in (KnowledgeBaseFile,):
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            print(f"[DB] Added column {table.name}.{column.name}")
+
+def embed_in_batches(
+    texts: List[str],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    batch_size: int = 64,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> List[List[float]]:
+    """
+    Embed texts in batches with a bounded pool of concurrent requests.
+    Each batch is retried with exponential backoff; results are returned in
+    input order.
+    
+    Args:
+        texts: Texts to embed
+        embed_fn: Backend call embedding one batch of texts
+        batch_size: Number of texts per request
+        max_workers: Maximum number of batches in flight
+        max_retries: Retries per batch before the whole job fails
+        backoff: Base delay in seconds, doubled after every failed attempt
+        progress_callback: Called as (completed_batches, total_batches)
+        
+    Returns:
+        List[List[float]]: One embedding per input text
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return []
+
+    def run_batch(batch_no: int, batch: List[str]) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            try:
+                vectors = embed_fn(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(
+                        f"expected {len(batch)} embeddings, got {len(vectors)}"
+                    )
+                return vectors
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = backoff * (2 ** attempt) * (0.5 + random.random())
+                print(f"[EMBED] Batch {batch_no + 1} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    results: List[Optional[List[List[float]]]] = [None] * len(batches)
+    completed = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches))))
+    futures = {
+        executor.submit(run_batch, batch_no, batch): batch_no
+        for batch_no, batch in enumerate(batches)
+    }
+    try:
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, len(batches))
+    except Exception:
+        # Don't start the remaining batches once one has failed for good
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    return [vector for batch_vectors in results for vector in batch_vectors or []]
 
 class NomicAtlasEmbeddings(Embeddings):
     """
     Embedding model using Nomic Atlas API.
     Implements the LangChain Embeddings interface.
+    Document embeddings are looked up in an optional persistent cache first;
+    only cache misses are sent to the API, in concurrent retrying batches.
     """
-    def __init__(self, api_key=None, model="nomic-embed-text-v1.5"):
+    def __init__(self, api_key=None, model="nomic-embed-text-v1.5", cache=None,
+                 batch_size=None, max_workers=None, max_retries=None):
         import os
         self.api_key = api_key or os.getenv("NOMIC_API_KEY")
         if not self.api_key:
             raise ValueError("NOMIC_API_KEY environment variable is required for Nomic Atlas embeddings. Please add it to your .env and run 'nomic login <api-key>' in your terminal.")
         self.model = model
+        self.cache = cache
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+        self.max_workers = max_workers or int(os.getenv("EMBEDDING_MAX_WORKERS", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("EMBEDDING_MAX_RETRIES", 3))
 
-    def embed_documents(self, texts):
-        # Returns a list of embeddings for a list of texts
+    def _embed_texts(self, texts):
+        # Sends texts to the Nomic API and returns their embeddings
         result = embed.text(
             texts=texts,
             model=self.model
         )
         return result["embeddings"]
 
-    def embed_query(self, text):
-        # Returns a single embedding for a query string
-        result = embed.text(
-            texts=[text],
-            model=self.model
+    def _embed_batched(self, texts):
+        return embed_in_batches(
+            texts,
+            self._embed_texts,
+            batch_size=self.batch_size,
+            max_workers=self.max_workers,
+            max_retries=self.max_retries,
         )
-        return result["embeddings"][0]
+
+    def embed_documents(self, texts):
+        # Returns a list of embeddings for a list of texts
+        if self.cache is None:
+            return self._embed_batched(texts)
+        embeddings = self.cache.get_many(self.model, texts)
+        missing = [i for i in range(len(texts)) if i not in embeddings]
+        if missing:
+            # Embed each distinct missing text once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = self._embed_batched(unique_texts)
+            self.cache.put_many(self.model, unique_texts, vectors)
+            by_text = dict(zip(unique_texts, vectors))
+            for i in missing:
+                embeddings[i] = by_text[texts[i]]
+        return [embeddings[i] for i in range(len(texts))]
+
+    def embed_query(self, text):
+        # Returns a single embedding for a query string, reusing recent ones
+        key = (self.model, normalize_query(text))
+        cached = query_embedding_cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        try:
+            with span("query_embed", model=self.model):
+                result = embed.text(
+                    texts=[text],
+                    model=self.model
+                )
+        except Exception:
+            ERRORS.inc("query_embed")
+            raise
+        observe_stage("query_embed", time.perf_counter() - start)
+        vector = result["embeddings"][0]
+        query_embedding_cache.set(key, vector)
+        return vector
 
 def load_llm():
     """
@@ -84,4 +300,5 @@ def load_embedding_model():
     Returns:
         NomicAtlasEmbeddings: Configured embedding model instance
     """
-    return NomicAtlasEmbeddings() 
\ No newline at end of file
+    from .embedding_cache import get_embedding_cache
+    return NomicAtlasEmbeddings(cache=get_embedding_cache()) 
\ No newline at end of file
@@ -0,0 +1,76 @@
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from .cache import TTLCache
+from .langchain_compat import Document
+
+
+def chunk_id_of(doc: Document) -> Optional[str]:
+    """
+    Return the docstore ID of a retrieved chunk, if it carries one.
+    """
+    metadata = getattr(doc, "metadata", None) or {}
+    return metadata.get("chunk_id") or getattr(doc, "id", None)
+
+
+class SessionStore:
+    """
+    Bounded per-user conversation context for follow-up questions.
+    Keeps only the chunk IDs and question of each user's last turn, with
+    LRU eviction beyond max_entries and a per-entry TTL. Documents are
+    rehydrated from the vector store's docstore when a follow-up arrives.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600):
+        self._contexts = TTLCache(max_entries=max_entries, ttl=ttl)
+
+    def set_context(self, user_id: str, docs: List[Document], question: str) -> None:
+        """
+        Remember the chunks used to answer a user's question.
+        """
+        chunk_ids = tuple(
+            chunk_id for chunk_id in (chunk_id_of(doc) for doc in docs) if chunk_id
+        )
+        self._contexts.set(user_id, (chunk_ids, question))
+
+    def set_chunk_ids(self, user_id: str, chunk_ids: Tuple[str, ...], question: str) -> None:
+        """
+        Remember already-resolved chunk IDs for a user's question.
+        """
+        self._contexts.set(user_id, (tuple(chunk_ids), question))
+
+    def has_context(self, user_id: str) -> bool:
+        return self._contexts.get(user_id) is not None
+
+    def get_context(self, user_id: str, vector_store: Any) -> Optional[Tuple[List[Document], str]]:
+        """
+        Return (documents, question) for the user's last turn, or None.
+        Chunks that no longer exist in the index are skipped.
+        """
+        entry = self._contexts.get(user_id)
+        if entry is None:
+            return None
+        chunk_ids, question = entry
+        docs = []
+        for chunk_id in chunk_ids:
+            doc = vector_store.docstore.search(chunk_id)
+            if hasattr(doc, "page_content"):
+                docs.append(doc)
+        return docs, question
+
+    def clear(self) -> None:
+        self._contexts.clear()
+
+    def stats(self, approx_size: bool = True) -> Dict[str, Any]:
+        """
+        Return cache statistics plus an estimate of the memory held by
+        entries, which walks every entry unless approx_size is False.
+        """
+        stats = self._contexts.stats()
+        if not approx_size:
+            return stats
+        size = 0
+        for user_id, (chunk_ids, question) in self._contexts.items():
+            size += sys.getsizeof(user_id) + sys.getsizeof(question) + sys.getsizeof(chunk_ids)
+            size += sum(sys.getsizeof(chunk_id) for chunk_id in chunk_ids)
+        stats["approx_bytes"] = size
+        return stats
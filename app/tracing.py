@@ -0,0 +1,247 @@
+"""
+Request-scoped tracing for the chat pipeline.
+A trace is opened per chat request under its request ID and kept in a
+context variable, so get_response, hybrid_retrieve, the Jina rerank call
+and the LLM call record spans without passing anything around. Every
+finished span is logged as one JSON line; on request, the span tree is
+returned to the client as well.
+
+Outside a trace (ingestion, evaluation scripts) span() costs a context
+variable lookup and records nothing.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+# Log finished spans and events as JSON lines on stdout
+TRACE_LOG = os.getenv("TRACE_LOG", "true").lower() == "true"
+# Let any client ask for the span tree (otherwise only logged-in admins)
+TRACE_DEBUG = os.getenv("TRACE_DEBUG", "false").lower() == "true"
+
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+logger = logging.getLogger("chatbot.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+
+
+def _emit(record: Dict[str, Any]) -> None:
+    if TRACE_LOG:
+        logger.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+class Span:
+    """
+    A timed step of a trace, with attributes (chunk IDs, sizes, outcome).
+    """
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.parent = parent
+        self.span_id = trace._next_span_id()
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def finish(self) -> None:
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        _emit({
+            "ts": datetime.utcnow().isoformat() + "Z",
+            "event": "span",
+            "request_id": self.trace.request_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.start) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            **self.attrs,
+        })
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.trace._lock:
+            children = list(self.children)
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.start) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            "attrs": dict(self.attrs),
+            "children": [child.to_dict() for child in children],
+        }
+
+
+class _NoopSpan:
+    name = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    The spans of one request. Spans may be added from several threads.
+    """
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._span_ids = 0
+        self.root = Span(self, name, None, {})
+
+    def _next_span_id(self) -> int:
+        with self._lock:
+            self._span_ids += 1
+            return self._span_ids
+
+    def _add(self, name: str, parent: Optional[Span], attrs: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent or self.root, attrs)
+        with self._lock:
+            span.parent.children.append(span)
+        return span
+
+    def tree(self) -> Dict[str, Any]:
+        """
+        Return the span tree with the request ID, for debug responses.
+        """
+        return {"request_id": self.request_id, **self.root.to_dict()}
+
+    def server_timing(self) -> str:
+        """
+        Return a Server-Timing header value: total time per span name.
+        """
+        totals: Dict[str, float] = {}
+        pending = [self.root]
+        while pending:
+            span = pending.pop()
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+            with self._lock:
+                pending.extend(span.children)
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in totals.items())
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """
+    Use the client's X-Request-ID if it is a sane token, else make one.
+    """
+    if incoming and _REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def trace(request_id: str, name: str = "request") -> Iterator[Trace]:
+    """
+    Open a trace for the duration of a with-block; its root span is the
+    current span inside it.
+    """
+    current = Trace(request_id, name)
+    previous_trace, previous_span = _current_trace.get(), _current_span.get()
+    _current_trace.set(current)
+    _current_span.set(current.root)
+    try:
+        yield current
+    except BaseException as e:
+        current.root.set(error=repr(e))
+        raise
+    finally:
+        current.root.finish()
+        # set() rather than reset(): a streamed response may be finished in
+        # a different context than the one it was started in
+        _current_trace.set(previous_trace)
+        _current_span.set(previous_span)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """
+    Record a child span of the current span around a with-block. Yields the
+    span (use .set() to add attributes), or a no-op outside a trace.
+    """
+    current = _current_trace.get()
+    if current is None:
+        yield NOOP_SPAN
+        return
+    parent = _current_span.get()
+    child = current._add(name, parent, attrs)
+    _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.set(error=repr(e))
+        raise
+    finally:
+        _current_span.set(parent)
+        child.finish()
+
+
+def start_span(name: str, **attrs: Any) -> Any:
+    """
+    Start a child span of the current span that is finished explicitly
+    (for callbacks, where a with-block does not fit). It does not become
+    the current span.
+    """
+    current = _current_trace.get()
+    if current is None:
+        return NOOP_SPAN
+    return current._add(name, _current_span.get(), attrs)
+
+
+def annotate(**attrs: Any) -> None:
+    """
+    Add attributes to the current span (no-op outside a trace).
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def current_request_id() -> Optional[str]:
+    current = _current_trace.get()
+    return current.request_id if current else None
+
+
+def log_event(event: str, **fields: Any) -> None:
+    """
+    Log a structured event, tagged with the current request ID.
+    """
+    _emit({
+        "ts": datetime.utcnow().isoformat() + "Z",
+        "event": event,
+        "request_id": current_request_id(),
+        **fields,
+    })
@@ -1,101 +1,741 @@
 import os
+import contextvars
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import numpy as np
 from .models import load_embedding_model
 from .langchain_compat import Document
-from typing import List
-import re
+from .keyword_index import BM25Index, StoredBM25Index
+from .ingestion import INGEST_BATCH_SIZE, stream_embedded_chunks
+from .faiss_index import (
+    FLAT_CONFIG,
+    apply_search_params,
+    create_index,
+    index_config_from_env,
+    load_index_config,
+    read_index,
+    reconstruct_vectors,
+    remove_positions,
+    save_index_config,
+    train_size,
+)
+from .chunk_store import CHUNK_STORE_FILE, ChunkStore
+import faiss  # type: ignore
+from .cache import TTLCache
+from .metrics import ERRORS, observe_stage
+from .tracing import annotate, log_event, span
+from typing import Dict, List, Optional, Tuple
 import requests
+import requests.adapters
+import hashlib
+import uuid
 import html
 
-def create_vector_store(chunks):
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_ROOT = "vector_db"
+# Every build is written to its own directory under VERSIONS_PATH and
+# published by atomically replacing the CURRENT pointer file
+VERSIONS_PATH = os.path.join(INDEX_ROOT, "versions")
+CURRENT_FILE = os.path.join(INDEX_ROOT, "CURRENT")
+# Unversioned index location used before versioned publishing
+INDEX_PATH = os.path.join(INDEX_ROOT, "faiss_index")
+INDEX_FILE = "index.faiss"
+# Writers build chunk stores here before moving them into a version
+STAGING_PATH = INDEX_ROOT
+# Published versions kept on disk (the current one included)
+INDEX_KEEP_VERSIONS = max(1, int(os.getenv("INDEX_KEEP_VERSIONS", 2)))
+ABANDONED_BUILD_SECONDS = 3600
+# Keyword index of versions saved before the postings moved into the chunk store
+KEYWORD_INDEX_FILE = "bm25.json"
+# Written at build time after validating the index against the chunk store
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT = 2
+# Rank constant for reciprocal rank fusion of semantic and keyword results
+RRF_K = 60
+
+# Shared pool for running retrieval stages concurrently
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_WORKERS", 8)),
+    thread_name_prefix="retrieval",
+)
+
+class _IndexWriteLock:
+    """
+    Serializes writers (embedding jobs, file deletions) of the on-disk
+    index: a thread lock within the process plus a POSIX record lock on a
+    file, since the embedding worker and the web workers are separate
+    processes. Record locks belong to the process, so loader processes
+    forked while it is held do not keep it. Without fcntl (Windows) only
+    threads are serialized.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if fcntl is not None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a")
+                fcntl.lockf(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self._release()
+
+    def _release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # also drops the lock
+            self._file = None
+        self._lock.release()
+
+
+_index_write_lock = _IndexWriteLock(os.path.join(INDEX_ROOT, ".write.lock"))
+
+def create_vector_store(chunks, progress_callback=None):
     """
     Create a FAISS vector store from document chunks and save it to disk.
+    Replaces any existing index.
     
     Args:
-        chunks: List of document chunks to embed and store
+        chunks: Iterable of document chunks to embed and store; may be a
+            generator, it is consumed in batches
+        progress_callback: Optional (completed_batches, embedded_chunks) hook
     """
     # Load the embedding model
     embeddings = load_embedding_model()
     
-    # Create FAISS vector store from documents
-    vector_store = FAISS.from_documents(
-        documents=chunks,
-        embedding=embeddings
-    )
+    # The new version is built in a staging chunk store without holding the
+    # write lock, so other writers (a file deletion in the web app) are not
+    # held up for the whole rebuild; only publishing it is serialized
+    docstore = ChunkStore.create(STAGING_PATH)
+    try:
+        vector_store = build_vector_store(
+            stream_embedded_chunks(chunks, embeddings, progress_callback=progress_callback),
+            embeddings,
+            docstore=docstore,
+        )
+    except BaseException:
+        docstore.discard()
+        raise
+    if vector_store is None:
+        docstore.discard()
+        delete_index()
+        print("No chunks to index; index removed.")
+        return
+    with _index_write_lock:
+        save_vector_store(vector_store)
+    print("Vector store created and saved successfully.")
+
+def build_vector_store(embedded_batches, embeddings, index_config=None, docstore=None):
+    """
+    Build an in-memory FAISS store (with its keyword index) batch by batch.
+    The first batches are held back until there are enough vectors to
+    train the configured index type.
     
-    # Create directory if it doesn't exist
-    os.makedirs("vector_db", exist_ok=True)
+    Args:
+        embedded_batches: Iterable of (chunks, vectors) pairs
+        embeddings: Embedding model used for queries against the store
+        index_config: Index type and parameters (default: from FAISS_* env)
+        docstore: Writable store for the chunks (default: in memory)
+        
+    Returns:
+        FAISS: The new store, or None if there were no chunks
+    """
+    index_config = dict(index_config or index_config_from_env())
+    vector_store = None
+    held: List[Tuple[List[Document], np.ndarray]] = []
+    held_count = 0
+    for chunks, vectors in embedded_batches:
+        # Every chunk gets an ID so it can be referenced (e.g. by
+        # conversation sessions) and fetched back
+        for chunk in chunks:
+            if not chunk.metadata.get("chunk_id"):
+                chunk.metadata["chunk_id"] = uuid.uuid4().hex
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vector_store is not None:
+            _add_batch(vector_store, chunks, vectors)
+            continue
+        held.append((chunks, vectors))
+        held_count += len(chunks)
+        if held_count >= train_size(index_config):
+            vector_store = _new_vector_store(embeddings, held, index_config, docstore)
+            held = []
+    if vector_store is None and held:
+        vector_store = _new_vector_store(embeddings, held, index_config, docstore)
+    return vector_store
+
+def _new_vector_store(embeddings, held, index_config, docstore=None):
+    sample = np.concatenate([vectors for _, vectors in held])
+    index = create_index(index_config, sample)
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore if docstore is not None else InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    vector_store.index_config = index_config
+    for chunks, vectors in held:
+        _add_batch(vector_store, chunks, vectors)
+    return vector_store
+
+def _add_batch(vector_store, chunks: List[Document], vectors) -> None:
+    ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+    # A ChunkStore indexes the chunks itself; an in-memory keyword index
+    # (in-memory docstores) is kept up to date once it has been built
+    keyword_index = getattr(vector_store, "keyword_index", None)
+    if isinstance(keyword_index, BM25Index):
+        for chunk_id, text in zip(ids, texts):
+            keyword_index.add(chunk_id, text)
+
+def _iter_store_batches(vector_store, batch_size: int = INGEST_BATCH_SIZE):
+    """
+    Yield a store's chunks with their stored vectors, in index order.
+    """
+    positions = sorted(vector_store.index_to_docstore_id)
+    for start in range(0, len(positions), batch_size):
+        batch = positions[start:start + batch_size]
+        chunks = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[pos])
+            for pos in batch
+        ]
+        yield chunks, reconstruct_vectors(vector_store.index, batch)
+
+def save_vector_store(vector_store) -> None:
+    """
+    Save a vector store as a new index version and publish it. The vectors
+    go to index.faiss and the chunks to a SQLite chunk store, validated
+    against each other and recorded in a manifest; the chunk store also
+    holds the keyword index. The store's writable docstore is consumed.
+    Raises:
+        ValueError: If the index and the chunk store do not match
+    """
+    docstore = vector_store.docstore
+    docstore.write_positions(vector_store.index_to_docstore_id)
+    problems = docstore.validate(vector_store.index.ntotal)
+    if problems:
+        docstore.discard()
+        raise ValueError(f"Refusing to save inconsistent index: {'; '.join(problems)}")
+    docstore.close()
+    version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(VERSIONS_PATH, version)
+    os.makedirs(path)
+    faiss.write_index(vector_store.index, os.path.join(path, INDEX_FILE))
+    os.replace(docstore.path, os.path.join(path, CHUNK_STORE_FILE))
+    index_config = getattr(vector_store, "index_config", FLAT_CONFIG)
+    save_index_config(path, index_config)
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "version": version,
+        "chunks": int(vector_store.index.ntotal),
+        "dim": int(vector_store.index.d),
+        "index_type": index_config["type"],
+        "file_sizes": {
+            INDEX_FILE: os.path.getsize(os.path.join(path, INDEX_FILE)),
+            CHUNK_STORE_FILE: os.path.getsize(os.path.join(path, CHUNK_STORE_FILE)),
+        },
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    _publish_version(version)
+
+def _publish_version(version: Optional[str]) -> None:
+    """
+    Point CURRENT at a fully written version (or remove it for None), then
+    delete versions that are no longer needed.
+    """
+    if version is None:
+        if os.path.exists(CURRENT_FILE):
+            os.remove(CURRENT_FILE)
+    else:
+        tmp_pointer = f"{CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, CURRENT_FILE)
+        print(f"[INDEX] Published version {version}")
+    _collect_old_versions(version)
+
+def _collect_old_versions(current: Optional[str]) -> None:
+    # Processes still serving an old version keep their open files (POSIX
+    # unlink semantics); newer unpublished directories belong to builds in
+    # progress and are left alone
+    if os.path.exists(INDEX_PATH):
+        shutil.rmtree(INDEX_PATH, ignore_errors=True)
+    if not os.path.isdir(VERSIONS_PATH):
+        return
+    versions = sorted(os.listdir(VERSIONS_PATH))
+    if current is None:
+        stale = versions
+    else:
+        older = [v for v in versions if v < current]
+        stale = older[:max(0, len(older) - (INDEX_KEEP_VERSIONS - 1))]
+    for version in stale:
+        path = os.path.join(VERSIONS_PATH, version)
+        # A version without a manifest may still be being written by another
+        # process; only remove it once it is clearly abandoned
+        if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            try:
+                if time.time() - os.path.getmtime(path) < ABANDONED_BUILD_SECONDS:
+                    continue
+            except OSError:
+                continue
+        shutil.rmtree(path, ignore_errors=True)
+
+def delete_index() -> None:
+    """
+    Unpublish the index and remove every stored version.
+    """
+    with _index_write_lock:
+        _delete_index()
+
+def _delete_index() -> None:
+    # Callers must hold _index_write_lock, which is not re-entrant
+    _publish_version(None)
+
+def current_index_path(version: Optional[str] = None) -> Optional[str]:
+    """
+    Return the directory of the published index (or of the given version),
+    or None if there is none.
+    """
+    version = version or get_index_version()
+    if version == "none":
+        return None
+    if version.startswith("legacy-"):
+        return INDEX_PATH
+    return os.path.join(VERSIONS_PATH, version)
+
+def _read_manifest(index_path: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Read the build manifest and check that the files on disk are the ones
+    validated at build time (cheap: sizes only).
+    Returns:
+        (manifest, None) if they match, else (None, description of the problem)
+    """
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None, "no manifest (saved in an older format)"
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT:
+        return None, f"format {manifest.get('format')}, expected {MANIFEST_FORMAT}"
+    for name, size in manifest["file_sizes"].items():
+        path = os.path.join(index_path, name)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            return None, f"{name} changed since it was built"
+    return manifest, None
+
+def _discard_writable(vector_store) -> None:
+    docstore = getattr(vector_store, "docstore", None)
+    if isinstance(docstore, ChunkStore) and not docstore.readonly:
+        docstore.discard()
+
+def load_file_chunks() -> Dict[int, List[str]]:
+    """
+    Return the mapping of KnowledgeBaseFile.id to chunk IDs in the saved index.
+    """
+    index_path = current_index_path()
+    if index_path is None or _read_manifest(index_path)[1]:
+        # Missing or unusable index: every file needs embedding
+        return {}
+    try:
+        store = ChunkStore(os.path.join(index_path, CHUNK_STORE_FILE), readonly=True)
+        try:
+            return store.file_chunks()
+        finally:
+            store.close()
+    except Exception as e:
+        print(f"Error loading chunk manifest: {e}")
+        return {}
+
+def has_untracked_chunks() -> bool:
+    """
+    True if the saved index holds chunks without a knowledge base file (an
+    index built before chunks were tagged). An incremental update cannot
+    replace those, so the index has to be rebuilt.
+    """
+    index_path = current_index_path()
+    if index_path is None or _read_manifest(index_path)[1]:
+        return False
+    try:
+        store = ChunkStore(os.path.join(index_path, CHUNK_STORE_FILE), readonly=True)
+        try:
+            return store.untracked_count() > 0
+        finally:
+            store.close()
+    except Exception as e:
+        print(f"Error loading chunk manifest: {e}")
+        return False
+
+def assign_chunk_ids(file_id: int, chunks: List[Document]) -> List[str]:
+    """
+    Tag chunks with their knowledge base file and a stable per-file chunk ID.
+    Returns:
+        List[str]: The assigned chunk IDs, in chunk order
+    """
+    ids = []
+    for n, chunk in enumerate(chunks):
+        chunk_id = f"kb{file_id}-{n}"
+        chunk.metadata["kb_file_id"] = file_id
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return ids
+
+def _remove_file_chunks(vector_store, file_id: int) -> None:
+    ids = vector_store.docstore.chunk_ids_for_file(file_id)
+    if ids:
+        _delete_chunks(vector_store, ids)
+        keyword_index = getattr(vector_store, "keyword_index", None)
+        if isinstance(keyword_index, BM25Index):
+            keyword_index.remove_many(ids)
+
+def _delete_chunks(vector_store, ids: List[str]) -> None:
+    if getattr(vector_store, "index_config", FLAT_CONFIG)["type"] == "flat":
+        vector_store.delete(ids)
+        return
+    # IVF remove_ids leaves gaps in the positions LangChain maps to chunk IDs
+    # and HNSW cannot remove at all, so positions are compacted in the index
+    drop = set(ids)
+    id_map = vector_store.index_to_docstore_id
+    keep = [pos for pos in sorted(id_map) if id_map[pos] not in drop]
+    remove_positions(vector_store.index, keep)
+    vector_store.index_to_docstore_id = {new: id_map[old] for new, old in enumerate(keep)}
+    vector_store.docstore.delete(ids)
+
+def _finish_index_update(vector_store) -> None:
+    if vector_store.index.ntotal == 0:
+        # FAISS cannot persist an empty store usefully; drop the index instead
+        _discard_writable(vector_store)
+        _delete_index()
+        print("Vector store is empty; index removed.")
+        return
+    save_vector_store(vector_store)
+    print("Vector store updated and saved successfully.")
+
+def upsert_file_chunks(file_chunks_by_id, progress_callback=None) -> None:
+    """
+    Add or replace the chunks of the given knowledge base files in the index.
+    Only these chunks are embedded; all other vectors are left untouched.
     
-    # Save the vector store to disk
-    vector_store.save_local("vector_db/faiss_index")
-    print("Vector store created and saved successfully.")
+    Args:
+        file_chunks_by_id: Mapping of KnowledgeBaseFile.id to that file's
+            chunks, or an iterable of (file_id, chunks) pairs; consumed lazily
+        progress_callback: Optional (completed_batches, embedded_chunks) hook
+    """
+    embeddings = load_embedding_model()
+    if isinstance(file_chunks_by_id, dict):
+        file_chunks_by_id = file_chunks_by_id.items()
+    file_ids: List[int] = []
+
+    def tagged_chunks():
+        for file_id, chunks in file_chunks_by_id:
+            file_ids.append(file_id)
+            assign_chunk_ids(file_id, chunks)
+            yield from chunks
+
+    # Embed the new chunks into a flat staging store first; only copying
+    # them into the live index happens under the write lock
+    staged = build_vector_store(
+        stream_embedded_chunks(tagged_chunks(), embeddings, progress_callback=progress_callback),
+        embeddings,
+        index_config=FLAT_CONFIG,
+    )
+    if staged is None and not file_ids:
+        return
+    with _index_write_lock:
+        vector_store = load_vector_store(embeddings, writable=True)
+        try:
+            if vector_store is not None:
+                for file_id in file_ids:
+                    _remove_file_chunks(vector_store, file_id)
+            if staged is not None:
+                if vector_store is None:
+                    vector_store = build_vector_store(
+                        _iter_store_batches(staged),
+                        embeddings,
+                        docstore=ChunkStore.create(STAGING_PATH),
+                    )
+                else:
+                    for chunks, vectors in _iter_store_batches(staged):
+                        _add_batch(vector_store, chunks, vectors)
+            if vector_store is not None:
+                _finish_index_update(vector_store)
+        except BaseException:
+            _discard_writable(vector_store)
+            raise
+
+def delete_file_chunks(file_ids: List[int]) -> None:
+    """
+    Remove every chunk belonging to the given knowledge base files from the index.
+    """
+    if current_index_path() is None:
+        return
+    indexed_ids = load_file_chunks()
+    if not any(file_id in indexed_ids for file_id in file_ids):
+        return
+    with _index_write_lock:
+        vector_store = load_vector_store(load_embedding_model(), writable=True)
+        if vector_store is None:
+            return
+        try:
+            for file_id in file_ids:
+                _remove_file_chunks(vector_store, file_id)
+            _finish_index_update(vector_store)
+        except BaseException:
+            _discard_writable(vector_store)
+            raise
+
+def build_keyword_index(vector_store) -> BM25Index:
+    """
+    Build a BM25 keyword index over every chunk in the vector store's docstore.
+    """
+    docstore = vector_store.docstore
+    if isinstance(docstore, ChunkStore):
+        return BM25Index.from_documents(docstore.iter_texts())
+    items = []
+    for doc_id in vector_store.index_to_docstore_id.values():
+        doc = docstore.search(doc_id)
+        if hasattr(doc, 'page_content') and isinstance(doc.page_content, str):
+            items.append((doc_id, doc.page_content))
+    return BM25Index.from_documents(items)
+
+def get_keyword_index(vector_store):
+    """
+    Return the keyword index of a vector store: the postings in its chunk
+    store, or an in-memory index built on first use.
+    """
+    keyword_index = getattr(vector_store, "keyword_index", None)
+    if keyword_index is None:
+        docstore = vector_store.docstore
+        if isinstance(docstore, ChunkStore) and docstore.has_keyword_index():
+            keyword_index = StoredBM25Index(docstore)
+        else:
+            keyword_index = build_keyword_index(vector_store)
+        vector_store.keyword_index = keyword_index
+    return keyword_index
+
+_version_cache: Tuple[Optional[Tuple[int, int]], str] = (None, "none")
+
+def get_index_version() -> str:
+    """
+    Return the published index version. The pointer file is only re-read
+    when its inode or mtime changes, so this is a single stat() per call.
+    """
+    global _version_cache
+    try:
+        st = os.stat(CURRENT_FILE)
+    except OSError:
+        # Unversioned index from before versioned publishing
+        try:
+            return "legacy-" + str(os.stat(os.path.join(INDEX_PATH, INDEX_FILE)).st_mtime_ns)
+        except OSError:
+            return "none"
+    key = (st.st_ino, st.st_mtime_ns)
+    cached_key, version = _version_cache
+    if cached_key != key:
+        try:
+            with open(CURRENT_FILE, "r", encoding="utf-8") as f:
+                version = f.read().strip() or "none"
+        except OSError:
+            return "none"
+        _version_cache = (key, version)
+    return version
 
-def load_vector_store(embeddings):
+def load_vector_store(embeddings, writable=False):
     """
     Load an existing FAISS vector store from disk.
+    By default the index and chunk store are opened read-only and
+    memory-mapped, so worker processes share them through the page cache
+    and loading does not deserialize the chunks. The files are checked
+    against the manifest written when they were built and validated.
     
     Args:
         embeddings: Embedding model instance (Embeddings object)
+        writable: Load a private, modifiable copy (for index updates)
         
     Returns:
         FAISS: Loaded vector store instance or None if not found
     """
-    index_path = "vector_db/faiss_index"
+    version = get_index_version()
+    index_path = current_index_path(version)
     
-    if os.path.exists(index_path):
+    if index_path is not None:
+        manifest, problem = _read_manifest(index_path)
+        if problem:
+            print(f"Vector store at {index_path} cannot be used ({problem}). Re-embed all files to rebuild it.")
+            return None
+        docstore = None
         try:
-            vector_store = FAISS.load_local(
-                folder_path=index_path,
-                embeddings=embeddings,
-                allow_dangerous_deserialization=True  # Enable for trusted local files
+            chunk_store_path = os.path.join(index_path, CHUNK_STORE_FILE)
+            if writable:
+                docstore = ChunkStore.copy_of(chunk_store_path, STAGING_PATH)
+                index_to_docstore_id = docstore.positions()
+            else:
+                docstore = ChunkStore(chunk_store_path, readonly=True)
+                index_to_docstore_id = docstore.position_map()
+            index = read_index(os.path.join(index_path, INDEX_FILE), mmap=not writable)
+            if index.ntotal != manifest["chunks"] or len(index_to_docstore_id) != manifest["chunks"]:
+                if writable:
+                    docstore.discard()
+                print(f"Vector store at {index_path} does not match its manifest. Re-embed all files to rebuild it.")
+                return None
+            vector_store = FAISS(
+                embedding_function=embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id,
             )
-            print("Vector store loaded successfully.")
-            # Diagnostic: print types of all docstore values
-            doc_types = {}
-            for i, doc in enumerate(vector_store.docstore._dict.values()):
-                t = type(doc).__name__
-                doc_types[t] = doc_types.get(t, 0) + 1
-                if not hasattr(doc, 'page_content'):
-                    print(f"[DOCSTORE-DEBUG] Non-Document object at index {i}: {t}: {repr(doc)[:100]}")
-            print(f"[DOCSTORE-DEBUG] Docstore object type counts: {doc_types}")
+            vector_store.index_version = version
+            vector_store.index_config = load_index_config(index_path)
+            apply_search_params(vector_store.index, vector_store.index_config)
+            print(f"Vector store loaded successfully ({vector_store.index_config['type']} index).")
+            if docstore.has_keyword_index():
+                # Postings are read from the chunk store per query
+                vector_store.keyword_index = StoredBM25Index(docstore)
+            else:
+                # Saved before postings moved into the chunk store
+                keyword_index_path = os.path.join(index_path, KEYWORD_INDEX_FILE)
+                keyword_index = BM25Index.load(keyword_index_path)
+                if keyword_index is None:
+                    keyword_index = build_keyword_index(vector_store)
+                    keyword_index.save(keyword_index_path)
+                    print("[BM25] Keyword index rebuilt from docstore.")
+                vector_store.keyword_index = keyword_index
             return vector_store
         except Exception as e:
+            if writable and docstore is not None:
+                docstore.discard()
             print(f"Error loading vector store: {e}")
             return None
     else:
         print("Vector store not found. Please run ingest.py first.")
         return None
 
-def simple_full_text_search(query: str, documents: List[Document], top_k: int = 4) -> List[Document]:
+def fetch_chunks(vector_store, chunk_ids: List[str]) -> Dict[str, Document]:
+    """
+    Fetch chunk Documents by ID, in a single query when the docstore is a
+    ChunkStore. IDs that are not found are left out.
+    """
+    docstore = vector_store.docstore
+    if isinstance(docstore, ChunkStore):
+        return docstore.get_many(chunk_ids)
+    found = {}
+    for chunk_id in chunk_ids:
+        doc = docstore.search(chunk_id)
+        if isinstance(doc, Document):
+            found[chunk_id] = doc
+    return found
+
+def keyword_search(query: str, vector_store, top_k: int = 4) -> List[Tuple[Document, float]]:
+    """
+    BM25 keyword search over the vector store's chunks.
+    Returns (document, score) pairs for the top_k matches, best first.
+    """
+    hits = get_keyword_index(vector_store).search(query, top_k=top_k)
+    docs = fetch_chunks(vector_store, [doc_id for doc_id, _ in hits])
+    return [(docs[doc_id], score) for doc_id, score in hits if doc_id in docs]
+
+# Rerank results keyed by (query, top_n, candidate chunk IDs)
+rerank_cache = TTLCache(
+    max_entries=int(os.getenv("RERANK_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("RERANK_CACHE_TTL", 3600)),
+)
+
+rerank_stats: Dict[str, float] = {
+    "requests": 0,
+    "failures": 0,
+    "cache_hits": 0,
+    "total_latency_ms": 0.0,
+    "last_latency_ms": 0.0,
+}
+# Reranks run on request threads; guards the read-modify-writes above
+_rerank_stats_lock = threading.Lock()
+
+def _count_rerank(**amounts: float) -> None:
+    with _rerank_stats_lock:
+        for key, amount in amounts.items():
+            rerank_stats[key] += amount
+
+_jina_session = None
+_jina_session_lock = threading.Lock()
+
+def _get_jina_session() -> requests.Session:
+    """
+    Return the shared keep-alive HTTP session for the rerank API.
+    """
+    global _jina_session
+    if _jina_session is None:
+        with _jina_session_lock:
+            if _jina_session is None:
+                pool_size = int(os.getenv("RERANK_POOL_SIZE", 16))
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=pool_size, pool_maxsize=pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _jina_session = session
+    return _jina_session
+
+def _candidate_id(doc: Document) -> str:
+    chunk_id = doc.metadata.get("chunk_id") if hasattr(doc, "metadata") else None
+    if chunk_id:
+        return chunk_id
+    # Chunks from indexes built before chunk IDs existed: key by content
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+def get_rerank_stats() -> Dict[str, float]:
     """
-    Simple keyword-based full-text search over documents.
-    Returns top_k documents with the most keyword matches.
+    Return rerank request, failure, cache and latency counters.
     """
-    query_keywords = set(re.findall(r'\w+', query.lower()))
-    scored_docs = []
-    for doc in documents:
-        content = doc.page_content.lower()
-        score = sum(1 for word in query_keywords if word in content)
-        if score > 0:
-            scored_docs.append((score, doc))
-    # Sort by score descending
-    scored_docs.sort(reverse=True, key=lambda x: x[0])
-    return [doc for score, doc in scored_docs[:top_k]]
+    with _rerank_stats_lock:
+        stats = dict(rerank_stats)
+    stats["avg_latency_ms"] = (
+        stats["total_latency_ms"] / stats["requests"] if stats["requests"] else 0.0
+    )
+    stats["cache"] = rerank_cache.stats()
+    return stats
 
 def rerank_documents_with_jina(query: str, docs: List[Document], top_k: int = 6) -> List[Document]:
     """
     Use Jina AI Rerank API (v2 multilingual) to rerank the documents by relevance to the query.
     Requires JINA_API_KEY in environment.
     """
+    with span("rerank", candidates=len(docs), top_k=top_k) as current:
+        reranked = _rerank_documents_with_jina(query, docs, top_k, current)
+        current.set(chunk_ids=[_candidate_id(doc) for doc in reranked])
+        return reranked
+
+def _rerank_documents_with_jina(query: str, docs: List[Document], top_k: int, current) -> List[Document]:
+    # current is the rerank span; the outcome is recorded as its status
     api_key = os.getenv("JINA_API_KEY")
     if not api_key:
-        print("[JINA-RERANK] No JINA_API_KEY set, skipping rerank.")
+        current.set(status="skipped", reason="no JINA_API_KEY")
         return docs[:top_k]
     if not query or not isinstance(query, str) or not query.strip():
-        print("[JINA-RERANK] Query is empty or not a string, skipping rerank.")
+        current.set(status="skipped", reason="empty query")
         return docs[:top_k]
     if not docs:
-        print("[JINA-RERANK] No documents to rerank, skipping rerank.")
+        current.set(status="skipped", reason="no documents")
         return []
 
     # Clean and deduplicate documents
@@ -119,74 +759,158 @@ def rerank_documents_with_jina(query: str, docs: List[Document], top_k: int = 6)
         clean_docs.append(content)
         doc_map.append(idx)
     if not clean_docs:
-        print("[JINA-RERANK] All documents empty after cleaning, skipping rerank.")
+        current.set(status="skipped", reason="all documents empty")
         return []
     # Jina API allows max 20 docs per request
     clean_docs = clean_docs[:20]
     doc_map = doc_map[:20]
-    endpoint = "https://api.jina.ai/v1/rerank"
+    top_n = min(top_k, len(clean_docs))
+    # Identical (query, candidate set) pairs reuse the previous ranking
+    cache_key = (
+        query.strip(),
+        top_n,
+        tuple(_candidate_id(docs[i]) for i in doc_map),
+    )
+    cached = rerank_cache.get(cache_key)
+    if cached is not None:
+        _count_rerank(cache_hits=1)
+        current.set(status="cached")
+        return [docs[doc_map[i]] for i in cached]
+    endpoint = os.getenv("JINA_RERANK_URL", "https://api.jina.ai/v1/rerank")
     payload = {
         "query": query.strip(),
         "documents": clean_docs,
         "model": "jina-reranker-v2-base-multilingual",
-        "top_n": min(top_k, len(clean_docs))
+        "top_n": top_n
     }
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
+    _count_rerank(requests=1)
+    start = time.perf_counter()
     try:
-        response = requests.post(endpoint, json=payload, headers=headers, timeout=10)
+        response = _get_jina_session().post(
+            endpoint,
+            json=payload,
+            headers=headers,
+            timeout=float(os.getenv("JINA_RERANK_TIMEOUT", 10)),
+        )
         response.raise_for_status()
         result = response.json()
         if "results" in result:
-            indices = [r["index"] for r in result["results"]]
-            reranked = [docs[doc_map[i]] for i in indices if i < len(doc_map)]
-            print(f"[JINA-RERANK] Reranked top {len(reranked)} docs (v2 multilingual).")
+            indices = [r["index"] for r in result["results"] if r["index"] < len(doc_map)]
+            rerank_cache.set(cache_key, indices)
+            reranked = [docs[doc_map[i]] for i in indices]
+            current.set(status="ok")
             return reranked
         else:
-            print(f"[JINA-RERANK] Unexpected response: {result}")
+            _count_rerank(failures=1)
+            ERRORS.inc("rerank")
+            current.set(status="error")
+            log_event("rerank_error", error="unexpected response", response=str(result)[:500])
             return docs[:top_k]
     except Exception as e:
-        print(f"[JINA-RERANK] Error: {e}")
+        _count_rerank(failures=1)
+        ERRORS.inc("rerank")
+        current.set(status="error")
+        log_event("rerank_error", error=str(e))
         return docs[:top_k]
+    finally:
+        latency_ms = (time.perf_counter() - start) * 1000
+        with _rerank_stats_lock:
+            rerank_stats["last_latency_ms"] = latency_ms
+            rerank_stats["total_latency_ms"] += latency_ms
+        observe_stage("rerank", latency_ms / 1000)
 
-def hybrid_retrieve(query: str, vector_store, embeddings, top_k: int = 6) -> List[Document]:
+def _semantic_search_ids(query: str, vector_store, embeddings, top_k: int) -> List[str]:
+    # Nearest chunks by vector, as chunk IDs; texts are fetched after fusion
+    vector = np.asarray([embeddings.embed_query(query)], dtype=np.float32)
+    start = time.perf_counter()
+    with span("faiss_search"):
+        _, positions = vector_store.index.search(vector, top_k)
+    observe_stage("faiss_search", time.perf_counter() - start)
+    chunk_ids = [
+        vector_store.index_to_docstore_id[int(position)]
+        for position in positions[0]
+        if position != -1
+    ]
+    annotate(chunk_ids=chunk_ids)
+    return chunk_ids
+
+def _keyword_search_ids(query: str, vector_store, top_k: int) -> List[str]:
+    # Best BM25 matches, as chunk IDs
+    chunk_ids = [doc_id for doc_id, _ in get_keyword_index(vector_store).search(query, top_k=top_k)]
+    annotate(chunk_ids=chunk_ids)
+    return chunk_ids
+
+def _timed(name: str, fn, *args):
+    # Run fn as a trace span; returns (result, milliseconds)
+    with span(name):
+        start = time.perf_counter()
+        result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def hybrid_retrieve(query: str, vector_store, embeddings, top_k: int = 6, timings: Optional[Dict[str, float]] = None) -> List[Document]:
     """
     Hybrid retrieval: combine semantic (vector) and full-text (keyword) search.
-    Returns the most relevant documents from both methods (no duplicates).
+    Both searches run concurrently; results are fused once both finish and
+    then reranked. Returns the most relevant documents from both methods
+    (no duplicates).
+    
+    Args:
+        timings: Optional dict that receives per-stage durations in milliseconds
     """
-    # Semantic search (filter only Document objects)
-    semantic_docs = []
-    for doc in vector_store.similarity_search(query, k=top_k):
-        if hasattr(doc, 'page_content'):
-            semantic_docs.append(doc)
-        else:
-            print(f"[DEBUG] semantic_docs: Skipping non-Document object: {type(doc)}: {repr(doc)[:100]}")
-    # Full-text search (over all docs in the store, filter only Document objects)
-    all_docs = []
-    for doc in vector_store.docstore._dict.values():
-        if hasattr(doc, 'page_content'):
-            all_docs.append(doc)
-        else:
-            print(f"[DEBUG] all_docs: Skipping non-Document object: {type(doc)}: {repr(doc)[:100]}")
-    fulltext_docs = []
-    for doc in simple_full_text_search(query, all_docs, top_k=top_k):
-        if hasattr(doc, 'page_content'):
-            fulltext_docs.append(doc)
-        else:
-            print(f"[DEBUG] fulltext_docs: Skipping non-Document object: {type(doc)}: {repr(doc)[:100]}")
-    # Combine, remove duplicates (by content)
-    seen = set()
-    hybrid_docs = []
-    for doc in semantic_docs + fulltext_docs:
-        if not hasattr(doc, 'page_content'):
-            print(f"[DEBUG] hybrid_docs: Skipping non-Document object: {type(doc)}: {repr(doc)[:100]}")
+    with span("retrieve", top_k=top_k) as current:
+        docs, stage_timings = _hybrid_retrieve(query, vector_store, embeddings, top_k)
+        current.set(chunk_ids=[_candidate_id(doc) for doc in docs])
+    if timings is not None:
+        timings.update(stage_timings)
+    return docs
+
+def _hybrid_retrieve(query: str, vector_store, embeddings, top_k: int) -> Tuple[List[Document], Dict[str, float]]:
+    start = time.perf_counter()
+    # Semantic search (including the query embedding round trip) runs on the
+    # shared executor while keyword search runs on this thread; the context
+    # is copied so its spans join the current trace
+    semantic_future = _retrieval_executor.submit(
+        contextvars.copy_context().run,
+        _timed, "semantic_search", _semantic_search_ids, query, vector_store, embeddings, top_k,
+    )
+    keyword_ids, keyword_ms = _timed("keyword_search", _keyword_search_ids, query, vector_store, top_k)
+    semantic_ids, semantic_ms = semantic_future.result()
+    # Fuse both rankings by chunk ID with reciprocal rank fusion, then fetch
+    # the text of just the fused candidates
+    id_scores: Dict[str, float] = {}
+    for ranked in (semantic_ids, keyword_ids):
+        for rank, doc_id in enumerate(ranked):
+            id_scores[doc_id] = id_scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    docs, fetch_ms = _timed("fetch", fetch_chunks, vector_store, list(id_scores))
+    # Remove duplicates by content (the same text may be indexed twice)
+    fused_scores = {}
+    fused_docs = {}
+    for doc_id, score in id_scores.items():
+        doc = docs.get(doc_id)
+        if doc is None:
             continue
         key = doc.page_content.strip()
-        if key not in seen:
-            hybrid_docs.append(doc)
-            seen.add(key)
+        fused_scores[key] = fused_scores.get(key, 0.0) + score
+        fused_docs.setdefault(key, doc)
+    hybrid_docs = [
+        fused_docs[key]
+        for key in sorted(fused_scores, key=lambda k: fused_scores[k], reverse=True)
+    ]
     # Rerank with Jina if API key is set
-    hybrid_docs = rerank_documents_with_jina(query, hybrid_docs, top_k=top_k)
-    return hybrid_docs[:top_k] 
\ No newline at end of file
+    rerank_start = time.perf_counter()
+    hybrid_docs = rerank_documents_with_jina(query, hybrid_docs, top_k)
+    rerank_ms = (time.perf_counter() - rerank_start) * 1000
+    stage_timings = {
+        "semantic_ms": semantic_ms,
+        "keyword_ms": keyword_ms,
+        "fetch_ms": fetch_ms,
+        "rerank_ms": rerank_ms,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
+    observe_stage("keyword_search", keyword_ms / 1000)
+    observe_stage("fetch", fetch_ms / 1000)
+    return hybrid_docs[:top_k], stage_timings
@@ -0,0 +1,112 @@
+"""
+Compare FAISS index types (flat, ivf_flat, hnsw, ivf_pq) on synthetic
+clustered vectors: build time, single-query latency, recall@k against
+exact search, and index size.
+
+Usage:
+    python benchmarks/bench_faiss_index.py [--sizes 10000 100000 1000000] [--dim 768]
+        [--types flat ivf_flat hnsw ivf_pq] [--json results.json]
+
+Index parameters come from the same FAISS_* environment variables as the app.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss  # type: ignore
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.faiss_index import INDEX_TYPES, create_index, index_config_from_env, train_size  # noqa: E402
+
+
+def make_vectors(n, dim, clusters, rng):
+    # Embeddings of real text are clustered by topic, not uniform
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * 0.35
+    return centers[labels] + noise
+
+
+def config_for(index_type):
+    previous = os.environ.get("FAISS_INDEX_TYPE")
+    os.environ["FAISS_INDEX_TYPE"] = index_type
+    try:
+        return index_config_from_env()
+    finally:
+        if previous is None:
+            del os.environ["FAISS_INDEX_TYPE"]
+        else:
+            os.environ["FAISS_INDEX_TYPE"] = previous
+
+
+def bench(index_type, vectors, queries, truth, k):
+    config = config_for(index_type)
+    start = time.perf_counter()
+    index = create_index(config, vectors[:train_size(config)])
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        t = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - t) * 1000)
+        found.append(ids[0])
+    recall = np.mean([
+        len(set(row) & set(expected)) / k for row, expected in zip(found, truth)
+    ])
+    latencies = np.array(latencies)
+    return {
+        "type": config["type"],
+        "config": config,
+        "vectors": len(vectors),
+        "build_s": round(build_s, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        f"recall@{k}": round(float(recall), 4),
+        "index_mb": round(len(faiss.serialize_index(index)) / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    print(f"{'vectors':>9} {'type':>9} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7} {'MB':>8}")
+    for n in args.sizes:
+        vectors = make_vectors(n, args.dim, clusters=max(10, n // 1000), rng=rng)
+        queries = vectors[rng.choice(n, args.queries, replace=False)] + rng.standard_normal(
+            (args.queries, args.dim)
+        ).astype(np.float32) * 0.1
+        exact = faiss.IndexFlatL2(args.dim)
+        exact.add(vectors)
+        _, truth = exact.search(queries, args.k)
+        del exact
+        for index_type in args.types:
+            result = bench(index_type, vectors, queries, truth, args.k)
+            results.append(result)
+            print(
+                f"{n:>9} {result['type']:>9} {result['build_s']:>8} {result['p50_ms']:>8} "
+                f"{result['p99_ms']:>8} {result[f'recall@{args.k}']:>7} {result['index_mb']:>8}"
+            )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare index load time and memory: the pickled LangChain format
+(FAISS.load_local) against the memory-mapped index.faiss + SQLite chunk
+store that load_vector_store now opens read-only.
+
+Usage:
+    python benchmarks/bench_index_load.py [--sizes 10000 100000 500000] [--dim 768]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Each load runs in a fresh interpreter so RSS is not shared between runs
+LOAD_SNIPPET = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+if {fmt!r} == "pickle":
+    from langchain_community.vectorstores import FAISS
+    store = FAISS.load_local({path!r}, embeddings=None, allow_dangerous_deserialization=True)
+    doc = store.docstore.search(store.index_to_docstore_id[{probe}])
+else:
+    from app.chunk_store import ChunkStore
+    from app.faiss_index import read_index
+    index = read_index({path!r} + "/index.faiss", mmap=True)
+    docs = ChunkStore({path!r} + "/chunks.sqlite3", readonly=True)
+    doc = docs.search(docs.position_map()[{probe}])
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def build(directory, n, dim):
+    import faiss  # type: ignore
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    from app.chunk_store import ChunkStore
+    from app.langchain_compat import Document
+
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    for start in range(0, n, 50000):
+        index.add(rng.standard_normal((min(50000, n - start), dim)).astype(np.float32))
+    ids = [f"kb1-{i}" for i in range(n)]
+    docs = {
+        chunk_id: Document(
+            page_content=f"Potongan dokumen {i} tentang layanan PPB. " * 40,
+            metadata={"source": "bench.pdf", "page": i, "chunk_id": chunk_id},
+        )
+        for i, chunk_id in enumerate(ids)
+    }
+    positions = dict(enumerate(ids))
+
+    pickled = os.path.join(directory, "pickle")
+    FAISS(None, index, InMemoryDocstore(docs), positions).save_local(pickled)
+
+    mapped = os.path.join(directory, "mmap")
+    os.makedirs(mapped)
+    faiss.write_index(index, os.path.join(mapped, "index.faiss"))
+    store = ChunkStore(os.path.join(mapped, "chunks.sqlite3"))
+    items = list(docs.items())
+    for start in range(0, n, 10000):
+        store.add(dict(items[start:start + 10000]))
+    store.write_positions(positions)
+    store.close()
+    return pickled, mapped
+
+
+def load(fmt, path, probe):
+    code = LOAD_SNIPPET.format(root=ROOT, fmt=fmt, path=path, probe=probe)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    elapsed, rss = out.stdout.split()[-2:]
+    return float(elapsed), float(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'format':>7} {'load s':>8} {'peak RSS MB':>12}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            pickled, mapped = build(tmp, n, args.dim)
+            for fmt, path in (("pickle", pickled), ("mmap", mapped)):
+                elapsed, rss = load(fmt, path, probe=n // 2)
+                print(f"{n:>8} {fmt:>7} {elapsed:>8.3f} {rss:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
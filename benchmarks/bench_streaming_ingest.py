@@ -0,0 +1,112 @@
+"""
+Check that streaming ingestion runs in bounded memory: a synthetic TXT
+corpus is loaded, split and embedded (with a fake embedding backend)
+through app.ingestion, and the peak RSS growth of this process must stay
+under a ceiling regardless of corpus size.
+
+The chunks are counted and dropped instead of being added to FAISS, since
+the index itself necessarily grows with the corpus.
+
+Usage:
+    python benchmarks/bench_streaming_ingest.py [--size-mb 2048] [--max-rss-mb 512]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ingestion import stream_embedded_chunks  # noqa: E402
+from app.langchain_compat import RecursiveCharacterTextSplitter  # noqa: E402
+from app.loaders import load_files_parallel  # noqa: E402
+
+WORDS = (
+    "pendaftaran layanan bahasa ujian toefl toafl sertifikat biaya jadwal "
+    "mahasiswa dosen pusat pengembangan kursus inggris arab nilai syarat "
+    "formulir pembayaran rekening kartu identitas ruang kelas hasil"
+).split()
+
+
+class FakeEmbeddings:
+    """
+    Deterministic 768-dimensional embeddings without any network calls.
+    """
+
+    def embed_documents(self, texts):
+        vectors = []
+        for text in texts:
+            seed = hashlib.sha1(text.encode("utf-8")).digest()
+            rng = random.Random(seed)
+            vectors.append([rng.random() for _ in range(768)])
+        return vectors
+
+
+def rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_corpus(directory, size_mb, file_mb):
+    rng = random.Random(0)
+    line = " ".join(rng.choice(WORDS) for _ in range(200)) + "\n"
+    lines_per_file = max(1, int(file_mb * 1024 * 1024 / len(line)))
+    specs = []
+    for n in range(max(1, int(size_mb / file_mb))):
+        path = os.path.join(directory, f"doc_{n:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(lines_per_file):
+                f.write(line)
+        specs.append((path, "txt", os.path.basename(path)))
+    return specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=2048)
+    parser.add_argument("--file-mb", type=float, default=4)
+    parser.add_argument("--max-rss-mb", type=float, default=512)
+    args = parser.parse_args()
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=2000,
+        chunk_overlap=400,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.size_mb:.0f} MB corpus...")
+        specs = make_corpus(tmp, args.size_mb, args.file_mb)
+        baseline = rss_mb()
+
+        def chunks():
+            for _, docs, error in load_files_parallel(specs):
+                if error is not None:
+                    raise error
+                yield from splitter.split_documents(docs)
+
+        start = time.perf_counter()
+        total = 0
+        for batch, vectors in stream_embedded_chunks(chunks(), FakeEmbeddings()):
+            total += len(vectors)
+        elapsed = time.perf_counter() - start
+
+    growth = rss_mb() - baseline
+    print(f"files:          {len(specs)}")
+    print(f"chunks:         {total}")
+    print(f"elapsed:        {elapsed:.1f}s ({total / elapsed:.0f} chunks/s)")
+    print(f"baseline RSS:   {baseline:.0f} MB")
+    print(f"peak RSS growth: {growth:.0f} MB (ceiling {args.max_rss_mb:.0f} MB)")
+    if growth > args.max_rss_mb:
+        print("FAIL: peak memory exceeded the ceiling")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Offline benchmark of the whole chatbot: ingestion throughput, retrieval
+latency versus corpus size, and get_response latency under concurrency,
+with fake Nomic, Gemini and Jina backends (see fakes.py), so no API keys
+or network are needed.
+
+For each corpus size a synthetic PDF/TXT/CSV knowledge base is generated
+and indexed through the same path as an embedding job (load, split,
+create_vector_store). Then hybrid_retrieve is timed over a fixed set of
+queries. On the largest corpus, get_response (and the time to the first
+chunk of stream_response) is measured at each concurrency level. Caches
+are cleared before every phase and the embedding cache is disabled, so
+each number is for uncached work. Everything runs in a temporary working
+directory; the real vector_db/ is not touched.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes-mb 1 4 16] [--mix pdf=1,txt=1,csv=1]
+        [--queries 100] [--requests 200] [--concurrency 1 4 16]
+        [--json results.json] [--compare baseline.json] [--max-regression 20]
+
+Backend latencies (milliseconds, each with a --*-jitter-ms):
+    --embed-latency-ms 80  per embedding request (batch)
+    --llm-latency-ms 600   until the first token, then --llm-token-ms 8 per token
+    --rerank-latency-ms 150 per rerank request
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeNomicEmbed, FakeRerankServer, make_corpus, make_fake_chat_model, make_queries  # noqa: E402
+
+ERROR_MARKER = "mengalami kesalahan"
+
+
+def rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children are the PDF parser processes
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    )
+
+
+def summarize(latencies_ms):
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        filetype, _, share = part.partition("=")
+        mix[filetype.strip()] = float(share or 1)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(args, rerank_url):
+    """
+    Configure the environment, import the app and swap in the fake backends.
+    Must run after changing into the working directory: the index lives in
+    a relative vector_db/.
+    """
+    os.environ.update({
+        "NOMIC_API_KEY": "benchmark",
+        "JINA_API_KEY": "benchmark",
+        "JINA_RERANK_URL": rerank_url,
+        "EMBEDDING_CACHE_PATH": "",
+        "TRACE_LOG": "true" if args.trace_log else "false",
+    })
+    import app.core as core
+    import app.models as models
+    import app.vector_store as vector_store
+
+    fake_embed = FakeNomicEmbed(dim=args.dim, latency_ms=args.embed_latency_ms, jitter_ms=args.embed_jitter_ms)
+    models.embed = fake_embed
+    core.load_llm = lambda: make_fake_chat_model(
+        latency_ms=args.llm_latency_ms,
+        jitter_ms=args.llm_jitter_ms,
+        token_ms=args.llm_token_ms,
+        answer_tokens=args.llm_answer_tokens,
+    )
+    return core, models, vector_store, fake_embed
+
+
+def clear_caches(core, models, vector_store):
+    core.answer_cache.clear()
+    core.last_context.clear()
+    models.query_embedding_cache.clear()
+    vector_store.rerank_cache.clear()
+
+
+def bench_ingestion(core, vector_store, specs):
+    from app.loaders import load_files_parallel
+
+    counts = {"documents": 0, "chunks": 0}
+
+    def all_chunks():
+        for index, documents, error in load_files_parallel(specs):
+            if error is not None:
+                raise error
+            chunks = core.split_documents_by_type(documents, chunk_size=2000, chunk_overlap=400)
+            vector_store.assign_chunk_ids(index + 1, chunks)
+            counts["documents"] += len(documents)
+            counts["chunks"] += len(chunks)
+            yield from chunks
+
+    start = time.perf_counter()
+    vector_store.create_vector_store(all_chunks())
+    elapsed = time.perf_counter() - start
+    peak, peak_children = rss_mb()
+    return {
+        "files": len(specs),
+        "documents": counts["documents"],
+        "chunks": counts["chunks"],
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(len(specs) / elapsed, 2),
+        "docs_per_s": round(counts["documents"] / elapsed, 2),
+        "chunks_per_s": round(counts["chunks"] / elapsed, 2),
+        "peak_rss_mb": round(peak, 1),
+        "peak_child_rss_mb": round(peak_children, 1),
+    }
+
+
+def bench_retrieval(core, vector_store, queries):
+    pipeline = core.get_pipeline()
+    latencies = []
+    stages = {}
+    for query in queries:
+        timings = {}
+        start = time.perf_counter()
+        vector_store.hybrid_retrieve(query, pipeline.vector_store, pipeline.embeddings, top_k=6, timings=timings)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for stage, ms in timings.items():
+            if stage != "total_ms":
+                stages.setdefault(stage[:-3], []).append(ms)
+    result = summarize(latencies)
+    result["stages_p50_ms"] = {
+        stage: round(float(np.percentile(values, 50)), 2) for stage, values in stages.items()
+    }
+    return result
+
+
+def bench_responses(core, queries, concurrency, mode):
+    def full(n, query):
+        start = time.perf_counter()
+        answer = core.get_response(query, f"bench-{n}")
+        return (time.perf_counter() - start) * 1000, None, ERROR_MARKER in answer
+
+    def stream(n, query):
+        start = time.perf_counter()
+        first = None
+        parts = []
+        for text in core.stream_response(query, f"bench-{n}"):
+            if first is None:
+                first = (time.perf_counter() - start) * 1000
+            parts.append(text)
+        return (time.perf_counter() - start) * 1000, first, ERROR_MARKER in "".join(parts)
+
+    run = full if mode == "full" else stream
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(run, range(len(queries)), queries))
+    wall = time.perf_counter() - start
+    result = {"mode": mode, "concurrency": concurrency}
+    result.update(summarize([total for total, _, _ in outcomes]))
+    if mode == "stream":
+        result["first_chunk"] = summarize([first for _, first, _ in outcomes if first is not None])
+    result["errors"] = sum(1 for _, _, failed in outcomes if failed)
+    result["throughput_rps"] = round(len(queries) / wall, 2)
+    return result
+
+
+# Metrics compared between runs, and whether higher values are better
+COMPARED = {
+    "docs_per_s": True, "chunks_per_s": True, "throughput_rps": True,
+    "p50_ms": False, "p99_ms": False, "peak_rss_mb": False,
+}
+
+
+def flatten(results):
+    metrics = {}
+    for entry in results.get("ingestion", []):
+        for name in ("docs_per_s", "chunks_per_s", "peak_rss_mb"):
+            metrics[f"ingestion {entry['size_mb']}MB {name}"] = entry[name]
+    for entry in results.get("retrieval", []):
+        for name in ("p50_ms", "p99_ms"):
+            metrics[f"retrieval {entry['size_mb']}MB {name}"] = entry.get(name)
+    for entry in results.get("response", []):
+        for name in ("p50_ms", "p99_ms", "throughput_rps"):
+            metrics[f"response {entry['mode']} c={entry['concurrency']} {name}"] = entry.get(name)
+    return metrics
+
+
+def compare(baseline, results, max_regression):
+    """
+    Print the change of every metric against a previous run. Returns the
+    metrics that got worse by more than max_regression percent.
+    """
+    before, after = flatten(baseline), flatten(results)
+    regressions = []
+    print(f"\nCompared with {baseline.get('meta', {}).get('commit') or 'baseline'}:")
+    for key, value in after.items():
+        old = before.get(key)
+        if not old or value is None:
+            continue
+        change = (value - old) / old * 100
+        higher_is_better = COMPARED[key.rsplit(" ", 1)[1]]
+        worse = -change if higher_is_better else change
+        flag = ""
+        if max_regression is not None and worse > max_regression:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"  {key:<40} {old:>10.2f} -> {value:>10.2f} ({change:+.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mix", default="pdf=1,txt=1,csv=1", help="Share of the corpus per file type")
+    parser.add_argument("--file-kb", type=float, default=256)
+    parser.add_argument("--queries", type=int, default=100, help="Queries per retrieval measurement")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modes", nargs="+", choices=["full", "stream"], default=["full", "stream"])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency-ms", type=float, default=80)
+    parser.add_argument("--embed-jitter-ms", type=float, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=600)
+    parser.add_argument("--llm-jitter-ms", type=float, default=150)
+    parser.add_argument("--llm-token-ms", type=float, default=8)
+    parser.add_argument("--llm-answer-tokens", type=int, default=120)
+    parser.add_argument("--rerank-latency-ms", type=float, default=150)
+    parser.add_argument("--rerank-jitter-ms", type=float, default=40)
+    parser.add_argument("--trace-log", action="store_true", help="Keep the per-request JSON span logs")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, help="Exit 1 if a metric is this many percent worse")
+    args = parser.parse_args()
+    # Paths are taken relative to where the benchmark was started
+    json_path = os.path.abspath(args.json) if args.json else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix="ppb-bench-")
+    os.chdir(workdir)
+    rerank = FakeRerankServer(latency_ms=args.rerank_latency_ms, jitter_ms=args.rerank_jitter_ms).start()
+    core, models, vector_store, fake_embed = load_app(args, rerank.url)
+    from app.faiss_index import index_config_from_env
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "index_config": index_config_from_env(),
+            "args": vars(args),
+        },
+        "ingestion": [],
+        "retrieval": [],
+        "response": [],
+    }
+    mix = parse_mix(args.mix)
+    queries = make_queries(max(args.queries, args.requests))
+    try:
+        for size_mb in args.sizes_mb:
+            print(f"Generating {size_mb:g} MB corpus...")
+            specs = make_corpus(os.path.join(workdir, f"corpus_{size_mb:g}mb"), size_mb, mix, args.file_kb)
+
+            clear_caches(core, models, vector_store)
+            ingestion = {"size_mb": size_mb, **bench_ingestion(core, vector_store, specs)}
+            results["ingestion"].append(ingestion)
+            print(
+                f"  ingestion: {ingestion['files']} files, {ingestion['documents']} documents, "
+                f"{ingestion['chunks']} chunks in {ingestion['seconds']:.1f}s "
+                f"({ingestion['docs_per_s']:.0f} docs/s, {ingestion['chunks_per_s']:.0f} chunks/s), "
+                f"peak RSS {ingestion['peak_rss_mb']:.0f} MB"
+            )
+
+            core.reload_pipeline()
+            clear_caches(core, models, vector_store)
+            retrieval = {"size_mb": size_mb, "chunks": ingestion["chunks"]}
+            retrieval.update(bench_retrieval(core, vector_store, queries[:args.queries]))
+            results["retrieval"].append(retrieval)
+            print(
+                f"  hybrid_retrieve: p50 {retrieval['p50_ms']:.1f} ms, p99 {retrieval['p99_ms']:.1f} ms "
+                f"(stage p50s: {retrieval['stages_p50_ms']})"
+            )
+
+        print(f"get_response on the {args.sizes_mb[-1]:g} MB corpus:")
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                clear_caches(core, models, vector_store)
+                response = bench_responses(core, queries[:args.requests], concurrency, mode)
+                results["response"].append(response)
+                first = response.get("first_chunk", {})
+                print(
+                    f"  {mode:<6} c={concurrency:<3} p50 {response['p50_ms']:.0f} ms, "
+                    f"p99 {response['p99_ms']:.0f} ms, {response['throughput_rps']:.1f} req/s"
+                    + (f", first chunk p50 {first['p50_ms']:.0f} ms" if first.get("count") else "")
+                    + (f", {response['errors']} errors" if response["errors"] else "")
+                )
+    finally:
+        rerank.stop()
+        os.chdir(ROOT)
+        if args.keep:
+            print(f"Working directory kept: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    peak, peak_children = rss_mb()
+    results["peak_rss_mb"] = round(peak, 1)
+    results["peak_child_rss_mb"] = round(peak_children, 1)
+    results["backend_calls"] = {"embed_requests": fake_embed.calls, "rerank_requests": rerank.requests}
+    print(f"Peak RSS: {peak:.0f} MB (parser processes {peak_children:.0f} MB)")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    regressions = []
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.max_regression)
+    if regressions:
+        print(f"FAIL: {len(regressions)} metric(s) regressed by more than {args.max_regression:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
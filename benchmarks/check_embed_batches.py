@@ -0,0 +1,106 @@
+"""
+Check app.models.embed_in_batches against the fake embedding backend:
+results come back in input order when batches complete out of order, a
+batch that fails a few times is retried until it succeeds, and a batch
+that keeps failing fails the call without starting the batches still
+queued behind it.
+
+Usage:
+    python benchmarks/check_embed_batches.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models import embed_in_batches  # noqa: E402
+from fakes import FakeNomicEmbed, hashed_vector  # noqa: E402
+
+DIM = 16
+BATCH_SIZE = 4
+
+
+def make_texts(count):
+    return [f"teks {n}" for n in range(count)]
+
+
+def expected(texts):
+    return [hashed_vector(text, DIM).tolist() for text in texts]
+
+
+def check_out_of_order():
+    fake = FakeNomicEmbed(dim=DIM, latency_ms=0, jitter_ms=0)
+    texts = make_texts(8 * BATCH_SIZE)
+    finished = []
+    lock = threading.Lock()
+
+    def embed_fn(batch):
+        # Earlier batches take longer, so they complete last
+        position = texts.index(batch[0]) // BATCH_SIZE
+        time.sleep(0.02 * (8 - position))
+        vectors = fake.text(batch)["embeddings"]
+        with lock:
+            finished.append(position)
+        return vectors
+
+    progress = []
+    vectors = embed_in_batches(
+        texts, embed_fn, batch_size=BATCH_SIZE, max_workers=8,
+        progress_callback=lambda done, total: progress.append((done, total)),
+    )
+    assert finished != sorted(finished), f"batches completed in order: {finished}"
+    assert vectors == expected(texts), "vectors not returned in input order"
+    assert progress == [(n, 8) for n in range(1, 9)], f"unexpected progress: {progress}"
+
+
+def check_retry_then_succeed():
+    texts = make_texts(6 * BATCH_SIZE)
+    flaky = texts[2 * BATCH_SIZE]
+    fake = FakeNomicEmbed(dim=DIM, latency_ms=5, jitter_ms=2, fail_batches={flaky: 2})
+    vectors = embed_in_batches(
+        texts, lambda batch: fake.text(batch)["embeddings"],
+        batch_size=BATCH_SIZE, max_workers=3, max_retries=3, backoff=0.01,
+    )
+    assert vectors == expected(texts), "vectors wrong after retries"
+    assert fake.failures == 2, f"expected 2 injected failures, got {fake.failures}"
+    assert fake.calls == 6 + 2, f"expected 8 requests, got {fake.calls}"
+
+
+def check_give_up():
+    texts = make_texts(5 * BATCH_SIZE)
+    fake = FakeNomicEmbed(dim=DIM, latency_ms=5, jitter_ms=0, fail_batches={texts[0]: -1})
+    try:
+        # One worker: the failing first batch runs while the others wait
+        embed_in_batches(
+            texts, lambda batch: fake.text(batch)["embeddings"],
+            batch_size=BATCH_SIZE, max_workers=1, max_retries=2, backoff=0.01,
+        )
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("embed_in_batches did not fail")
+    assert fake.failures == 3, f"expected 1 + 2 retries, got {fake.failures} attempts"
+    # The worker may pick up the next batch before the rest are cancelled,
+    # but the three still queued behind it must never be sent
+    assert fake.calls <= 3 + 1, f"queued batches were still sent ({fake.calls} requests)"
+
+
+def main():
+    failed = False
+    for check in (check_out_of_order, check_retry_then_succeed, check_give_up):
+        try:
+            check()
+            print(f"ok      {check.__name__}")
+        except AssertionError as e:
+            failed = True
+            print(f"FAILED  {check.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
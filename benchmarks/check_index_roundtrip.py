@@ -0,0 +1,139 @@
+"""
+Check the index write path end to end with the real FAISS wrapper and the
+SQLite chunk store, for every FAISS_INDEX_TYPE: build and publish an index
+(create_vector_store), load it read-only and search it, add a file
+(upsert_file_chunks), delete a file (delete_file_chunks) without changing
+the stored vectors of the others, and finally delete every file, which
+removes the index. Embeddings come from the fake
+Nomic backend (see fakes.py); everything runs in a temporary directory.
+
+Usage:
+    python benchmarks/check_index_roundtrip.py [--types flat ivf_flat hnsw ivf_pq]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeNomicEmbed, make_queries  # noqa: E402
+
+DIM = 64
+CHUNKS_PER_FILE = 120
+
+
+def make_chunks(Document, file_id):
+    texts = make_queries(CHUNKS_PER_FILE, seed=file_id)
+    return [
+        Document(
+            page_content=f"berkas{file_id} bagian{n} {text}",
+            metadata={"source": f"file{file_id}.txt", "file_type": "txt"},
+        )
+        for n, text in enumerate(texts)
+    ]
+
+
+def stored_vectors(store):
+    from app.faiss_index import reconstruct_vectors
+
+    positions = sorted(store.index_to_docstore_id)
+    vectors = reconstruct_vectors(store.index, positions)
+    return {store.index_to_docstore_id[pos]: vector for pos, vector in zip(positions, vectors)}
+
+
+def check_type(index_type):
+    from app.langchain_compat import Document
+    from app.models import load_embedding_model
+    import app.vector_store as vs
+
+    os.environ["FAISS_INDEX_TYPE"] = index_type
+    embeddings = load_embedding_model()
+    files = {file_id: make_chunks(Document, file_id) for file_id in (1, 2, 3)}
+
+    def tagged(file_ids):
+        for file_id in file_ids:
+            vs.assign_chunk_ids(file_id, files[file_id])
+            yield from files[file_id]
+
+    def loaded(expected_files):
+        store = vs.load_vector_store(embeddings)
+        assert store is not None, "published index did not load"
+        expected = CHUNKS_PER_FILE * len(expected_files)
+        assert store.index.ntotal == expected, f"{store.index.ntotal} vectors, expected {expected}"
+        assert store.docstore.validate(store.index.ntotal) == [], store.docstore.validate(store.index.ntotal)
+        assert sorted(store.docstore.file_chunks()) == sorted(expected_files)
+        for file_id in expected_files:
+            probe = files[file_id][7]
+            hits = vs._semantic_search_ids(probe.page_content, store, embeddings, 3)
+            assert probe.metadata["chunk_id"] in hits, f"file {file_id}: chunk not found by its own text"
+            keyword_hits = vs._keyword_search_ids(f"berkas{file_id} bagian7", store, 3)
+            assert keyword_hits and keyword_hits[0] == probe.metadata["chunk_id"], (
+                f"file {file_id}: keyword search returned {keyword_hits}"
+            )
+        return store
+
+    vs.create_vector_store(tagged([1, 2]))
+    loaded([1, 2])
+    vs.upsert_file_chunks({3: files[3]})
+    before = stored_vectors(loaded([1, 2, 3]))
+    vs.delete_file_chunks([1])
+    store = loaded([2, 3])
+    after = stored_vectors(store)
+    # Deleting must not re-encode the vectors that stay (lossy for ivf_pq)
+    changed = [chunk_id for chunk_id, vector in after.items() if not np.array_equal(vector, before[chunk_id])]
+    assert not changed, f"{len(changed)} remaining vectors changed by the delete"
+    stale = [hit for hit in vs._keyword_search_ids("berkas1 bagian7", store, 3) if hit.startswith("kb1-")]
+    assert not stale, f"deleted chunks still found by keyword: {stale}"
+    vs.delete_file_chunks([2, 3])
+    assert vs.get_index_version() == "none", "index not removed after its last file"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--types", nargs="+", default=["flat", "ivf_flat", "hnsw", "ivf_pq"])
+    args = parser.parse_args()
+
+    os.environ.update({
+        "NOMIC_API_KEY": "check",
+        "EMBEDDING_CACHE_PATH": "",
+        "TRACE_LOG": "false",
+        # Small enough to train IVF indexes on a few hundred chunks
+        "FAISS_NLIST": "4",
+        "FAISS_NPROBE": "4",
+        "FAISS_TRAIN_SIZE": "200",
+        "FAISS_PQ_M": "8",
+        "FAISS_PQ_NBITS": "4",
+    })
+    import app.models as models
+    models.embed = FakeNomicEmbed(dim=DIM, latency_ms=0, jitter_ms=0)
+
+    failed = False
+    workdir = tempfile.mkdtemp(prefix="index-check-")
+    cwd = os.getcwd()
+    try:
+        for index_type in args.types:
+            # The index lives in a relative vector_db/
+            os.makedirs(os.path.join(workdir, index_type))
+            os.chdir(os.path.join(workdir, index_type))
+            try:
+                check_type(index_type)
+                print(f"ok      {index_type}")
+            except AssertionError as e:
+                failed = True
+                print(f"FAILED  {index_type}: {e}")
+            finally:
+                os.chdir(cwd)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
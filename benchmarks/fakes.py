@@ -0,0 +1,383 @@
+"""
+Offline stand-ins for the external services, and a synthetic corpus, for
+the benchmarks in this directory. Nothing here touches the network.
+
+- FakeNomicEmbed replaces the `nomic.embed` module used by
+  NomicAtlasEmbeddings, so batching, retries and caches still run.
+- FakeChatModel is a LangChain chat model that answers from the prompt's
+  <context>, token by token when streamed.
+- FakeRerankServer is a local HTTP server speaking the Jina rerank API;
+  point JINA_RERANK_URL at it to exercise the real client and its pool.
+- make_corpus writes Indonesian-like PDF, TXT and CSV files.
+
+Every backend takes a latency and a jitter in milliseconds. Delays and
+outputs are derived from the input, so two runs over the same corpus and
+queries sleep and answer the same.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ordered roughly by frequency: words are drawn with Zipf-like weights, so
+# BM25 sees common and rare terms like in the real documents
+WORDS = (
+    "dan yang untuk di dengan dari ini pada dalam tidak akan atau "
+    "mahasiswa layanan tes bahasa pendaftaran peserta biaya jadwal "
+    "sertifikat ujian kursus inggris arab toefl toafl nilai syarat "
+    "program pusat pengembangan universitas islam negeri jakarta "
+    "dosen pegawai umum kelas ruang gedung lantai hari senin selasa "
+    "rabu kamis jumat pagi siang sore pukul formulir pembayaran "
+    "rekening bank transfer bukti kartu identitas foto berwarna "
+    "hasil diumumkan minggu kerja setelah sebelum paling lambat "
+    "wajib membawa mengisi mengikuti menyerahkan melalui laman resmi "
+    "informasi lebih lanjut hubungi admin surel telepon kantor "
+    "penerjemahan dokumen ijazah transkrip abstrak skripsi tesis "
+    "disertasi proofreading legalisasi halaman rupiah gratis diskon "
+    "alumni fakultas jurusan semester gelombang kuota terbatas "
+    "daring luring ruangan pengawas tata tertib pelanggaran sanksi "
+    "listening structure reading writing speaking percakapan tingkat "
+    "dasar menengah lanjut intensif reguler pertemuan modul materi"
+).split()
+
+QUESTION_STARTS = (
+    "berapa", "bagaimana cara", "kapan", "di mana", "apa syarat",
+    "apakah", "siapa yang", "jelaskan",
+)
+
+_WEIGHTS = [1.0 / (rank + 1) ** 0.8 for rank in range(len(WORDS))]
+
+
+def _seed(*parts: Any) -> int:
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _sleep(latency_ms: float, jitter_ms: float, key: Any) -> None:
+    # Deterministic per input: the same call always takes the same time
+    if latency_ms <= 0 and jitter_ms <= 0:
+        return
+    rng = random.Random(_seed("delay", key))
+    delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+def sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, weights=_WEIGHTS, k=rng.randint(8, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(3, 6)))
+
+
+def make_queries(count: int, seed: int = 1) -> List[str]:
+    """
+    Return distinct user-style questions over the corpus vocabulary.
+    """
+    rng = random.Random(seed)
+    queries = []
+    seen = set()
+    while len(queries) < count:
+        # Skip the stop words at the head of the list for the topic words
+        words = rng.choices(WORDS[12:], weights=_WEIGHTS[12:], k=rng.randint(3, 6))
+        query = f"{rng.choice(QUESTION_STARTS)} {' '.join(words)}?"
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+    return queries
+
+
+def _write_txt(path: str, size: int, rng: random.Random) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < size:
+            text = paragraph(rng) + "\n\n"
+            f.write(text)
+            written += len(text)
+
+
+def _write_csv(path: str, size: int, rng: random.Random) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Layanan", "Kategori", "Biaya", "Jadwal", "Keterangan"])
+        written = 0
+        while written < size:
+            row = [
+                " ".join(rng.choices(WORDS[12:], weights=_WEIGHTS[12:], k=3)).title(),
+                rng.choice(["Tes", "Kursus", "Penerjemahan", "Sertifikat"]),
+                f"Rp{rng.randint(5, 150) * 5000:,}".replace(",", "."),
+                f"{rng.choice(['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat'])} pukul {rng.randint(7, 16):02d}.00",
+                sentence(rng),
+            ]
+            writer.writerow(row)
+            written += sum(len(value) for value in row) + 5
+
+
+def _write_pdf(path: str, size: int, rng: random.Random, page_chars: int = 3000) -> None:
+    import fitz  # PyMuPDF, already required for loading PDFs
+
+    doc = fitz.open()
+    written = 0
+    while written < size:
+        text = ""
+        while len(text) < page_chars:
+            text += paragraph(rng) + "\n\n"
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=8)
+        written += len(text)
+    doc.save(path)
+    doc.close()
+
+
+_WRITERS = {"pdf": _write_pdf, "txt": _write_txt, "csv": _write_csv}
+
+
+def make_corpus(
+    directory: str,
+    size_mb: float,
+    mix: Dict[str, float],
+    file_kb: float = 256,
+    seed: int = 0,
+) -> List[Tuple[str, str, str]]:
+    """
+    Write a synthetic knowledge base of about size_mb of text.
+
+    Args:
+        directory: Where to write the files
+        size_mb: Total text size; split between file types by mix
+        mix: Share of the text per file type, e.g. {"pdf": 1, "txt": 1, "csv": 1}
+        file_kb: Text size per file
+        seed: Corpus seed; the same seed gives the same files
+
+    Returns:
+        List[Tuple[str, str, str]]: (path, filetype, name) per file, as
+        taken by app.loaders.load_files_parallel
+    """
+    os.makedirs(directory, exist_ok=True)
+    total_share = sum(mix.values())
+    file_size = int(file_kb * 1024)
+    specs = []
+    for filetype, share in mix.items():
+        budget = int(size_mb * 1024 * 1024 * share / total_share)
+        for n in range(max(1, round(budget / file_size)) if budget else 0):
+            name = f"{filetype}_{n:05d}.{filetype}"
+            path = os.path.join(directory, name)
+            rng = random.Random(_seed(seed, filetype, n))
+            _WRITERS[filetype](path, min(file_size, budget), rng)
+            specs.append((path, filetype, name))
+    return specs
+
+
+# ---------------------------------------------------------------------------
+# Embeddings (Nomic)
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=65536)
+def _token_slot(token: str, dim: int) -> Tuple[int, float]:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+def hashed_vector(text: str, dim: int) -> np.ndarray:
+    """
+    Bag-of-words vector by feature hashing, L2-normalized: texts sharing
+    words are near each other, so semantic search returns sensible hits.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _tokens(text):
+        slot, sign = _token_slot(token, dim)
+        vector[slot] += sign
+    norm = float(np.linalg.norm(vector))
+    if norm:
+        vector /= norm
+    return vector
+
+
+class FakeNomicEmbed:
+    """
+    Drop-in for `nomic.embed`: text(texts, model) returns
+    {"embeddings": [...]} after a latency per request (i.e. per batch).
+
+    fail_batches injects failures: it maps the first text of a batch to the
+    number of requests for that batch which fail before one succeeds (-1
+    fails every time).
+    """
+
+    def __init__(self, dim: int = 768, latency_ms: float = 80, jitter_ms: float = 20,
+                 fail_batches: Optional[Dict[str, int]] = None):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_batches = dict(fail_batches or {})
+        self.calls = 0
+        self.texts = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def text(self, texts: Sequence[str], model: str = "", **kwargs: Any) -> Dict[str, Any]:
+        first = texts[0] if texts else ""
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            remaining = self.fail_batches.get(first, 0)
+            if remaining:
+                self.fail_batches[first] = remaining - 1 if remaining > 0 else remaining
+                self.failures += 1
+        _sleep(self.latency_ms, self.jitter_ms, (model, first, len(texts)))
+        if remaining:
+            raise ConnectionError(f"injected failure for batch starting {first!r}")
+        return {"embeddings": [hashed_vector(text, self.dim).tolist() for text in texts]}
+
+
+# ---------------------------------------------------------------------------
+# LLM (Gemini)
+# ---------------------------------------------------------------------------
+
+def make_fake_chat_model(
+    latency_ms: float = 600,
+    jitter_ms: float = 150,
+    token_ms: float = 8,
+    answer_tokens: int = 120,
+):
+    """
+    Return a LangChain chat model that waits latency_ms (+/- jitter) for the
+    first token, then token_ms per token, and answers with words from the
+    prompt's <context>. Built on demand so importing this module does not
+    need langchain.
+    """
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    def answer_words(messages) -> Tuple[List[str], str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        match = re.search(r"<context>(.*?)</context>", prompt, re.S)
+        context = (match.group(1) if match else prompt).split()
+        words = ["###", "Jawaban\n\n"] + context[:answer_tokens] + ["\n\nAda", "lagi", "yang", "ingin", "ditanyakan?"]
+        return words, prompt
+
+    class FakeChatModel(BaseChatModel):
+        first_token_ms: float = 600
+        jitter_ms: float = 150
+        token_ms: float = 8
+
+        @property
+        def _llm_type(self) -> str:
+            return "fake-benchmark"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            words, prompt = answer_words(messages)
+            _sleep(self.first_token_ms + self.token_ms * len(words), self.jitter_ms, prompt)
+            message = AIMessage(
+                content=" ".join(words),
+                usage_metadata={
+                    "input_tokens": len(prompt) // 4,
+                    "output_tokens": len(words),
+                    "total_tokens": len(prompt) // 4 + len(words),
+                },
+            )
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+            words, prompt = answer_words(messages)
+            _sleep(self.first_token_ms, self.jitter_ms, prompt)
+            for n, word in enumerate(words):
+                if n:
+                    time.sleep(self.token_ms / 1000)
+                text = word if n == len(words) - 1 else word + " "
+                # BaseChatModel.stream reports each chunk to the callbacks
+                yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    return FakeChatModel(first_token_ms=latency_ms, jitter_ms=jitter_ms, token_ms=token_ms)
+
+
+# ---------------------------------------------------------------------------
+# Rerank (Jina)
+# ---------------------------------------------------------------------------
+
+class FakeRerankServer:
+    """
+    Local HTTP server implementing POST /v1/rerank: documents are scored by
+    the share of query words they contain.
+    """
+
+    def __init__(self, latency_ms: float = 150, jitter_ms: float = 40):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                body = json.dumps(server.rerank(payload)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/rerank"
+
+    def rerank(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        query = payload.get("query", "")
+        documents = payload.get("documents", [])
+        _sleep(self.latency_ms, self.jitter_ms, (query, len(documents)))
+        query_tokens = set(_tokens(query))
+        scores = []
+        for index, document in enumerate(documents):
+            tokens = set(_tokens(document))
+            score = len(query_tokens & tokens) / len(query_tokens) if query_tokens else 0.0
+            scores.append((score, index))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        top_n = int(payload.get("top_n") or len(documents))
+        return {
+            "model": payload.get("model"),
+            "results": [
+                {"index": index, "relevance_score": score} for score, index in scores[:top_n]
+            ],
+        }
+
+    def start(self) -> "FakeRerankServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-rerank", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -1,122 +1,25 @@
 import os
-import pandas as pd
-from langchain_community.document_loaders import PyMuPDFLoader
-from app.vector_store import create_vector_store
-from app.langchain_compat import Document, RecursiveCharacterTextSplitter
+from app.vector_store import assign_chunk_ids, create_vector_store, delete_index, get_index_version
+from app.loaders import load_files_parallel
+from app.langchain_compat import RecursiveCharacterTextSplitter
+from app.models import db, KnowledgeBaseFile
+from app.core import mark_files_embedded
+from app.file_utils import file_fingerprint, hash_file
 
-def load_csv_file(file_path):
+def find_documents():
     """
-    Load a CSV file and convert it to documents.
-    Handles CSV files with quoted outer strings.
+    List the supported files in the documents folder.
     
-    Args:
-        file_path: Path to the CSV file
-        
     Returns:
-        list: List of Document objects
-    """
-    try:
-        import csv
-        from io import StringIO
-        
-        documents = []
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        if not lines:
-            print(f"CSV file {file_path} is empty")
-            return []
-        
-        # Extract and unquote headers from first line
-        header_line = lines[0].strip()
-        # Remove outer quotes if present
-        if header_line.startswith('"') and header_line.endswith('"'):
-            header_line = header_line[1:-1]
-        headers = [h.strip() for h in header_line.split(',')]
-        print(f"  Headers detected: {headers}")
-        
-        # Process data rows (skip header)
-        for row_num, line in enumerate(lines[1:], start=2):
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Remove outer quotes if present
-            if line.startswith('"') and line.endswith('"'):
-                line = line[1:-1]
-            
-            # Parse CSV line respecting quotes
-            try:
-                reader = csv.reader(StringIO(line))
-                values = next(reader)
-            except:
-                # Fallback: simple split
-                values = line.split(',')
-            
-            # Map headers to values
-            row_text = ""
-            for i, header in enumerate(headers):
-                if i < len(values):
-                    value = values[i].strip().strip('"')  # Remove quotes
-                    if value:
-                        row_text += f"{header}: {value}\n"
-            
-            if row_text.strip():
-                metadata = {
-                    "source": os.path.basename(file_path),
-                    "row": row_num,
-                    "file_type": "csv"
-                }
-                
-                documents.append(Document(
-                    page_content=row_text.strip(),
-                    metadata=metadata
-                ))
-        
-        print(f"Loaded CSV: {os.path.basename(file_path)} ({len(documents)} rows)")
-        return documents
-        
-    except Exception as e:
-        print(f"Error loading CSV file {file_path}: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
-
-def load_pdf_file(file_path):
-    try:
-        loader = PyMuPDFLoader(file_path)
-        docs = loader.load()
-        print(f"Loaded PDF: {os.path.basename(file_path)} ({len(docs)} pages)")
-        return docs
-    except Exception as e:
-        print(f"Error loading PDF file {file_path}: {e}")
-        return []
-
-def load_txt_file(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-            return [Document(page_content=text, metadata={"source": os.path.basename(file_path), "file_type": "txt"})]
-    except Exception as e:
-        print(f"Error loading TXT file {file_path}: {e}")
-        return []
-
-def load_documents():
+        list: File names of the documents to ingest
     """
-    Load documents from the documents folder.
-    
-    Returns:
-        list: List of loaded documents
-    """
-    documents = []
     documents_dir = "documents"
     
     if not os.path.exists(documents_dir):
         print(f"Documents directory '{documents_dir}' not found. Creating it...")
         os.makedirs(documents_dir, exist_ok=True)
         print(f"Please add your documents (PDF, TXT, CSV) to the '{documents_dir}' folder and run this script again.")
-        return documents
+        return []
     
     # Get all files in the documents directory
     files = [f for f in os.listdir(documents_dir) if f.endswith(('.pdf', '.txt', '.csv'))]
@@ -124,29 +27,67 @@ def load_documents():
     if not files:
         print(f"No documents found in '{documents_dir}' folder.")
         print("Please add your documents (PDF, TXT, CSV) to the documents folder and run this script again.")
-        return documents
+        return files
     
     print(f"Found {len(files)} document(s): {files}")
+    return files
+
+def register_files(files):
+    """
+    Return the knowledge base record of each file, adding records for files
+    copied into the documents folder without an upload, so their chunks can
+    be tagged like those of the embedding jobs.
     
-    # Load files based on their type
+    Returns:
+        list: KnowledgeBaseFile per file, in the same order
+    """
+    kb_files = []
     for file in files:
-        file_path = os.path.join(documents_dir, file)
-        try:
-            if file.endswith('.pdf'):
-                docs = load_pdf_file(file_path)
-                for d in docs:
-                    d.metadata["file_type"] = "pdf"
-                documents.extend(docs)
-            elif file.endswith('.txt'):
-                docs = load_txt_file(file_path)
-                documents.extend(docs)
-            elif file.endswith('.csv'):
-                docs = load_csv_file(file_path)
-                documents.extend(docs)
-        except Exception as e:
-            print(f"Error loading {file}: {e}")
+        filepath = os.path.join("documents", file)
+        kb_file = KnowledgeBaseFile.query.filter_by(filepath=filepath).first()
+        if kb_file is None:
+            kb_file = KnowledgeBaseFile(
+                filename=file,
+                filetype=file.rsplit('.', 1)[1].lower(),
+                filepath=filepath,
+                filehash=hash_file(filepath)
+            )
+            kb_file.set_fingerprint(file_fingerprint(filepath))
+            db.session.add(kb_file)
+            print(f"Registered {file} in the knowledge base")
+        kb_files.append(kb_file)
+    db.session.commit()
+    return kb_files
+
+def iter_documents(files, file_ids=None):
+    """
+    Load the given files from the documents folder, one file at a time.
+    
+    Args:
+        files: File names in the documents folder
+        file_ids: Optional KnowledgeBaseFile IDs of the files, in the same order
+    
+    Yields:
+        tuple: (file ID or None, documents) of each successfully loaded file
+    """
+    # Load files based on their type, parsing them in parallel
+    specs = [(os.path.join("documents", file), file.rsplit('.', 1)[1], file) for file in files]
+    for index, docs, error in load_files_parallel(specs):
+        file = files[index]
+        if error is not None:
+            print(f"Error loading {file}: {error}")
+            continue
+        print(f"Loaded {specs[index][1].upper()}: {file} ({len(docs)} documents)")
+        yield (file_ids[index] if file_ids else None), docs
+
+def load_documents():
+    """
+    Load documents from the documents folder.
     
-    return documents
+    Returns:
+        list: List of loaded documents
+    """
+    return [doc for _, docs in iter_documents(find_documents()) for doc in docs]
 
 def split_documents_by_type(documents):
     csv_docs = [doc for doc in documents if doc.metadata.get("file_type") == "csv"]
@@ -187,28 +128,46 @@ def main():
     """
     Main function to process documents and create vector store.
     """
+    # The web app's database holds the knowledge base file records
+    from main import app
+    with app.app_context():
+        ingest()
+
+def ingest():
+    """
+    Build the vector store from the documents folder; must run inside an
+    application context.
+    """
     print("Starting document ingestion process...")
     
-    # Load documents
-    documents = load_documents()
-    if not documents:
-        # If no documents, delete the vector DB directory if it exists
-        import shutil
-        vector_db_path = os.path.join("vector_db", "faiss_index")
-        if os.path.exists(vector_db_path):
+    files = find_documents()
+    if not files:
+        # If no documents, delete the vector DB if it exists
+        if get_index_version() != "none":
             print("No documents found. Deleting vector DB...")
-            shutil.rmtree(vector_db_path)
+            delete_index()
             print("Vector DB deleted.")
         else:
             print("No documents and no vector DB to delete.")
         return
     
-    # Split documents into chunks
-    chunks = split_documents_by_type(documents)
+    kb_files = register_files(files)
+    loaded = []
+    
+    # Load, split and embed file by file so only a few batches of chunks
+    # are in memory at any time; chunks are tagged with their file, as
+    # incremental embedding expects
+    def chunks():
+        for file_id, docs in iter_documents(files, [f.id for f in kb_files]):
+            file_chunks = split_documents_by_type(docs)
+            assign_chunk_ids(file_id, file_chunks)
+            loaded.append(file_id)
+            yield from file_chunks
     
     # Create vector store
     print("Creating vector store...")
-    create_vector_store(chunks)
+    create_vector_store(chunks())
+    mark_files_embedded([f for f in kb_files if f.id in loaded])
     
     print("Vector store created successfully!")
 
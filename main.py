@@ -1,17 +1,21 @@
-from flask import Flask, request, render_template, jsonify, redirect, flash
-from app.core import get_response, get_system_info, get_embedding_progress, get_file_status, split_documents_by_type
+from flask import Flask, request, render_template, jsonify, redirect, flash, Response
+from app.core import get_response, stream_response, get_system_info, get_file_status, get_kb_status, split_documents_by_type, reload_pipeline
+from app.embedding_jobs import cancel_embedding, get_embedding_progress, run_worker, start_embedding
+from app.events import ChangeFeed, notify_change
+from app.metrics import render_metrics
+from app.tracing import TRACE_DEBUG, new_request_id, trace
 import os
 from dotenv import load_dotenv, find_dotenv
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from app.models import db, AdminUser, KnowledgeBaseFile
+from app.models import db, AdminUser, KnowledgeBaseFile, ensure_schema
+from app.file_utils import file_fingerprint, move_into_place, stream_to_temp_file
+from app.vector_store import delete_index
 import click
 from werkzeug.utils import secure_filename
-import hashlib
-from langchain_community.document_loaders import PyMuPDFLoader
-from app.langchain_compat import Document
-import pandas as pd
-import io
+from app.loaders import load_pdf, load_csv, txt_document
+import hmac
+import json
 
 load_dotenv()
 import os
@@ -24,6 +28,8 @@ app.config['UPLOAD_FOLDER'] = 'documents'
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32 MB
 
 db.init_app(app)
+with app.app_context():
+    ensure_schema()
 login_manager = LoginManager()
 login_manager.login_view = 'admin_login'
 login_manager.init_app(app)
@@ -60,6 +66,17 @@ def health_check():
         "language": "Indonesian"
     }
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, cache and error counters.
+    Requires `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/', methods=['GET'])
 def home():
     """
@@ -131,6 +148,12 @@ def init_db(username, password):
         db.session.commit()
         print(f'Admin user {username} created.')
 
+@app.cli.command('embed-worker')
+@click.option('--once', is_flag=True, help='Exit when no job is left instead of waiting for new ones')
+def embed_worker(once):
+    """Run queued embedding jobs."""
+    run_worker(app, once=once)
+
 # Admin login
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -180,20 +203,36 @@ def admin_dashboard():
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            # Calculate file hash (re-open file after saving)
-            with open(filepath, 'rb') as f:
-                filehash = hashlib.sha256(f.read()).hexdigest()
+            if os.path.exists(filepath) or KnowledgeBaseFile.query.filter_by(filepath=filepath).first():
+                print('File with the same name already exists')
+                return render_template(
+                    'admin_dashboard.html',
+                    user=current_user,
+                    files=files,
+                    error='A file with the same name already exists')
+            # Stream the upload to a temp file, hashing it in the same pass
+            tmp_path, filehash = stream_to_temp_file(file.stream, app.config['UPLOAD_FOLDER'])
             filetype = filename.rsplit('.', 1)[1].lower()
-            # Check if file already exists (by hash)
+            # Check if file already exists (by hash) before it becomes visible
             existing = KnowledgeBaseFile.query.filter_by(filehash=filehash).first()
             if existing:
+                os.unlink(tmp_path)
                 print('File already exists')
                 return render_template(
                     'admin_dashboard.html',
                     user=current_user,
                     files=files,
                     error='File already exists')
+            # Atomically move the complete file into place, unless another
+            # upload with the same name got there first
+            if not move_into_place(tmp_path, filepath):
+                print('File with the same name already exists')
+                return render_template(
+                    'admin_dashboard.html',
+                    user=current_user,
+                    files=files,
+                    error='A file with the same name already exists')
+            fingerprint = file_fingerprint(filepath)
             # Get chunking params from form
             chunk_size = int(request.form.get('chunk_size', 2000))
             chunk_overlap = int(request.form.get('chunk_overlap', 400))
@@ -204,8 +243,10 @@ def admin_dashboard():
                 filepath=filepath,
                 filehash=filehash
             )
+            kb_file.set_fingerprint(fingerprint)
             db.session.add(kb_file)
             db.session.commit()
+            notify_change()
             print(f'File uploaded successfully with chunk_size={chunk_size}, chunk_overlap={chunk_overlap}')
             files = get_file_status()
             return render_template(
@@ -249,31 +290,28 @@ def delete_file(file_id):
 
     db.session.delete(kb_file)
     db.session.commit()
+    notify_change()
 
-    # After deleting, check if there are any files left
-    if KnowledgeBaseFile.query.count() == 0:
-        import shutil
-
-        vector_db_path = os.path.join("vector_db", "faiss_index")
-        if os.path.exists(vector_db_path):
-            shutil.rmtree(vector_db_path)
+    # The embedding worker drops the file's vectors (or the whole index, if
+    # no file is left) and publishes a new version; every process picks it
+    # up through the index version check
+    start_embedding(force_all=False)
 
     if request.headers.get("Content-Type") == "application/json":
-        return jsonify({"success": True, "message": "File deleted successfully!"})
+        return jsonify({"success": True, "message": "File deleted! It is being removed from the index."})
 
-    flash("File deleted!", "success")
+    flash("File deleted! It is being removed from the index.", "success")
     return redirect("/admin")
 
-# Placeholder for embedding and progress
+# Embedding jobs (run by the embed-worker process) and their progress
 @app.route('/api/admin/embed', methods=['POST'])
 @login_required
 def embed_files():
-    from app.core import start_embedding
-    started = start_embedding(app, force_all=False)
+    started = start_embedding(force_all=False)
     if started:
-        msg = 'Embedding started for changed files! Progress will update below.'
+        msg = 'Embedding queued for changed files! Progress will update below.'
     else:
-        msg = 'Embedding is already running.'
+        msg = 'An embedding job is already queued or running.'
     files = get_file_status()
     return render_template(
         'admin_dashboard.html',
@@ -285,12 +323,11 @@ def embed_files():
 @app.route('/api/admin/embed_all', methods=['POST'])
 @login_required
 def embed_all_files():
-    from app.core import start_embedding
-    started = start_embedding(app, force_all=True)
+    started = start_embedding(force_all=True)
     if started:
-        msg = 'Embedding started for all files! Progress will update below.'
+        msg = 'Embedding queued for all files! Progress will update below.'
     else:
-        msg = 'Embedding is already running.'
+        msg = 'An embedding job is already queued or running.'
     files = get_file_status()
     return render_template(
         'admin_dashboard.html',
@@ -304,6 +341,46 @@ def embed_all_files():
 def embed_progress():
     return jsonify(get_embedding_progress())
 
+@app.route('/api/admin/embed/cancel', methods=['POST'])
+@login_required
+def embed_cancel():
+    if cancel_embedding():
+        return jsonify({"success": True, "message": "Cancelling embedding job..."})
+    return jsonify({"success": False, "error": "No embedding job is running."}), 409
+
+@app.route('/api/admin/answer_cache', methods=['GET'])
+@login_required
+def answer_cache_status():
+    from app.core import get_answer_cache_stats
+    return jsonify(get_answer_cache_stats())
+
+@app.route('/api/admin/answer_cache/flush', methods=['POST'])
+@login_required
+def answer_cache_flush():
+    from app.core import flush_answer_cache
+    flush_answer_cache()
+    return jsonify({"success": True, "message": "Answer cache flushed."})
+
+@app.route('/api/admin/sessions', methods=['GET'])
+@login_required
+def session_stats():
+    from app.core import get_session_stats
+    return jsonify(get_session_stats())
+
+@app.route('/api/admin/rerank_stats', methods=['GET'])
+@login_required
+def rerank_stats_status():
+    from app.vector_store import get_rerank_stats
+    return jsonify(get_rerank_stats())
+
+def trace_requested(data):
+    """
+    Whether the client asked for the span tree (?debug=1 or "debug": true).
+    Honoured for logged-in admins, or for everyone when TRACE_DEBUG is set.
+    """
+    wanted = request.args.get('debug') in ('1', 'true') or data.get('debug') is True
+    return wanted and (TRACE_DEBUG or current_user.is_authenticated)
+
 @app.route('/api/chat', methods=['POST'])
 def api_chat():
     data = request.get_json()
@@ -311,17 +388,54 @@ def api_chat():
     user_id = data.get('user_id', request.remote_addr)
     conversation_has_started = data.get("conversationHasStarted", False)
     is_initial_greeting_sent = data.get("isInitialGreetingSent", False)
+    request_id = new_request_id(request.headers.get('X-Request-ID'))
 
     if not message:
-        return jsonify({'error': 'No message provided'}), 400
+        return jsonify({'error': 'No message provided'}), 400, {'X-Request-ID': request_id}
+
+    with trace(request_id, 'chat') as chat_trace:
+        response = get_response(
+            message,
+            user_id,
+            conversation_has_started,
+            is_initial_greeting_sent
+        )
+    body = {'response': response}
+    headers = {'X-Request-ID': request_id}
+    if trace_requested(data):
+        body['trace'] = chat_trace.tree()
+        headers['Server-Timing'] = chat_trace.server_timing()
+    return jsonify(body), 200, headers
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Streaming chat endpoint: sends the answer as server-sent events.
+    Each `data:` event carries {"delta": "..."}; a final `done` event ends the stream.
+    With debug, a `trace` event with the span tree comes before `done`.
+    """
+    data = request.get_json()
+    message = data.get('message', '').strip()
+    user_id = data.get('user_id', request.remote_addr)
+    request_id = new_request_id(request.headers.get('X-Request-ID'))
+    debug = trace_requested(data)
 
-    response = get_response(
-        message,
-        user_id,
-        conversation_has_started,
-        is_initial_greeting_sent
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400, {'X-Request-ID': request_id}
+
+    def generate():
+        with trace(request_id, 'chat_stream') as chat_trace:
+            for text in stream_response(message, user_id):
+                yield f"data: {json.dumps({'delta': text})}\n\n"
+        if debug:
+            yield f"event: trace\ndata: {json.dumps(chat_trace.tree(), default=str)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Request-ID': request_id}
     )
-    return jsonify({'response': response})
 
 @app.route('/api/files', methods=['GET'])
 def api_files():
@@ -384,14 +498,12 @@ def preview_chunking():
                     tmp_path = tmp.name
                     print(f'[PREVIEW] PDF saved to temp file: {tmp_path}')
                 
-                loader = PyMuPDFLoader(tmp_path)
-                docs = loader.load()
+                docs = load_pdf(tmp_path)
                 print(f"[PREVIEW] PDF: loaded {len(docs)} pages")
                 
                 # Collect up to 3 pages with extractable text from the first 10 pages
                 preview_docs = []
                 for i, d in enumerate(docs[:10]):
-                    d.metadata['file_type'] = 'pdf'
                     text_len = len(d.page_content.strip()) if d.page_content else 0
                     print(f"[PREVIEW] Page {i+1}: text length = {text_len}")
                     if d.page_content and d.page_content.strip():
@@ -415,16 +527,8 @@ def preview_chunking():
         elif filetype == 'csv':
             try:
                 print('[PREVIEW] Processing CSV file...')
-                df = pd.read_csv(file, nrows=100)
-                for index, row in df.iterrows():
-                    row_text = ""
-                    for column, value in row.items():
-                        if pd.notna(value):
-                            row_text += f"{column}: {value}\n"
-                    if row_text.strip():
-                        metadata = {"source": filename, "row": index + 1, "file_type": "csv"}
-                        preview_docs.append(Document(page_content=row_text.strip(), metadata=metadata))
-                print(f"[PREVIEW] CSV: loaded {len(df)} rows, preview_docs={len(preview_docs)}")
+                preview_docs = load_csv(file, source=filename, nrows=100)
+                print(f"[PREVIEW] CSV: preview_docs={len(preview_docs)}")
             except Exception as e:
                 print(f"[PREVIEW] Exception during CSV processing: {e}")
                 return jsonify({'success': False, 'error': 'Failed to process the CSV file. It may be corrupt or unreadable.'}), 400
@@ -432,7 +536,7 @@ def preview_chunking():
             try:
                 print('[PREVIEW] Processing TXT file...')
                 text = file.read(5000).decode('utf-8', errors='ignore')
-                preview_docs = [Document(page_content=text, metadata={"source": filename, "file_type": "txt"})]
+                preview_docs = [txt_document(text, filename)]
                 print(f"[PREVIEW] TXT: loaded {len(text)} chars")
             except Exception as e:
                 print(f"[PREVIEW] Exception during TXT processing: {e}")
@@ -471,60 +575,41 @@ def preview_chunking():
 @app.route("/api/kb_status", methods=["GET"])
 def kb_status():
     """
-    Check if knowledge base needs embedding.
-    Returns 'requires_embedding' if:
-    - No embedding has been done at all, OR
-    - There are files uploaded after the last embedding
-    Returns 'active' if all files have been embedded and no new files since.
+    Check if knowledge base needs embedding: 'no_files', 'requires_embedding'
+    or 'active' (see get_kb_status).
     """
-    index_path = os.path.join("vector_db", "faiss_index")
-    
-    # Check if any files exist
-    files = KnowledgeBaseFile.query.all()
-    if not files:
-        # No files at all - nothing to embed
-        return jsonify({"status": "no_files"})
-    
-    # Check if index exists
-    if not os.path.exists(index_path):
-        # Files exist but no index - needs embedding
-        return jsonify({"status": "requires_embedding"})
-    
-    # Check if all files have been embedded
-    # If ANY file has embedded_at as None, it needs embedding
-    from sqlalchemy import func
-    unembed_files = KnowledgeBaseFile.query.filter(KnowledgeBaseFile.embedded_at == None).all()
-    if unembed_files:
-        return jsonify({"status": "requires_embedding"})
-    
-    # Check if any files were uploaded after the last embedding
-    max_embedded_time = db.session.query(func.max(KnowledgeBaseFile.embedded_at)).scalar()
-    max_uploaded_time = db.session.query(func.max(KnowledgeBaseFile.uploaded_at)).scalar()
-    
-    if max_embedded_time and max_uploaded_time and max_uploaded_time > max_embedded_time:
-        # New files uploaded after last embedding
-        return jsonify({"status": "requires_embedding"})
-    
-    # If we reach here, KB is already active/embedded with all files up to date
-    return jsonify({"status": "active"})
+    return jsonify({"status": get_kb_status()})
+
+def dashboard_state():
+    return {
+        "kb_status": {"status": get_kb_status()},
+        "embed_progress": get_embedding_progress(),
+    }
+
+dashboard_events = ChangeFeed(app, dashboard_state)
+
+@app.route("/api/admin/events", methods=["GET"])
+@login_required
+def admin_events():
+    """
+    Server-sent events for the dashboard: `kb_status` and `embed_progress`
+    events (same payloads as the polling endpoints), sent when they change.
+    """
+    return Response(
+        dashboard_events.stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route("/api/admin/delete_vector_db", methods=["POST"])
 @login_required
 def delete_vector_db():
-    import shutil
-    vector_db_dir = os.path.abspath("vector_db")
     try:
-        if os.path.exists(vector_db_dir):
-            # Remove all contents inside vector_db
-            for filename in os.listdir(vector_db_dir):
-                file_path = os.path.join(vector_db_dir, filename)
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-        else:
-            os.makedirs(vector_db_dir, exist_ok=True)
+        # Unpublish first so no process picks the index up again, then
+        # remove every stored version
+        delete_index()
         msg = "Vector DB deleted successfully."
+        reload_pipeline()
     except Exception as e:
         msg = f"Failed to delete Vector DB: {str(e)}"
     files = get_file_status()
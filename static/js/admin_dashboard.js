@@ -145,87 +145,109 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Latest pushed state: the embed button depends on both
+    let lastKBStatus = null;
+    let embeddingActive = false;
+
     /**
-     * Poll knowledge base status
+     * Render knowledge base status
+     * @param {Object} data - Payload of /api/kb_status or a kb_status event
      */
-    function pollKBStatus() {
-        fetch('/api/kb_status')
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
-                return response.json();
-            })
-            .then(data => {
-                const statusMsg = document.getElementById('kb-status-message');
-                const embedBtn = document.getElementById('embed-data-btn');
-                
-                if (!statusMsg || !embedBtn) {
-                    console.warn('Status elements not found');
-                    return;
-                }
-                
-                if (data.status === 'requires_embedding') {
-                    // Files exist but not all embedded, or new files added - BUTTON ENABLED
-                    statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-yellow-100 text-yellow-800 text-sm font-semibold status-message"><i class="bi bi-exclamation-triangle mr-2"></i>New or unembed files detected. Click "Embed Data" to update.</span>';
-                    embedBtn.disabled = false;
-                    embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-gradient-to-r from-blue-600 to-blue-700 hover:from-blue-700 hover:to-blue-800 text-sm shadow-lg hover:shadow-xl transform hover:scale-[1.02]';
-                    console.log('✅ Embed button ENABLED - files need embedding');
-                } else if (data.status === 'active') {
-                    // All files embedded and up to date - BUTTON DISABLED
-                    statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-green-100 text-green-800 text-sm font-semibold status-message"><i class="bi bi-check-circle mr-2"></i>All files are embedded and up to date.</span>';
-                    embedBtn.disabled = true;
-                    embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
-                    console.log('✅ Embed button DISABLED - all files up to date');
-                } else if (data.status === 'no_files') {
-                    // No files uploaded - BUTTON DISABLED
-                    statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-slate-100 text-slate-700 text-sm font-semibold status-message"><i class="bi bi-info-circle mr-2"></i>No files uploaded yet. Upload files first.</span>';
-                    embedBtn.disabled = true;
-                    embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
-                    console.log('✅ Embed button DISABLED - no files');
-                } else {
-                    console.warn(`Unknown status: ${data.status}`);
-                }
-            })
-            .catch(error => {
-                console.error('Error polling KB status:', error);
-            });
+    function renderKBStatus(data) {
+        lastKBStatus = data;
+        const statusMsg = document.getElementById('kb-status-message');
+        const embedBtn = document.getElementById('embed-data-btn');
+        
+        if (!statusMsg || !embedBtn) {
+            console.warn('Status elements not found');
+            return;
+        }
+        
+        if (data.status === 'requires_embedding') {
+            // Files exist but not all embedded, or new files added - BUTTON ENABLED
+            statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-yellow-100 text-yellow-800 text-sm font-semibold status-message"><i class="bi bi-exclamation-triangle mr-2"></i>New or unembed files detected. Click "Embed Data" to update.</span>';
+            embedBtn.disabled = false;
+            embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-gradient-to-r from-blue-600 to-blue-700 hover:from-blue-700 hover:to-blue-800 text-sm shadow-lg hover:shadow-xl transform hover:scale-[1.02]';
+            console.log('✅ Embed button ENABLED - files need embedding');
+        } else if (data.status === 'active') {
+            // All files embedded and up to date - BUTTON DISABLED
+            statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-green-100 text-green-800 text-sm font-semibold status-message"><i class="bi bi-check-circle mr-2"></i>All files are embedded and up to date.</span>';
+            embedBtn.disabled = true;
+            embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
+            console.log('✅ Embed button DISABLED - all files up to date');
+        } else if (data.status === 'no_files') {
+            // No files uploaded - BUTTON DISABLED
+            statusMsg.innerHTML = '<span class="inline-flex items-center px-3 py-2 rounded-full bg-slate-100 text-slate-700 text-sm font-semibold status-message"><i class="bi bi-info-circle mr-2"></i>No files uploaded yet. Upload files first.</span>';
+            embedBtn.disabled = true;
+            embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
+            console.log('✅ Embed button DISABLED - no files');
+        } else {
+            console.warn(`Unknown status: ${data.status}`);
+        }
+        if (embeddingActive) {
+            embedBtn.disabled = true;
+            embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
+        }
+    }
+
+    /**
+     * Render embedding progress
+     * @param {Object} data - Payload of /api/admin/embed_progress or an embed_progress event
+     */
+    function renderEmbedProgress(data) {
+        const progressBar = document.getElementById('embed-progress-bar');
+        const progressInner = document.getElementById('embed-progress-inner');
+        const progressText = document.getElementById('embed-progress-text');
+        const embedBtn = document.getElementById('embed-data-btn');
+        const wasActive = embeddingActive;
+        embeddingActive = data.status === 'running' || data.status === 'queued';
+        if (embeddingActive) {
+            progressBar.classList.remove('hidden');
+            progressInner.style.width = (data.progress || 0) + '%';
+            progressText.textContent = data.message || 'Embedding in progress...';
+            embedBtn.disabled = true;
+            embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
+        } else {
+            progressBar.classList.add('hidden');
+            progressInner.style.width = '0%';
+            progressText.textContent = '';
+            if (wasActive && lastKBStatus) {
+                renderKBStatus(lastKBStatus);
+            }
+        }
     }
 
     /**
-     * Poll embedding progress
+     * Cancel the running embedding job
      */
-    function pollEmbedProgress() {
-        fetch('/api/admin/embed_progress')
+    document.getElementById('embed-cancel-btn').addEventListener('click', function() {
+        fetch('/api/admin/embed/cancel', { method: 'POST' })
             .then(response => response.json())
             .then(data => {
-                const progressBar = document.getElementById('embed-progress-bar');
-                const progressInner = document.getElementById('embed-progress-inner');
-                const progressText = document.getElementById('embed-progress-text');
-                const embedBtn = document.getElementById('embed-data-btn');
-                if (data.status === 'running' || data.status === 'starting') {
-                    progressBar.classList.remove('hidden');
-                    progressInner.style.width = (data.progress || 0) + '%';
-                    progressText.textContent = data.message || 'Embedding in progress...';
-                    embedBtn.disabled = true;
-                    embedBtn.className = 'w-full py-4 px-6 rounded-xl font-semibold transition-all duration-200 text-white bg-slate-400 cursor-not-allowed text-sm shadow-lg';
+                if (data.success) {
+                    showToast(data.message, 'success');
                 } else {
-                    progressBar.classList.add('hidden');
-                    progressInner.style.width = '0%';
-                    progressText.textContent = '';
+                    showToast(data.error || 'Cancel failed.', 'danger');
                 }
+            })
+            .catch(error => {
+                showToast('Cancel failed. Please try again.', 'danger');
+                console.error('Error cancelling embedding:', error);
             });
-    }
+    });
 
-    // Initialize polling
-    pollKBStatus();
-    pollEmbedProgress();
-    setInterval(pollKBStatus, 3000);
-    setInterval(pollEmbedProgress, 1500);
-    
-    document.getElementById('embed-form').addEventListener('submit', function() {
-        setTimeout(() => pollEmbedProgress(), 500);
+    // Status updates are pushed by the server when they change;
+    // EventSource reconnects by itself when the stream ends
+    const dashboardEvents = new EventSource('/api/admin/events');
+    dashboardEvents.addEventListener('kb_status', event => {
+        renderKBStatus(JSON.parse(event.data));
+    });
+    dashboardEvents.addEventListener('embed_progress', event => {
+        renderEmbedProgress(JSON.parse(event.data));
     });
+    dashboardEvents.onerror = function() {
+        console.warn('Dashboard event stream interrupted, reconnecting...');
+    };
 
     // Chunking Preview Logic
     const previewBtn = document.getElementById('preview-btn');
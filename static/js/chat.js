@@ -47,6 +47,7 @@ async function sendInitialGreeting() {
  * Append message to chat display
  * @param {string} text - Message text to display
  * @param {string} sender - 'bot' or 'user'
+ * @returns {HTMLElement} The message content element
  */
 function appendMessage(text, sender) {
     const row = document.createElement('div');
@@ -95,6 +96,82 @@ function appendMessage(text, sender) {
     chatMessages.appendChild(spacer);
     
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return content;
+}
+
+/**
+ * Re-render a bot message with (partial) Markdown text
+ * @param {HTMLElement} content - Content element returned by appendMessage
+ * @param {string} text - Markdown text received so far
+ */
+function updateBotMessage(content, text) {
+    content.innerHTML = marked.parse(text, {
+        gfm: true,
+        breaks: true
+    });
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+/**
+ * Send a message to the streaming endpoint and render the answer as it arrives
+ * @param {Object} payload - Request body for the chat API
+ * @returns {Promise<boolean>} True if an answer was streamed
+ */
+async function streamChat(payload) {
+    const res = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+    });
+    if (!res.ok || !res.body) return false;
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let content = null;
+    let pendingRender = false;
+
+    // Render at most once per animation frame while tokens stream in
+    const scheduleRender = () => {
+        if (pendingRender) return;
+        pendingRender = true;
+        requestAnimationFrame(() => {
+            pendingRender = false;
+            updateBotMessage(content, answer);
+        });
+    };
+
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const event of events) {
+                const lines = event.split('\n');
+                if (lines.some(line => line.startsWith('event: done'))) continue;
+                const dataLine = lines.find(line => line.startsWith('data: '));
+                if (!dataLine) continue;
+                const data = JSON.parse(dataLine.slice(6));
+                if (!data.delta) continue;
+                answer += data.delta;
+                if (!content) {
+                    setLoading(false);
+                    content = appendMessage(answer, 'bot');
+                } else {
+                    scheduleRender();
+                }
+            }
+        }
+    } catch (err) {
+        // Keep whatever was already shown; only fall back if nothing arrived
+        if (!content) throw err;
+        answer += '\n\n*(Koneksi terputus, jawaban mungkin tidak lengkap.)*';
+    }
+    if (content) updateBotMessage(content, answer);
+    return content !== null;
 }
 
 /**
@@ -146,19 +223,29 @@ chatForm.addEventListener('submit', async function(e) {
     chatInput.value = '';
     setLoading(true);
 
+    const payload = {
+        message: userMsg,
+        user_id: sessionId,
+        conversationHasStarted: conversationHasStarted,
+        isInitialGreetingSent: isInitialGreetingSent
+    };
+
     try {
-        const res = await fetch('/api/chat', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                message: userMsg,
-                user_id: sessionId,
-                conversationHasStarted: conversationHasStarted,
-                isInitialGreetingSent: isInitialGreetingSent
-            })
-        });
-        const data = await res.json();
-        appendMessage(data.response, 'bot');
+        let streamed = false;
+        try {
+            streamed = await streamChat(payload);
+        } catch (streamErr) {
+            console.warn('Streaming failed, falling back to /api/chat:', streamErr);
+        }
+        if (!streamed) {
+            const res = await fetch('/api/chat', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(payload)
+            });
+            const data = await res.json();
+            appendMessage(data.response, 'bot');
+        }
         if (!conversationHasStarted) conversationHasStarted = true;
     } catch (err) {
         appendMessage('Maaf, terjadi kesalahan. Mohon coba lagi nanti.', 'bot');